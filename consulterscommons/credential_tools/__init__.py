@@ -0,0 +1,11 @@
+from .credential_cache import (
+    CredentialCache,
+    get_credential_cache,
+    get_keyring_credential,
+    get_prefect_secret,
+    get_prefect_variable,
+    invalidate_credentials,
+)
+
+__all__ = ["CredentialCache", "get_credential_cache", "get_keyring_credential",
+           "get_prefect_variable", "get_prefect_secret", "invalidate_credentials"]
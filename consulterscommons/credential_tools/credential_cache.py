@@ -0,0 +1,160 @@
+"""
+Módulo con una caché en memoria para credenciales y configuración.
+
+Las búsquedas en el Credential Manager (keyring) y las lecturas de Variables y Secrets de Prefect pueden tardar cientos
+de milisegundos cada una. CredentialCache guarda el resultado en memoria del proceso durante un tiempo limitado (TTL),
+de modo que los flujos que abren muchos motores o envían muchos correos las hagan una sola vez. Nada se escribe a disco.
+
+Cuando una credencial deja de ser válida (por ejemplo, si se cambió la contraseña) se puede descartar con
+invalidate_credentials para que la próxima lectura vaya nuevamente a la fuente.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+import keyring as kr
+from prefect.blocks.system import Secret
+from prefect.variables import Variable
+
+# Tiempo de vida por defecto de los valores en caché, en segundos
+DEFAULT_TTL_SECONDS = 900
+
+
+class CredentialCache:
+    """
+    Caché en memoria con tiempo de vida para credenciales y valores de configuración.
+
+    Parámetros:
+    - ttl_seconds (float): Segundos que se conserva cada valor. Por defecto es DEFAULT_TTL_SECONDS.
+
+    Uso:
+        - cache = CredentialCache(ttl_seconds=300)
+        - password = cache.get(('smtp', 'alertas'), lambda: leer_password())
+        - cache.invalidate(('smtp', 'alertas'))
+
+    No se guardan en caché los valores None ni los errores del loader, para que una credencial faltante se vuelva
+    a buscar en la próxima lectura.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._values: dict[Hashable, tuple[Any, float]] = {}
+
+    def get(self, key: Hashable, loader: Callable[[], Any], ttl_seconds: float = None) -> Any:
+        """
+        Devuelve el valor de la clave, llamando a loader si no está en caché o venció.
+
+        Args:
+            key (Hashable): La clave del valor.
+            loader (Callable[[], Any]): Función que obtiene el valor de la fuente.
+            ttl_seconds (float, opcional): Tiempo de vida para este valor. Por defecto se usa el de la caché.
+
+        Returns:
+            Any: El valor en caché o el devuelto por loader.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+
+        value = loader()
+
+        if value is not None:
+            ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+            with self._lock:
+                self._values[key] = (value, time.monotonic() + ttl_seconds)
+
+        return value
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Descarta el valor de la clave, o todos los valores si no se indica una clave.
+        """
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+    def __len__(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for _, expires_at in self._values.values() if expires_at > now)
+
+
+_CREDENTIAL_CACHE = CredentialCache()
+
+
+def get_credential_cache() -> CredentialCache:
+    """
+    Devuelve la caché de credenciales compartida por los módulos de consulterscommons. Su tiempo de vida se puede
+    cambiar con get_credential_cache().ttl_seconds.
+    """
+    return _CREDENTIAL_CACHE
+
+
+def get_keyring_credential(service: str, username: str, ttl_seconds: float = None):
+    """
+    Versión con caché de keyring.get_credential.
+
+    Args:
+        service (str): El servicio en el Credential Manager (por ejemplo, el servidor SQL Server).
+        username (str): El nombre de usuario.
+        ttl_seconds (float, opcional): Tiempo de vida en caché. Por defecto se usa el de la caché compartida.
+
+    Returns:
+        keyring.credentials.Credential: La credencial, o None si no existe.
+    """
+    return _CREDENTIAL_CACHE.get(('keyring', service, username),
+                                 lambda: kr.get_credential(service, username),
+                                 ttl_seconds)
+
+
+def get_prefect_variable(name: str, ttl_seconds: float = None) -> Any:
+    """
+    Versión con caché de prefect.variables.Variable.get.
+
+    Args:
+        name (str): El nombre de la variable de Prefect.
+        ttl_seconds (float, opcional): Tiempo de vida en caché. Por defecto se usa el de la caché compartida.
+
+    Returns:
+        Any: El valor de la variable, o None si no existe.
+    """
+    return _CREDENTIAL_CACHE.get(('prefect_variable', name), lambda: Variable.get(name), ttl_seconds)
+
+
+def get_prefect_secret(name: str, ttl_seconds: float = None) -> Any:
+    """
+    Devuelve el valor del bloque Secret de Prefect, con caché.
+
+    Args:
+        name (str): El nombre del bloque Secret.
+        ttl_seconds (float, opcional): Tiempo de vida en caché. Por defecto se usa el de la caché compartida.
+
+    Returns:
+        Any: El valor del secreto.
+    """
+    return _CREDENTIAL_CACHE.get(('prefect_secret', name), lambda: Secret.load(name).get(), ttl_seconds)
+
+
+def invalidate_credentials(kind: str = None, name: str = None, username: str = None) -> None:
+    """
+    Descarta valores de la caché de credenciales compartida.
+
+    Args:
+        kind (str, opcional): 'keyring', 'prefect_variable' o 'prefect_secret'. Si es None se descarta todo.
+        name (str, opcional): El servicio de keyring o el nombre de la variable o secreto.
+        username (str, opcional): El usuario, solo para kind='keyring'.
+    """
+    if kind is None:
+        _CREDENTIAL_CACHE.invalidate()
+    elif kind == 'keyring':
+        _CREDENTIAL_CACHE.invalidate((kind, name, username))
+    elif kind in ('prefect_variable', 'prefect_secret'):
+        _CREDENTIAL_CACHE.invalidate((kind, name))
+    else:
+        raise ValueError("kind debe ser 'keyring', 'prefect_variable', 'prefect_secret' o None.")
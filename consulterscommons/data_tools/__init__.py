@@ -1 +1,2 @@
-from .excel_column_converters import *
\ No newline at end of file
+from .excel_column_converters import *
+from .ingestion import iter_csv_chunks, iter_excel_chunks, iter_file_chunks
@@ -1,3 +1,20 @@
+import functools
+import re
+
+import numpy as np
+
+__all__ = ["MAX_EXCEL_COLUMN", "MAX_EXCEL_ROW",
+           "excel_column_name", "excel_column_number",
+           "excel_column_names", "excel_column_numbers",
+           "split_cell_references", "excel_range_bounds", "expand_excel_range"]
+
+MAX_EXCEL_COLUMN = 16_384  # XFD
+MAX_EXCEL_ROW = 1_048_576
+
+_COLUMN_NAME_PATTERN = re.compile(r'[A-Za-z]+')
+_CELL_REFERENCE_PATTERN = re.compile(r'\$?([A-Za-z]{1,3})\$?([0-9]+)')
+
+
 def excel_column_name(n: int) -> str:
     """Number to Excel-style column name, e.g., 1 = A, 26 = Z, 27 = AA, 703 = AAA."""
     name = ''
@@ -12,3 +29,170 @@ def excel_column_number(name: str) -> int:
     for c in name:
         n = n * 26 + 1 + ord(c) - ord('A')
     return n
+
+
+@functools.cache
+def _column_name_table() -> np.ndarray:
+    """Column names for 1..MAX_EXCEL_COLUMN, indexed by column number (index 0 is unused)."""
+    table = np.empty(MAX_EXCEL_COLUMN + 1, dtype=object)
+    table[0] = ''
+    table[1:] = [excel_column_name(n) for n in range(1, MAX_EXCEL_COLUMN + 1)]
+    return table
+
+
+def _checked_column_number(name) -> int:
+    """Validating, case-insensitive version of excel_column_number."""
+    if not isinstance(name, str) or not _COLUMN_NAME_PATTERN.fullmatch(name):
+        raise ValueError(f"Invalid Excel column name: {name!r}")
+    return excel_column_number(name.upper())
+
+
+def excel_column_names(numbers) -> np.ndarray:
+    """
+    Bulk version of excel_column_name for a list or NumPy array of column numbers.
+
+    Numbers up to MAX_EXCEL_COLUMN (XFD) are resolved with a precomputed lookup table, larger ones one at a time.
+    Returns an object array of strings with the same shape as the input.
+    Raises TypeError if the values are not integers and ValueError if any of them is lower than 1.
+    """
+    numbers = np.asarray(numbers)
+    if numbers.size == 0:
+        return np.empty(numbers.shape, dtype=object)
+
+    if numbers.dtype.kind not in 'iu':
+        raise TypeError(f"Excel column numbers must be integers, got {numbers.dtype}")
+    if numbers.min() < 1:
+        raise ValueError("Excel column numbers must be greater than or equal to 1")
+
+    table = _column_name_table()
+    in_table = numbers <= MAX_EXCEL_COLUMN
+    if in_table.all():
+        return table[numbers]
+
+    names = np.empty(numbers.shape, dtype=object)
+    names[in_table] = table[numbers[in_table]]
+    names[~in_table] = [excel_column_name(int(n)) for n in numbers[~in_table]]
+    return names
+
+
+def excel_column_numbers(names) -> np.ndarray:
+    """
+    Bulk version of excel_column_number for a list or NumPy array of column names, e.g., ['A', 'z', 'AA'] = [1, 26, 27].
+
+    Names are case-insensitive. Names of up to three letters (the range up to XFD) are converted with array arithmetic
+    on their character codes, longer ones one at a time.
+    Returns an int64 array with the same shape as the input.
+    Raises ValueError if any value is not a string made only of letters.
+    """
+    names = np.asarray(names)
+    if names.size == 0:
+        return np.empty(names.shape, dtype=np.int64)
+
+    if names.dtype.kind != 'U' or names.dtype.itemsize > 3 * 4:
+        flat_names = names.ravel().tolist()
+        return np.array([_checked_column_number(name) for name in flat_names], dtype=np.int64).reshape(names.shape)
+
+    # UTF-32 code of each letter, shorter names are padded with 0 on the right
+    codes = names.reshape(-1).view(np.uint32).reshape(names.size, -1).astype(np.int64)
+    present = codes != 0
+    codes = np.where((codes >= ord('a')) & (codes <= ord('z')), codes - (ord('a') - ord('A')), codes) - ord('A') + 1
+
+    valid = (present[:, 0]
+             & np.all(~present | ((codes >= 1) & (codes <= 26)), axis=1)
+             & np.all(present[:, :-1] >= present[:, 1:], axis=1))
+    if not valid.all():
+        _checked_column_number(str(names.reshape(-1)[np.argmin(valid)]))
+
+    numbers = np.zeros(names.size, dtype=np.int64)
+    for position in range(codes.shape[1]):
+        numbers = np.where(present[:, position], numbers * 26 + codes[:, position], numbers)
+
+    return numbers.reshape(names.shape)
+
+
+def split_cell_references(references) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits A1-style cell references into column and row numbers, e.g., ['B2', '$AZ$10'] = ([2, 52], [2, 10]).
+
+    Returns two int64 arrays with the same shape as the input.
+    Raises ValueError if any reference is not a valid cell within Excel's limits (XFD1048576).
+    """
+    references = np.asarray(references, dtype=object)
+    flat_references = references.ravel().tolist()
+
+    columns = []
+    rows = []
+    for reference in flat_references:
+        match = _CELL_REFERENCE_PATTERN.fullmatch(reference) if isinstance(reference, str) else None
+        if match is None:
+            raise ValueError(f"Invalid Excel cell reference: {reference!r}")
+        columns.append(match.group(1))
+        rows.append(int(match.group(2)))
+
+    columns = excel_column_numbers(columns)
+    rows = np.array(rows, dtype=np.int64)
+
+    if columns.size and (columns.max() > MAX_EXCEL_COLUMN or rows.min() < 1 or rows.max() > MAX_EXCEL_ROW):
+        raise ValueError("Excel cell references must be within A1:XFD1048576")
+
+    return columns.reshape(references.shape), rows.reshape(references.shape)
+
+
+def excel_range_bounds(cell_range: str) -> tuple[int, int, int, int]:
+    """
+    Bounds of an A1-style range as (min_col, min_row, max_col, max_row), e.g., 'B2:AZ5000' = (2, 2, 52, 5000).
+
+    A single cell such as 'C3' is a range of one cell. The corners can be given in any order.
+    Raises ValueError if the range is not valid.
+    """
+    if not isinstance(cell_range, str) or cell_range.count(':') > 1:
+        raise ValueError(f"Invalid Excel range: {cell_range!r}")
+
+    corners = cell_range.split(':')
+    columns, rows = split_cell_references(corners)
+
+    return int(columns.min()), int(rows.min()), int(columns.max()), int(rows.max())
+
+
+def expand_excel_range(cell_range: str) -> np.ndarray:
+    """
+    Every cell reference of an A1-style range as a 2D object array of shape (rows, columns),
+    e.g., 'A1:B2' = [['A1', 'B1'], ['A2', 'B2']].
+    """
+    min_col, min_row, max_col, max_row = excel_range_bounds(cell_range)
+
+    column_names = excel_column_names(np.arange(min_col, max_col + 1))
+    row_numbers = np.arange(min_row, max_row + 1).astype(str).astype(object)
+
+    return column_names[np.newaxis, :] + row_numbers[:, np.newaxis]
+
+
+def _benchmark(size: int = 200_000) -> None:
+    """Compares the scalar and bulk conversions on random columns up to XFD."""
+    import time
+
+    rng = np.random.default_rng(0)
+    numbers = rng.integers(1, MAX_EXCEL_COLUMN + 1, size=size)
+    names = [excel_column_name(int(n)) for n in numbers]
+
+    def timed(description, fn):
+        start = time.perf_counter()
+        result = fn()
+        print(f"{description:<45} {time.perf_counter() - start:8.3f} s")
+        return result
+
+    print(f"{size:,} columns")
+    scalar_names = timed("excel_column_name (scalar loop)", lambda: [excel_column_name(int(n)) for n in numbers])
+    bulk_names = timed("excel_column_names (lookup table)", lambda: excel_column_names(numbers))
+    scalar_numbers = timed("excel_column_number (scalar loop)", lambda: [excel_column_number(name) for name in names])
+    bulk_numbers = timed("excel_column_numbers (array arithmetic)", lambda: excel_column_numbers(names))
+    names_array = np.array(names)
+    timed("excel_column_numbers (NumPy array input)", lambda: excel_column_numbers(names_array))
+    timed("expand_excel_range('B2:AZ5000')", lambda: expand_excel_range('B2:AZ5000'))
+
+    assert bulk_names.tolist() == scalar_names
+    assert bulk_numbers.tolist() == scalar_numbers
+
+
+if __name__ == '__main__':
+    _benchmark()
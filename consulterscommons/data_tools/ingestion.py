@@ -0,0 +1,248 @@
+"""
+Módulo para leer archivos Excel y CSV grandes por lotes.
+
+En lugar de cargar el libro completo con pd.read_excel, las hojas .xlsx se recorren en modo de solo lectura de openpyxl,
+que lee el archivo a medida que avanza, y los CSV con pd.read_csv por lotes. Los encabezados se estandarizan una sola vez
+con standardize_sql_column_names y cada lote se puede convertir a los tipos de una tabla SQL con un ColumnConversionPlan,
+por lo que la memoria usada depende del tamaño del lote y no del tamaño del archivo.
+
+Sin column_types cada lote toma los tipos que pandas infiere con sus propios datos, que pueden cambiar de un lote a otro
+(por ejemplo una columna vacía en un lote queda como object y en otro como float). Para cargar los lotes en una misma
+tabla se recomienda indicar column_types.
+
+Requiere openpyxl para los archivos Excel (pip install consulterscommons[excel]), que es una dependencia opcional del
+paquete.
+Los módulos de db_tools se importan solo al usarse, para que importar data_tools no cargue prefect ni SQLAlchemy.
+"""
+
+import os
+from typing import TYPE_CHECKING, Iterator
+
+import pandas as pd
+
+from consulterscommons.data_tools.excel_column_converters import excel_column_name, excel_range_bounds
+
+if TYPE_CHECKING:  # pragma: no cover
+    from consulterscommons.db_tools.column_conversion import ColumnConversionPlan
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover
+    openpyxl = None
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+CSV_EXTENSIONS = ('.csv', '.txt')
+
+
+def _check_openpyxl() -> None:
+    if openpyxl is None:
+        raise ImportError("Se requiere openpyxl para leer archivos Excel. Instalarlo con "
+                          "'pip install consulterscommons[excel]' o 'pip install openpyxl'.")
+
+
+def _get_conversion_plan(column_types: 'dict | ColumnConversionPlan | None') -> 'ColumnConversionPlan | None':
+    if column_types is None:
+        return None
+
+    from consulterscommons.db_tools.column_conversion import ColumnConversionPlan
+
+    return column_types if isinstance(column_types, ColumnConversionPlan) else ColumnConversionPlan(column_types)
+
+
+def _standardize_columns(columns: list | pd.Index) -> list | pd.Index:
+    from consulterscommons.db_tools.standardize_sql_column_names import standardize_sql_column_names
+
+    return standardize_sql_column_names(columns)
+
+
+def _get_excel_columns(header: tuple, standardize_columns: bool, width: int = None) -> list:
+    """
+    Arma los nombres de las columnas a partir de la fila de encabezados. Las columnas vacías al final se descartan, salvo
+    hasta width si se indica, y las que no tienen encabezado se nombran 'Unnamed: i', igual que en pd.read_excel.
+    """
+    header = list(header)
+    while header and header[-1] is None:
+        header.pop()
+    if width is not None and width > len(header):
+        header.extend([None] * (width - len(header)))
+
+    columns = [f'Unnamed: {i}' if name is None else str(name) for i, name in enumerate(header)]
+    return _standardize_columns(columns) if standardize_columns else columns
+
+
+def _last_value_index(row: tuple) -> int:
+    """Posición de la última celda con valor de la fila, o -1 si está vacía."""
+    for i in range(len(row) - 1, -1, -1):
+        if row[i] is not None:
+            return i
+    return -1
+
+
+def iter_excel_chunks(file_path: str,
+                      sheet_name: str = None,
+                      chunksize: int = 50_000,
+                      cell_range: str = None,
+                      standardize_columns: bool = True,
+                      column_types: 'dict | ColumnConversionPlan' = None,
+                      skip_blank_rows: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Lee una hoja de un archivo .xlsx por lotes de filas, sin cargar el libro completo en memoria.
+
+    La primera fila (o la primera fila de cell_range) se usa como encabezado. Las celdas se leen con sus valores calculados,
+    no con sus fórmulas. Las columnas con valores y sin encabezado se agregan como 'Unnamed: i', igual que en
+    pd.read_excel. Como la hoja se lee por partes, esas columnas tienen que aparecer en el primer lote; si aparecen
+    recién después se produce un ValueError en lugar de devolver lotes con columnas distintas.
+
+    Sin column_types los tipos de cada lote se infieren con sus propios datos y pueden cambiar de un lote a otro.
+
+    Args:
+        file_path (str): Ruta del archivo Excel.
+        sheet_name (str, opcional): Nombre de la hoja. Por defecto se lee la primera hoja.
+        chunksize (int, opcional): Cantidad de filas por lote. Por defecto es 50_000.
+        cell_range (str, opcional): Rango a leer en formato A1, por ejemplo 'B2:AZ5000'. Por defecto se lee toda la hoja.
+        standardize_columns (bool, opcional): Si es True los encabezados se estandarizan con standardize_sql_column_names.
+            Por defecto es True.
+        column_types (dict | ColumnConversionPlan, opcional): Tipos de la tabla (por ejemplo de get_column_types) a aplicar
+            a cada lote. El plan de conversión se arma una sola vez. Por defecto es None.
+        skip_blank_rows (bool, opcional): Si es True se descartan las filas sin ningún valor. Por defecto es True.
+
+    Yields:
+        pandas.DataFrame: Cada lote de filas de la hoja.
+
+    Raises:
+        ImportError: Se produce si openpyxl no está instalado.
+        KeyError: Se produce si la hoja no existe en el archivo.
+        ValueError: Se produce si una columna sin encabezado tiene valores recién después del primer lote.
+    """
+    _check_openpyxl()
+
+    if chunksize < 1:
+        raise ValueError("chunksize debe ser mayor a 0.")
+
+    bounds = {}
+    if cell_range is not None:
+        min_col, min_row, max_col, max_row = excel_range_bounds(cell_range)
+        bounds = {'min_col': min_col, 'min_row': min_row, 'max_col': max_col, 'max_row': max_row}
+
+    plan = _get_conversion_plan(column_types)
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True, **bounds)
+
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = _get_excel_columns(header, standardize_columns)
+        width = len(columns)
+        first_col = bounds.get('min_col', 1)
+
+        chunk = []
+        chunks_yielded = False
+        for row in rows:
+            if len(row) > width:
+                last_index = _last_value_index(row)
+                if last_index >= width:
+                    if chunks_yielded:
+                        raise ValueError(f"La columna {excel_column_name(first_col + last_index)} tiene valores pero no "
+                                         "tiene encabezado y aparece después del primer lote. Agregar el encabezado, "
+                                         "indicar cell_range o aumentar chunksize.")
+                    # Se agregan las columnas 'Unnamed: i', las filas anteriores del lote quedan con nulos
+                    width = last_index + 1
+                    columns = _get_excel_columns(header, standardize_columns, width)
+                row = row[:width]
+
+            if skip_blank_rows and all(value is None for value in row):
+                continue
+            chunk.append(row)
+
+            if len(chunk) == chunksize:
+                df_chunk = pd.DataFrame.from_records(chunk, columns=columns)
+                chunk = []
+                chunks_yielded = True
+                yield plan.apply(df_chunk) if plan is not None else df_chunk
+
+        if chunk:
+            df_chunk = pd.DataFrame.from_records(chunk, columns=columns)
+            yield plan.apply(df_chunk) if plan is not None else df_chunk
+
+    finally:
+        workbook.close()
+
+
+def iter_csv_chunks(file_path: str,
+                    chunksize: int = 50_000,
+                    standardize_columns: bool = True,
+                    column_types: 'dict | ColumnConversionPlan' = None,
+                    **read_csv_kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Lee un archivo CSV por lotes de filas con pd.read_csv.
+
+    Sin column_types (o dtype en read_csv_kwargs) los tipos de cada lote se infieren con sus propios datos y pueden
+    cambiar de un lote a otro.
+
+    Args:
+        file_path (str): Ruta del archivo CSV.
+        chunksize (int, opcional): Cantidad de filas por lote. Por defecto es 50_000.
+        standardize_columns (bool, opcional): Si es True los encabezados se estandarizan con standardize_sql_column_names.
+            Por defecto es True.
+        column_types (dict | ColumnConversionPlan, opcional): Tipos de la tabla (por ejemplo de get_column_types) a aplicar
+            a cada lote. El plan de conversión se arma una sola vez. Por defecto es None.
+        **read_csv_kwargs: Argumentos adicionales para pd.read_csv, por ejemplo sep, encoding o dtype.
+
+    Yields:
+        pandas.DataFrame: Cada lote de filas del archivo.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize debe ser mayor a 0.")
+
+    plan = _get_conversion_plan(column_types)
+    columns = None
+
+    with pd.read_csv(file_path, chunksize=chunksize, **read_csv_kwargs) as reader:
+        for df_chunk in reader:
+            if standardize_columns:
+                # Los encabezados son los mismos en todos los lotes, se estandarizan solo en el primero
+                if columns is None:
+                    columns = _standardize_columns(df_chunk.columns)
+                df_chunk.columns = columns
+
+            yield plan.apply(df_chunk) if plan is not None else df_chunk
+
+
+def iter_file_chunks(file_path: str,
+                     chunksize: int = 50_000,
+                     standardize_columns: bool = True,
+                     column_types: 'dict | ColumnConversionPlan' = None,
+                     **reader_kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Lee un archivo Excel o CSV por lotes según su extensión (ver iter_excel_chunks e iter_csv_chunks).
+
+    Args:
+        file_path (str): Ruta del archivo. Extensiones admitidas: .xlsx, .xlsm, .csv y .txt.
+        chunksize (int, opcional): Cantidad de filas por lote. Por defecto es 50_000.
+        standardize_columns (bool, opcional): Si es True los encabezados se estandarizan con standardize_sql_column_names.
+            Por defecto es True.
+        column_types (dict | ColumnConversionPlan, opcional): Tipos de la tabla a aplicar a cada lote. Por defecto es None.
+        **reader_kwargs: Argumentos adicionales para iter_excel_chunks (sheet_name, cell_range, skip_blank_rows)
+            o para pd.read_csv.
+
+    Yields:
+        pandas.DataFrame: Cada lote de filas del archivo.
+
+    Raises:
+        ValueError: Se produce si la extensión del archivo no es admitida.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in EXCEL_EXTENSIONS:
+        yield from iter_excel_chunks(file_path, chunksize=chunksize, standardize_columns=standardize_columns,
+                                     column_types=column_types, **reader_kwargs)
+    elif extension in CSV_EXTENSIONS:
+        yield from iter_csv_chunks(file_path, chunksize=chunksize, standardize_columns=standardize_columns,
+                                   column_types=column_types, **reader_kwargs)
+    else:
+        raise ValueError(f"Extensión de archivo no admitida: '{extension}'. "
+                         f"Se admiten {', '.join(EXCEL_EXTENSIONS + CSV_EXTENSIONS)}.")
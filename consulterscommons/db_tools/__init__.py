@@ -1,16 +1,55 @@
+from .bulk_writer import bulk_insert_dataframe
+from .column_conversion import ColumnConversionPlan
+from .columnar_fetch import iter_record_batches, read_sql_columnar
+from .incremental_extract import WatermarkStore, extract_incremental
+from .instrumentation import QueryProfiler
+from .parallel_reader import iter_sql_partitioned, read_sql_partitioned
+from .schema_cache import SchemaCache, get_schema_cache
+from .snapshot_cache import SnapshotCache
 from .sqlalchemy_utils import (
     add_columns_to_table,
     check_if_table_exists,
+    check_if_tables_exist,
+    compute_row_hash,
     convert_dataframe_column_types,
+    dispose_sqlalchemy_engines,
     get_columns_to_add,
     get_column_types,
+    get_tables_column_types,
     get_only_new_rows,
     get_sqlalchemy_engine,
+    iter_only_new_rows,
+    stream_only_new_rows,
+    sync_table_columns,
 )
+from .type_inference import infer_sql_column_types
 
 from .standardize_sql_column_names import standardize_sql_column_names
 
+# Las funciones asíncronas se importan al usarlas: requieren greenlet y un driver async (pip install consulterscommons[async])
+_ASYNC_NAMES = ("get_async_sqlalchemy_engine", "async_check_if_table_exists", "async_get_column_types",
+                "async_get_only_new_rows", "async_bulk_insert_dataframe")
+
+
+def __getattr__(name):
+    if name in _ASYNC_NAMES:
+        from . import async_utils  # pylint: disable=import-outside-toplevel
+        return getattr(async_utils, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = ["get_sqlalchemy_engine", "check_if_table_exists",
            "get_columns_to_add", "add_columns_to_table", 
            "get_only_new_rows", "standardize_sql_column_names",
-           "convert_dataframe_column_types", "get_column_types"]
+           "convert_dataframe_column_types", "get_column_types",
+           "compute_row_hash", "iter_only_new_rows", "stream_only_new_rows",
+           "bulk_insert_dataframe", "dispose_sqlalchemy_engines",
+           "SchemaCache", "get_schema_cache", "sync_table_columns",
+           "ColumnConversionPlan", "infer_sql_column_types",
+           "WatermarkStore", "extract_incremental",
+           "iter_sql_partitioned", "read_sql_partitioned",
+           "iter_record_batches", "read_sql_columnar", "SnapshotCache",
+           "get_async_sqlalchemy_engine", "async_check_if_table_exists",
+           "async_get_column_types", "async_get_only_new_rows",
+           "async_bulk_insert_dataframe", "check_if_tables_exist",
+           "get_tables_column_types", "QueryProfiler"]
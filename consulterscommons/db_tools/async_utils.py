@@ -0,0 +1,233 @@
+"""
+Módulo con las versiones asíncronas de las funciones principales de db_tools, sobre la extensión asyncio de SQLAlchemy.
+
+Con SQL Server se usa el driver aioodbc, que ejecuta las llamadas de pyodbc en un pool de hilos, por lo que un mismo
+worker puede tener muchas consultas en curso a la vez sin bloquear un hilo por consulta. Las funciones reciben un
+AsyncEngine y ejecutan la lógica de las versiones sincrónicas dentro de AsyncConnection.run_sync, por lo que el
+resultado es el mismo. Localmente se pueden probar con SQLite y aiosqlite (sqlite+aiosqlite://).
+"""
+
+import time
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from prefect import task
+
+from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.db_tools.bulk_writer import _check_upsert_keys, _write_dataframe
+from consulterscommons.db_tools.schema_cache import get_schema_cache
+from consulterscommons.db_tools.sqlalchemy_utils import (
+    _build_connection_url,
+    _get_keyring_credentials,
+    get_only_new_rows,
+)
+
+logger_global = PrefectLogger(__file__)
+
+
+@task(retries=2, retry_delay_seconds=5)
+async def get_async_sqlalchemy_engine(server: str,
+                                      database: str,
+                                      username: str,
+                                      password: str = None,
+                                      pool_size: int = 5,
+                                      max_overflow: int = 10,
+                                      pool_timeout: int = 30,
+                                      pool_recycle: int = 3600,
+                                      pool_pre_ping: bool = True) -> AsyncEngine:
+    """
+    Inicializa un motor asíncrono de SQLAlchemy para SQL Server con el driver aioodbc.
+
+    A diferencia de get_sqlalchemy_engine los motores no se guardan en un registro, porque las conexiones de un motor
+    asíncrono quedan asociadas al event loop en el que se crearon. Se debe cerrar con 'await engine.dispose()'
+    antes de que termine el event loop.
+
+    Args:
+        server (str): El nombre del servidor SQL Server.
+        database (str): El nombre de la base de datos.
+        username (str): El nombre de usuario para la conexión.
+        password (str, opcional): La contraseña para la conexión. Si no se proporciona, se buscará en el Credential Manager. Por defecto es None.
+        pool_size (int, opcional): Cantidad de conexiones que se mantienen abiertas en el pool. Por defecto es 5.
+        max_overflow (int, opcional): Conexiones adicionales permitidas por encima de pool_size. Por defecto es 10.
+        pool_timeout (int, opcional): Segundos a esperar por una conexión libre del pool. Por defecto es 30.
+        pool_recycle (int, opcional): Segundos tras los cuales se recicla una conexión. Por defecto es 3600.
+        pool_pre_ping (bool, opcional): Si es True se valida cada conexión al tomarla del pool. Por defecto es True.
+
+    Returns:
+        sqlalchemy.ext.asyncio.AsyncEngine: El motor asíncrono si la conexión se establece correctamente.
+
+    Raises:
+        kr.errors.KeyringError: Se produce si no se encuentran las credenciales en el Credential Manager.
+        SQLAlchemyError: Se produce si hay un error al conectar a la base de datos.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    if password is None:
+        username, password = _get_keyring_credentials(server, username)
+
+    engine = create_async_engine(_build_connection_url("mssql+aioodbc", server, database, username, password),
+                                 pool_size=pool_size,
+                                 max_overflow=max_overflow,
+                                 pool_timeout=pool_timeout,
+                                 pool_recycle=pool_recycle,
+                                 pool_pre_ping=pool_pre_ping,
+                                 fast_executemany=True)
+
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        logger.info("Conectado exitosamente a SQL Server con SQLAlchemy (asíncrono).")
+    except sqlalchemy.exc.SQLAlchemyError as connect_err:
+        logger.error("Error al conectar a la base de datos: %s", str(connect_err))
+        await engine.dispose()
+        raise
+
+    return engine
+
+
+async def async_check_if_table_exists(engine: AsyncEngine, table_name: str, schema: str, use_cache: bool = True) -> bool:
+    """
+    Versión asíncrona de check_if_table_exists.
+
+    Args:
+        engine (sqlalchemy.ext.asyncio.AsyncEngine): El motor asíncrono de SQLAlchemy.
+        table_name (str): El nombre de la tabla.
+        schema (str): El nombre del esquema de la tabla.
+        use_cache (bool, opcional): Si es True se usa la caché de esquema del motor (ver get_schema_cache). Por defecto es True.
+
+    Returns:
+        bool: True si la tabla existe, False si no.
+    """
+    async with engine.connect() as connection:
+        if use_cache:
+            cache = get_schema_cache(engine.sync_engine)
+            return await connection.run_sync(
+                lambda sync_connection: cache.has_table(table_name, schema, connection=sync_connection)
+            )
+
+        return await connection.run_sync(
+            lambda sync_connection: inspect(sync_connection).has_table(table_name, schema=schema)
+        )
+
+
+async def async_get_column_types(engine: AsyncEngine, table_name: str, schema: str, use_cache: bool = True) -> dict:
+    """
+    Versión asíncrona de get_column_types.
+
+    Args:
+        engine (sqlalchemy.ext.asyncio.AsyncEngine): El motor asíncrono de SQLAlchemy.
+        table_name (str): El nombre de la tabla.
+        schema (str): El nombre del esquema de la tabla.
+        use_cache (bool, opcional): Si es True se usa la caché de esquema del motor (ver get_schema_cache). Por defecto es True.
+
+    Returns:
+        dict: Un diccionario que contiene los nombres de las columnas como claves y sus tipos de datos como valores.
+    """
+    async with engine.connect() as connection:
+        if use_cache:
+            cache = get_schema_cache(engine.sync_engine)
+            return await connection.run_sync(
+                lambda sync_connection: cache.get_column_types(table_name, schema, connection=sync_connection)
+            )
+
+        columns = await connection.run_sync(
+            lambda sync_connection: inspect(sync_connection).get_columns(table_name, schema=schema)
+        )
+        return {col['name']: col['type'] for col in columns}
+
+
+@task
+async def async_get_only_new_rows(df_new: pd.DataFrame,
+                                  engine: AsyncEngine,
+                                  table_name: str,
+                                  table_schema: str,
+                                  columns_to_compare: list[str],
+                                  key_columns: list[str],
+                                  timestamp_column: str = 'TIMESTAMP_LECTURA',
+                                  compare_mode: str = 'merge',
+                                  hash_column: str = None,
+                                  key_pushdown: str = None,
+                                  fetch_mode: str = 'pandas') -> pd.DataFrame:
+    """
+    Versión asíncrona de get_only_new_rows. Los argumentos y el resultado son los mismos, salvo snapshot_cache
+    que no está disponible.
+
+    Toda la comparación se hace con una única conexión del motor. Mientras se espera a la base de datos el event loop
+    puede avanzar con otras tareas, pero la comparación en pandas se ejecuta en el hilo del event loop.
+
+    Returns:
+        pandas.DataFrame: Las filas de df_new que no existen en la tabla.
+    """
+    if not isinstance(engine, AsyncEngine):
+        raise TypeError("engine debe ser un objeto SQLAlchemy AsyncEngine.")
+
+    async with engine.connect() as connection:
+        return await connection.run_sync(
+            lambda sync_connection: get_only_new_rows.fn(df_new, sync_connection, table_name, table_schema,
+                                                         columns_to_compare, key_columns,
+                                                         timestamp_column=timestamp_column,
+                                                         compare_mode=compare_mode,
+                                                         hash_column=hash_column,
+                                                         key_pushdown=key_pushdown,
+                                                         fetch_mode=fetch_mode)
+        )
+
+
+@task
+async def async_bulk_insert_dataframe(df: pd.DataFrame,
+                                      engine: AsyncEngine,
+                                      table_name: str,
+                                      schema: str,
+                                      key_columns: list[str] = None,
+                                      chunksize: int = 50_000) -> dict:
+    """
+    Versión asíncrona de bulk_insert_dataframe, con una transacción por lote y upsert si se indican columnas clave.
+    El modo dry_run no está disponible.
+
+    Args:
+        df (pandas.DataFrame): El DataFrame con los datos a escribir. Sus columnas deben existir en la tabla.
+        engine (sqlalchemy.ext.asyncio.AsyncEngine): El motor asíncrono de SQLAlchemy.
+        table_name (str): El nombre de la tabla.
+        schema (str): El nombre del esquema de la tabla.
+        key_columns (list[str], opcional): Columnas clave para hacer upsert. Las claves no se pueden repetir en df.
+            Si es None solo se inserta. Por defecto es None.
+        chunksize (int, opcional): Cantidad de filas por lote y transacción. Por defecto es 50_000.
+
+    Returns:
+        dict: Estadísticas de la escritura con las claves 'rows', 'seconds', 'rows_per_second' y 'dry_run'.
+
+    Raises:
+        ValueError: Se produce si las columnas clave no están en df o si hay filas con columnas clave nulas o repetidas.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("df debe ser un DataFrame de pandas.")
+
+    if isinstance(key_columns, pd.Index):
+        key_columns = key_columns.tolist()
+
+    if key_columns and not all(col in df.columns for col in key_columns):
+        raise ValueError("Las columnas clave deben estar presentes en el DataFrame df.")
+
+    if key_columns:
+        _check_upsert_keys(df, key_columns)
+
+    start_time = time.perf_counter()
+    async with engine.connect() as connection:
+        rows = await connection.run_sync(_write_dataframe, df, table_name, schema, key_columns, chunksize)
+    seconds = time.perf_counter() - start_time
+
+    stats = {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else float(rows),
+        'dry_run': False,
+    }
+
+    logger.info("Se escribieron %s filas en '%s.%s' en %.2f segundos (%s filas/seg)",
+                rows, schema, table_name, seconds, stats['rows_per_second'])
+
+    return stats
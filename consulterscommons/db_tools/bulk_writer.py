@@ -0,0 +1,251 @@
+"""
+Módulo para escribir DataFrames en SQL Server de forma masiva.
+
+Inserta por lotes usando fast_executemany de pyodbc (o INSERT de múltiples filas en otros dialectos), con una transacción
+por lote y la opción de hacer upsert con MERGE sobre las columnas clave.
+Permite hacer una prueba (dry run) sobre una copia de la tabla en SQLite en memoria sin tocar la base de datos.
+"""
+
+import time
+
+import sqlalchemy
+from sqlalchemy import create_engine, text
+from sqlalchemy import MetaData
+from sqlalchemy.pool import StaticPool
+import pandas as pd
+from prefect import task
+
+from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.db_tools.sqlalchemy_utils import (
+    _create_staging_table,
+    _insert_dataframe,
+    _quote_identifier,
+    _sqlalchemy_type_from_dtype,
+    check_if_table_exists,
+    get_column_types,
+)
+from consulterscommons.db_tools.schema_cache import get_schema_cache
+
+logger_global = PrefectLogger(__file__)
+
+
+def _check_upsert_keys(df: pd.DataFrame, key_columns: list[str]) -> None:
+    """
+    Verifica que las columnas clave no tengan nulos ni se repitan en el DataFrame. Las claves nulas nunca coinciden con
+    las de la tabla (NULL = NULL no es verdadero), por lo que se volverían a insertar en cada ejecución. Con claves
+    repetidas el MERGE de SQL Server falla al intentar actualizar la misma fila más de una vez, y en otros dialectos se
+    insertarían filas duplicadas.
+    """
+    null_keys = df[key_columns].isna().any(axis=1)
+    if null_keys.any():
+        examples = df.loc[null_keys, key_columns].head(5).to_dict('records')
+        raise ValueError(f"Hay {int(null_keys.sum())} filas con columnas clave nulas, por ejemplo {examples}. "
+                         "Las filas con claves nulas no se pueden actualizar: quitarlas o completarlas antes de escribir.")
+
+    duplicated = df.duplicated(subset=key_columns, keep=False)
+    if duplicated.any():
+        examples = df.loc[duplicated, key_columns].drop_duplicates().head(5).to_dict('records')
+        raise ValueError(f"Hay {int(duplicated.sum())} filas con columnas clave repetidas, por ejemplo {examples}. "
+                         "Quitar los duplicados antes de escribir, por ejemplo con "
+                         "df.drop_duplicates(subset=key_columns, keep='last').")
+
+
+def _build_upsert_statements(connection: sqlalchemy.engine.base.Connection,
+                             target_name: str,
+                             staging_name: str,
+                             columns: list[str],
+                             key_columns: list[str]) -> list[str]:
+    """
+    Construye las sentencias para actualizar o insertar las filas de la tabla temporal en la tabla destino.
+    En SQL Server se usa un único MERGE. En otros dialectos se eliminan las filas existentes y se insertan las nuevas.
+    """
+    columns_str = ', '.join([_quote_identifier(col) for col in columns])
+    on_str = ' AND '.join([f"t.{_quote_identifier(col)} = s.{_quote_identifier(col)}" for col in key_columns])
+    update_columns = [col for col in columns if col not in key_columns]
+
+    if connection.dialect.name == 'mssql':
+        update_str = ', '.join([f"t.{_quote_identifier(col)} = s.{_quote_identifier(col)}" for col in update_columns])
+        values_str = ', '.join([f"s.{_quote_identifier(col)}" for col in columns])
+        merge_query = f"""
+        MERGE {target_name} AS t
+        USING {staging_name} AS s
+        ON {on_str}
+        {f'WHEN MATCHED THEN UPDATE SET {update_str}' if update_columns else ''}
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT ({columns_str}) VALUES ({values_str});
+        """
+        return [merge_query]
+
+    delete_on_str = ' AND '.join([f"{target_name}.{_quote_identifier(col)} = s.{_quote_identifier(col)}" for col in key_columns])
+    delete_query = f"DELETE FROM {target_name} WHERE EXISTS (SELECT 1 FROM {staging_name} AS s WHERE {delete_on_str})"
+    insert_query = f"INSERT INTO {target_name} ({columns_str}) SELECT {columns_str} FROM {staging_name}"
+    return [delete_query, insert_query]
+
+
+def _cleanup(fn, description: str) -> None:
+    """
+    Ejecuta un paso de limpieza sin ocultar el error original: si falla, el error se registra en el log y no se propaga.
+    """
+    try:
+        fn()
+    except Exception as cleanup_err:  # pylint: disable=broad-except
+        logger_global.obtener_logger().warning("No se pudo %s: %s", description, cleanup_err)
+
+
+def _write_dataframe(connection: sqlalchemy.engine.base.Connection,
+                     df: pd.DataFrame,
+                     table_name: str,
+                     schema: str,
+                     key_columns: list[str] = None,
+                     chunksize: int = 50_000) -> int:
+    """
+    Escribe el DataFrame en la tabla usando la conexión indicada, con una transacción por lote de chunksize filas.
+    Devuelve la cantidad de filas escritas.
+    """
+    columns = df.columns.tolist()
+    target_table = sqlalchemy.table(table_name, *[sqlalchemy.column(col) for col in columns], schema=schema)
+
+    staging_table = None
+    if key_columns:
+        # Con los tipos de la tabla destino el ON del MERGE compara con la misma intercalación
+        table_column_types = get_schema_cache(connection.engine).get_column_types(table_name, schema, connection=connection)
+        staging_table = _create_staging_table(connection, df, f'UPSERT_{table_name}', table_column_types)
+        connection.commit()
+
+    target_name = f"{_quote_identifier(schema)}.{_quote_identifier(table_name)}"
+
+    try:
+        for start in range(0, len(df), chunksize):
+            df_chunk = df.iloc[start:start + chunksize]
+
+            if staging_table is None:
+                _insert_dataframe(connection, target_table, df_chunk, chunksize)
+            else:
+                staging_name = _quote_identifier(staging_table.name)
+                _insert_dataframe(connection, staging_table, df_chunk, chunksize)
+                for query in _build_upsert_statements(connection, target_name, staging_name, columns, key_columns):
+                    connection.execute(text(query))
+                connection.execute(text(f"DELETE FROM {staging_name}"))
+
+            connection.commit()
+    except Exception:
+        _cleanup(connection.rollback, "revertir la transacción")
+        raise
+    finally:
+        if staging_table is not None:
+            def drop_staging_table():
+                staging_table.drop(connection)
+                connection.commit()
+
+            _cleanup(drop_staging_table, f"eliminar la tabla temporal {staging_table.name}")
+
+    return len(df)
+
+
+def _create_dry_run_engine(engine: sqlalchemy.engine.base.Engine,
+                           df: pd.DataFrame,
+                           table_name: str,
+                           schema: str) -> sqlalchemy.engine.base.Engine:
+    """
+    Crea un motor SQLite en memoria con una copia vacía de la tabla destino en el mismo esquema.
+    Si la tabla no existe en la base de datos se crea a partir de los tipos del DataFrame.
+    """
+    dry_run_engine = create_engine('sqlite://', poolclass=StaticPool)
+
+    # En SQLite los esquemas son bases de datos adjuntas, 'main' y 'temp' ya existen
+    if schema not in ('main', 'temp'):
+        with dry_run_engine.connect() as connection:
+            connection.execute(text(f"ATTACH DATABASE ':memory:' AS {_quote_identifier(schema)}"))
+            connection.commit()
+
+    if check_if_table_exists(engine, table_name, schema):
+        column_types = get_column_types(engine, table_name, schema)
+    else:
+        column_types = {col: _sqlalchemy_type_from_dtype(df[col].dtype) for col in df.columns}
+
+    columns = []
+    for col, col_type in column_types.items():
+        # Los tipos propios de SQL Server no siempre se pueden crear en SQLite, se usa su equivalente genérico
+        try:
+            col_type = col_type.as_generic()
+        except NotImplementedError:
+            col_type = sqlalchemy.types.Unicode()
+        columns.append(sqlalchemy.Column(col, col_type))
+
+    dry_run_table = sqlalchemy.Table(table_name, MetaData(), *columns, schema=schema)
+    with dry_run_engine.connect() as connection:
+        dry_run_table.create(connection)
+        connection.commit()
+
+    return dry_run_engine
+
+
+@task
+def bulk_insert_dataframe(df: pd.DataFrame,
+                          engine: sqlalchemy.engine.base.Engine,
+                          table_name: str,
+                          schema: str,
+                          key_columns: list[str] = None,
+                          chunksize: int = 50_000,
+                          dry_run: bool = False) -> dict:
+    """
+    Inserta un DataFrame en una tabla de forma masiva, o hace upsert si se indican columnas clave.
+
+    Con SQL Server y pyodbc cada lote se envía como un arreglo de parámetros con fast_executemany. En otros dialectos se usan
+    INSERT de múltiples filas que respetan el límite de 2100 parámetros de SQL Server. Cada lote se confirma en su propia
+    transacción, por lo que si falla un lote los anteriores quedan escritos.
+
+    Args:
+        df (pandas.DataFrame): El DataFrame con los datos a escribir. Sus columnas deben existir en la tabla.
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+        table_name (str): El nombre de la tabla.
+        schema (str): El nombre del esquema de la tabla.
+        key_columns (list[str], opcional): Columnas clave para hacer upsert. Las filas con claves existentes se actualizan
+            (MERGE en SQL Server) y el resto se insertan. Las claves no pueden ser nulas ni repetirse en df. Si es None
+            solo se inserta. Por defecto es None.
+        chunksize (int, opcional): Cantidad de filas por lote y transacción. Por defecto es 50_000.
+        dry_run (bool, opcional): Si es True se escribe en una copia vacía de la tabla en SQLite en memoria, sin modificar
+            la base de datos. Sirve para validar los datos y probar el flujo. Por defecto es False.
+
+    Returns:
+        dict: Estadísticas de la escritura con las claves 'rows', 'seconds', 'rows_per_second' y 'dry_run'.
+
+    Raises:
+        ValueError: Se produce si las columnas clave no están en df o si hay filas con columnas clave nulas o repetidas.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("df debe ser un DataFrame de pandas.")
+
+    if isinstance(key_columns, pd.Index):
+        key_columns = key_columns.tolist()
+
+    if key_columns and not all(col in df.columns for col in key_columns):
+        raise ValueError("Las columnas clave deben estar presentes en el DataFrame df.")
+
+    if key_columns:
+        _check_upsert_keys(df, key_columns)
+
+    target_engine = _create_dry_run_engine(engine, df, table_name, schema) if dry_run else engine
+
+    start_time = time.perf_counter()
+    try:
+        with target_engine.connect() as connection:
+            rows = _write_dataframe(connection, df, table_name, schema, key_columns, chunksize)
+    finally:
+        if dry_run:
+            target_engine.dispose()
+    seconds = time.perf_counter() - start_time
+
+    stats = {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else float(rows),
+        'dry_run': dry_run,
+    }
+
+    logger.info("Se escribieron %s filas en '%s.%s' en %.2f segundos (%s filas/seg)%s",
+                rows, schema, table_name, seconds, stats['rows_per_second'], " [dry run]" if dry_run else "")
+
+    return stats
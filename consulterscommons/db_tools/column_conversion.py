@@ -0,0 +1,172 @@
+"""
+Módulo para convertir los tipos de datos de las columnas de un DataFrame a los tipos de una tabla SQL.
+
+El plan de conversión se arma una sola vez a partir de los tipos de la tabla (por ejemplo con get_column_types)
+y se puede aplicar a varios DataFrames, por ejemplo a cada lote de un archivo grande.
+"""
+
+import decimal
+
+import pandas as pd
+import sqlalchemy
+
+# Valores de texto que se consideran nulos
+NULL_SENTINELS = ['nan', 'NaN', 'None', 'none', 'NULL', 'null']
+
+
+class ColumnConversionPlan:
+    """
+    Plan de conversión de columnas de un DataFrame a los tipos de datos de una tabla SQL.
+
+    Parámetros:
+    - column_types (dict): Un diccionario con los nombres de las columnas y sus tipos de datos de SQLAlchemy en la tabla SQL.
+    - string_dtype: Tipo de pandas para las columnas de texto, por ejemplo pd.StringDtype('pyarrow'). Por defecto es None:
+        las columnas de texto quedan como object con None en los nulos, igual que en convert_dataframe_column_types.
+    - decimal_mode (str): Conversión de las columnas DECIMAL/NUMERIC. Por defecto es None.
+        - None: No se convierten.
+        - 'decimal': Se convierten a objetos decimal.Decimal, sin perder precisión.
+        - 'float': Se convierten a float, con la pérdida de precisión que eso implica.
+    - boolean_values (dict): Si se indica, las columnas BIT se convierten a boolean (nullable). Además de True/False y 1/0
+        se aceptan las claves del diccionario, por ejemplo {'Sí': True, 'No': False}. Si aparece un valor que no está
+        en el diccionario se produce un ValueError. Por defecto es None y las columnas BIT no se convierten.
+    - convert_dates (bool): Si es True las columnas DATE también se convierten a datetime (los valores que no se pueden
+        interpretar quedan como NaT). Por defecto es False y, igual que en convert_dataframe_column_types, solo se
+        convierten las columnas DATETIME.
+
+    Atributos:
+    - conversions (dict): Columnas a convertir y el tipo de conversión ('integer', 'float', 'decimal', 'datetime',
+        'boolean' o 'string').
+
+    Uso:
+        - plan = ColumnConversionPlan(get_column_types(engine, 'TABLA', 'dbo'))
+        - for df_chunk in chunks:
+            df_chunk = plan.apply(df_chunk)
+
+    Las columnas enteras se convierten a Int64 (nullable), las de punto flotante a float, las de fecha y hora a datetime
+    y las de texto a string, reemplazando por nulos los valores de NULL_SENTINELS.
+    Las columnas que ya tienen el tipo destino no se vuelven a convertir.
+    """
+
+    def __init__(self,
+                 column_types: dict,
+                 string_dtype=None,
+                 decimal_mode: str = None,
+                 boolean_values: dict = None,
+                 convert_dates: bool = False):
+        if decimal_mode not in (None, 'decimal', 'float'):
+            raise ValueError("decimal_mode debe ser None, 'decimal' o 'float'.")
+
+        self.string_dtype = string_dtype
+        self.boolean_values = boolean_values
+        self.conversions = {}
+
+        for column, dtype in column_types.items():
+            if isinstance(dtype, sqlalchemy.types.Integer):
+                self.conversions[column] = 'integer'
+            elif isinstance(dtype, sqlalchemy.types.Float):
+                self.conversions[column] = 'float'
+            elif isinstance(dtype, sqlalchemy.types.Numeric):
+                # DECIMAL/NUMERIC: solo si se pidió explícitamente
+                if decimal_mode is not None:
+                    self.conversions[column] = decimal_mode
+            elif isinstance(dtype, sqlalchemy.types.DateTime):
+                self.conversions[column] = 'datetime'
+            elif isinstance(dtype, sqlalchemy.types.Date):
+                # DATE: solo si se pidió explícitamente
+                if convert_dates:
+                    self.conversions[column] = 'datetime'
+            elif isinstance(dtype, sqlalchemy.types.Boolean):
+                if boolean_values is not None:
+                    self.conversions[column] = 'boolean'
+            elif isinstance(dtype, sqlalchemy.types.String):
+                self.conversions[column] = 'string'
+
+    @staticmethod
+    def _to_decimal(value):
+        if pd.isna(value):
+            return None
+        try:
+            # Con str se conserva la representación decimal de los float (0.1 y no 0.1000000000000000055...)
+            return value if isinstance(value, decimal.Decimal) else decimal.Decimal(str(value).strip())
+        except decimal.InvalidOperation:
+            return None
+
+    def _convert_boolean(self, series: pd.Series) -> pd.Series:
+        """
+        Convierte una columna BIT a boolean con boolean_values. Los valores que no se pueden interpretar producen un
+        ValueError en lugar de convertirse en nulos.
+        """
+        mapping = {True: True, False: False, **self.boolean_values}
+        # Con mapping.get las búsquedas son por igualdad de Python, por lo que 1 y 0 coinciden con True y False
+        converted = series.map(mapping.get, na_action='ignore')
+
+        invalid = series.notna() & converted.isna()
+        if invalid.any():
+            examples = series[invalid].drop_duplicates().head(5).tolist()
+            raise ValueError(f"La columna '{series.name}' tiene valores que no se pueden convertir a BIT: {examples}. "
+                             "Agregarlos a boolean_values.")
+
+        return converted.astype('boolean')
+
+    def _convert_series(self, series: pd.Series, conversion: str) -> pd.Series:
+        """
+        Convierte una columna según el tipo de conversión. Devuelve None si la columna ya tiene el tipo destino.
+        """
+        if conversion == 'integer':
+            if isinstance(series.dtype, pd.Int64Dtype):
+                return None
+            return pd.to_numeric(series, errors='coerce').astype('Int64')
+
+        if conversion == 'float':
+            if series.dtype == 'float64':
+                return None
+            return pd.to_numeric(series, errors='coerce').astype('float')
+
+        if conversion == 'decimal':
+            return series.map(self._to_decimal).astype(object)
+
+        if conversion == 'datetime':
+            if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                return None
+            return pd.to_datetime(series, errors='coerce')
+
+        if conversion == 'boolean':
+            if isinstance(series.dtype, pd.BooleanDtype):
+                return None
+            if pd.api.types.is_bool_dtype(series.dtype):
+                return series.astype('boolean')
+            return self._convert_boolean(series)
+
+        if self.string_dtype is None:
+            # Texto como object: los nulos y los valores centinela se detectan sobre los valores originales (antes de
+            # pasar a texto, donde NaN y None serían 'nan' y 'None') y quedan como None. Si la columna ya es de textos
+            # no se vuelve a convertir
+            null_mask = series.isna() | series.isin(NULL_SENTINELS)
+            if not (series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')):
+                series = series.astype(str).astype(object)
+            return series.mask(null_mask, None)
+
+        # Texto con tipo string de pandas: los nulos pasan a NA sin convertirse al texto 'nan' y luego se anulan los centinela
+        if series.dtype != self.string_dtype:
+            series = series.astype(self.string_dtype)
+        return series.mask(series.isin(NULL_SENTINELS))
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Aplica el plan al DataFrame, modificando sus columnas.
+
+        Args:
+            df (pandas.DataFrame): El DataFrame con los datos.
+
+        Returns:
+            pandas.DataFrame: El DataFrame con los tipos de datos de las columnas convertidos.
+        """
+        for column, conversion in self.conversions.items():
+            if column not in df.columns:
+                continue
+
+            converted = self._convert_series(df[column], conversion)
+            if converted is not None:
+                df[column] = converted
+
+        return df
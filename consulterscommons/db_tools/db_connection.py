@@ -1,19 +1,524 @@
 """
 Módulo para establecer una conexión a una base de datos SQL Server.
 Utiliza Prefect para el manejo de logs y keyring para la obtención de contraseñas.
+
+Además de abrir conexiones sueltas, permite reutilizarlas con un pool (SQLServerConnectionPool) que valida las conexiones,
+cierra las inactivas y reintenta con espera exponencial ante errores transitorios de SQL Server.
 """
 
+import atexit
+import functools
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
 import pyodbc
 import keyring as kr
 from prefect import task
 
 from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.credential_tools import get_keyring_credential, invalidate_credentials
 
 logger_global = PrefectLogger(__file__)
 
+# Drivers ODBC de SQL Server en orden de preferencia
+PREFERRED_ODBC_DRIVERS = [
+    'ODBC Driver 17 for SQL Server',
+    'ODBC Driver 18 for SQL Server',
+    'ODBC Driver 13 for SQL Server',
+    'SQL Server Native Client 11.0',
+    'SQL Server',
+]
+
+# SQLSTATE de errores transitorios: conexión perdida o rechazada, timeouts y deadlocks
+TRANSIENT_SQLSTATES = {'08S01', '08001', '08004', '08007', 'HYT00', 'HYT01', '40001'}
+
+# Códigos de error nativos de SQL Server transitorios (deadlock, base no disponible, límites de recursos, red)
+TRANSIENT_ERROR_CODES = {-2, 64, 233, 1205, 4060, 4221, 10053, 10054, 10060, 10928, 10929, 40143, 40197, 40501,
+                         40613, 49918, 49919, 49920}
+
+# Error de inicio de sesión: SQLSTATE 28000 y código nativo 18456 (por ejemplo, tras un cambio de contraseña)
+LOGIN_FAILED_SQLSTATE = '28000'
+LOGIN_FAILED_ERROR_CODE = 18456
+
+_NATIVE_ERROR_PATTERN = re.compile(r'\((-?\d+)\)')
+
+
+@functools.lru_cache(maxsize=None)
+def detect_odbc_driver() -> str:
+    """
+    Devuelve el driver ODBC de SQL Server instalado, según el orden de PREFERRED_ODBC_DRIVERS.
+
+    Returns:
+        str: El nombre del driver, por ejemplo 'ODBC Driver 17 for SQL Server'.
+
+    Raises:
+        RuntimeError: Se produce si no hay ningún driver ODBC de SQL Server instalado.
+    """
+    installed = pyodbc.drivers()
+
+    for driver in PREFERRED_ODBC_DRIVERS:
+        if driver in installed:
+            return driver
+
+    # Versiones más nuevas que no están en la lista
+    sql_server_drivers = sorted(driver for driver in installed if 'SQL Server' in driver)
+    if sql_server_drivers:
+        return sql_server_drivers[-1]
+
+    raise RuntimeError(f"No se encontró un driver ODBC de SQL Server. Drivers instalados: {installed}")
+
+
+def _build_connection_string(server: str, database: str, username: str, password: str, driver: str = None) -> str:
+    return (
+        f'DRIVER={{{driver or detect_odbc_driver()}}};'
+        f'SERVER={server};'
+        f'DATABASE={database};'
+        f'UID={username};'
+        f'PWD={password}'
+    )
+
+
+def _get_credentials(server: str, username: str) -> tuple[str, str]:
+    """
+    Obtiene el usuario y la contraseña del Credential Manager, a través de la caché de credenciales.
+
+    Raises:
+        kr.errors.KeyringError: Se produce si no se encuentran las credenciales en el Credential Manager.
+    """
+    logger = logger_global.obtener_logger()
+
+    credencial = get_keyring_credential(server, username)
+    if not credencial:
+        error_msg = f"No se encontraron credenciales para {username} en el Credential Manager"
+        logger.warning(error_msg)
+        raise kr.errors.KeyringError(error_msg)
+
+    logger.info("Se obtuvieron las credenciales para %s", credencial.username)
+    return credencial.username, credencial.password
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Indica si el error de pyodbc es transitorio (y vale la pena reintentar) según su SQLSTATE o su código nativo.
+
+    Args:
+        error (Exception): El error a evaluar.
+
+    Returns:
+        bool: True si el error es transitorio.
+    """
+    if not isinstance(error, pyodbc.Error) or not error.args:
+        return False
+
+    sqlstate = str(error.args[0])
+    if sqlstate in TRANSIENT_SQLSTATES:
+        return True
+
+    message = str(error.args[1]) if len(error.args) > 1 else ''
+    return any(int(code) in TRANSIENT_ERROR_CODES for code in _NATIVE_ERROR_PATTERN.findall(message))
+
+
+def is_login_error(error: Exception) -> bool:
+    """
+    Indica si el error de pyodbc es un inicio de sesión fallido (SQLSTATE 28000 o error 18456), por ejemplo porque la
+    contraseña cambió.
+
+    Args:
+        error (Exception): El error a evaluar.
+
+    Returns:
+        bool: True si el error es de inicio de sesión.
+    """
+    if not isinstance(error, pyodbc.Error) or not error.args:
+        return False
+
+    if str(error.args[0]) == LOGIN_FAILED_SQLSTATE:
+        return True
+
+    message = str(error.args[1]) if len(error.args) > 1 else ''
+    return any(int(code) == LOGIN_FAILED_ERROR_CODE for code in _NATIVE_ERROR_PATTERN.findall(message))
+
+
+def _get_backoff_seconds(attempt: int, backoff_base: float, backoff_max: float) -> float:
+    """
+    Espera exponencial con variación aleatoria para el reintento número attempt (desde 0).
+    """
+    return min(backoff_max, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class _PooledConnection:
+    """
+    Conexión tomada de un SQLServerConnectionPool. Se usa igual que una pyodbc.Connection, pero close() la devuelve
+    al pool en lugar de cerrarla.
+    """
+
+    # Valores de clase para que __getattr__ (y __del__) no recurran si __init__ no llegó a asignarlos
+    _pool = None
+    _connection = None
+
+    def __init__(self, pool: 'SQLServerConnectionPool', connection: pyodbc.Connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, item):
+        if self._connection is None:
+            raise pyodbc.ProgrammingError('La conexión ya fue devuelta al pool.')
+        return getattr(self._connection, item)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Igual que pyodbc.Connection: confirma o revierte la transacción, sin cerrar la conexión
+        if self._connection is None or self._connection.autocommit:
+            return
+        if exc_type is None:
+            self._connection.commit()
+        else:
+            self._connection.rollback()
+
+    def __del__(self):
+        self.close()
+
+
+class SQLServerConnectionPool:
+    """
+    Pool de conexiones pyodbc a SQL Server.
+
+    Parámetros:
+    - server (str): El nombre del servidor SQL Server.
+    - database (str): El nombre de la base de datos.
+    - username (str): El nombre de usuario para la conexión.
+    - password (str): La contraseña. Si no se proporciona, se buscará en el Credential Manager. Por defecto es None.
+    - pool_size (int): Cantidad máxima de conexiones abiertas a la vez. Por defecto es 5.
+    - idle_timeout (float): Segundos de inactividad tras los cuales una conexión se cierra en lugar de reutilizarse.
+        Por defecto es 300.
+    - health_check_after (float): Segundos de inactividad a partir de los cuales la conexión se valida con SELECT 1
+        antes de entregarla. Con 0 se valida siempre. Por defecto es 30.
+    - max_retries (int): Reintentos ante errores transitorios al conectar y en run. Por defecto es 3.
+    - backoff_base (float): Segundos de espera antes del primer reintento, se duplica en cada reintento. Por defecto es 0.5.
+    - backoff_max (float): Espera máxima entre reintentos, en segundos. Por defecto es 10.
+    - driver (str): Driver ODBC. Por defecto se detecta el instalado (ver detect_odbc_driver).
+    - connect_timeout (int): Segundos de espera al abrir una conexión. Por defecto es 30.
+
+    Uso:
+        - pool = get_sql_server_pool(server, database, username)
+        - with pool.connection() as conn:
+            conn.execute(...)
+        - rows = pool.run(lambda conn: conn.execute(query).fetchall())  # Con reintentos ante errores transitorios
+    """
+
+    def __init__(self,
+                 server: str,
+                 database: str,
+                 username: str,
+                 password: str = None,
+                 pool_size: int = 5,
+                 idle_timeout: float = 300,
+                 health_check_after: float = 30,
+                 max_retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 10,
+                 driver: str = None,
+                 connect_timeout: int = 30):
+        # Usuario con el que se buscan las credenciales en el Credential Manager, para invalidarlas si el login falla
+        self._keyring_username = username if password is None else None
+        if password is None:
+            username, password = _get_credentials(server, username)
+
+        self.server = server
+        self.database = database
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self._connection_string = _build_connection_string(server, database, username, password, driver)
+
+        self._condition = threading.Condition()
+        # Conexiones libres como (conexión, momento en que se devolvió)
+        self._idle: deque[tuple[pyodbc.Connection, float]] = deque()
+        self._open_connections = 0
+        self._closed = False
+
+    def _retry(self, fn: Callable, description: str):
+        """
+        Ejecuta fn reintentando con espera exponencial ante errores transitorios.
+        """
+        logger = logger_global.obtener_logger()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn()
+            except pyodbc.Error as error:
+                if attempt == self.max_retries or not is_transient_error(error):
+                    raise
+                wait = _get_backoff_seconds(attempt, self.backoff_base, self.backoff_max)
+                logger.warning("Error transitorio al %s en %s (intento %s de %s), se reintenta en %.1f s: %s",
+                               description, self.server, attempt + 1, self.max_retries + 1, wait, error)
+                time.sleep(wait)
+
+        return None
+
+    def _open_connection(self) -> pyodbc.Connection:
+        try:
+            return pyodbc.connect(self._connection_string, timeout=self.connect_timeout)
+        except pyodbc.Error as error:
+            if is_login_error(error):
+                # Las credenciales del pool quedaron viejas: se cierra y se quita del registro para que el próximo
+                # get_sql_server_pool cree uno nuevo con las credenciales vigentes
+                _evict_sql_server_pool(self)
+            raise
+
+    def _connect(self) -> pyodbc.Connection:
+        return self._retry(self._open_connection, 'conectar')
+
+    @staticmethod
+    def _discard(connection: pyodbc.Connection) -> None:
+        try:
+            connection.close()
+        except pyodbc.Error:
+            pass
+
+    def _is_healthy(self, connection: pyodbc.Connection) -> bool:
+        try:
+            connection.cursor().execute('SELECT 1').fetchall()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self, timeout: float = None) -> pyodbc.Connection:
+        """
+        Toma una conexión del pool, abriendo una nueva si no hay libres y no se alcanzó pool_size.
+
+        Args:
+            timeout (float, opcional): Segundos a esperar por una conexión libre. Por defecto espera indefinidamente.
+
+        Returns:
+            pyodbc.Connection: La conexión. Se debe devolver con release.
+
+        Raises:
+            TimeoutError: Se produce si no se libera ninguna conexión en el tiempo indicado.
+        """
+        return self._acquire(timeout, retry_connect=True)
+
+    def _acquire(self, timeout: float, retry_connect: bool) -> pyodbc.Connection:
+        """
+        Implementación de acquire. Con retry_connect=False los errores al abrir una conexión nueva no se reintentan aquí,
+        para que run sea la única capa de reintentos.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("El pool de conexiones está cerrado.")
+
+                connection, released_at = self._idle.pop() if self._idle else (None, None)
+                can_open = connection is None and self._open_connections < self.pool_size
+                if can_open:
+                    # Se reserva el lugar antes de conectar, fuera del lock
+                    self._open_connections += 1
+                elif connection is None:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No se liberó ninguna conexión del pool de {self.server} en {timeout} s.")
+                    self._condition.wait(remaining)
+                    continue
+
+            if can_open:
+                try:
+                    return self._connect() if retry_connect else self._open_connection()
+                except Exception:
+                    with self._condition:
+                        self._open_connections -= 1
+                        self._condition.notify()
+                    raise
+
+            idle_seconds = time.monotonic() - released_at
+            if idle_seconds > self.idle_timeout or (idle_seconds >= self.health_check_after and not self._is_healthy(connection)):
+                self._discard(connection)
+                with self._condition:
+                    self._open_connections -= 1
+                continue
+
+            return connection
+
+    def release(self, connection: pyodbc.Connection, discard: bool = False) -> None:
+        """
+        Devuelve la conexión al pool. Las transacciones sin confirmar se revierten.
+
+        Args:
+            connection (pyodbc.Connection): La conexión tomada con acquire.
+            discard (bool, opcional): Si es True la conexión se cierra en lugar de reutilizarse. Por defecto es False.
+        """
+        if not discard:
+            try:
+                if not connection.autocommit:
+                    connection.rollback()
+            except pyodbc.Error:
+                discard = True
+
+        with self._condition:
+            if discard or self._closed:
+                self._discard(connection)
+                self._open_connections -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def get(self, timeout: float = None) -> _PooledConnection:
+        """
+        Toma una conexión del pool que se devuelve al llamar a su método close().
+        """
+        return _PooledConnection(self, self.acquire(timeout))
+
+    def connection(self, timeout: float = None):
+        """
+        Contexto que toma una conexión del pool y la devuelve al salir. Si ocurre un error transitorio la conexión se
+        descarta.
+        """
+        return self._borrow(timeout, retry_connect=True)
+
+    @contextmanager
+    def _borrow(self, timeout: float, retry_connect: bool):
+        connection = self._acquire(timeout, retry_connect)
+        discard = False
+        try:
+            yield connection
+        except pyodbc.Error as error:
+            discard = is_transient_error(error)
+            raise
+        finally:
+            self.release(connection, discard=discard)
+
+    def run(self, fn: Callable[[pyodbc.Connection], object], timeout: float = None):
+        """
+        Ejecuta fn con una conexión del pool y confirma la transacción. Ante un error transitorio se descarta la conexión
+        y se reintenta con otra, con espera exponencial, hasta max_retries veces.
+
+        Args:
+            fn (Callable[[pyodbc.Connection], object]): Función que recibe la conexión. Debe poder repetirse sin efectos
+                duplicados, porque la transacción fallida se revierte antes de reintentar.
+            timeout (float, opcional): Segundos a esperar por una conexión libre. Por defecto espera indefinidamente.
+
+        Returns:
+            El valor devuelto por fn.
+        """
+        # Los errores al conectar también se reintentan aquí, por eso la conexión se toma sin reintentos propios
+        def attempt():
+            with self._borrow(timeout, retry_connect=False) as connection:
+                result = fn(connection)
+                if not connection.autocommit:
+                    connection.commit()
+                return result
+
+        return self._retry(attempt, 'ejecutar')
+
+    def close(self) -> None:
+        """
+        Cierra las conexiones libres. Las conexiones en uso se cierran al devolverse.
+        """
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._discard(connection)
+                self._open_connections -= 1
+            self._condition.notify_all()
+
+
+# Pools creados por get_sql_server_pool, reutilizados dentro del proceso
+# Clave: (server, database, username, hash de la contraseña, driver, opciones del pool)
+# El hash es None si la contraseña se busca en el Credential Manager
+_POOL_REGISTRY: dict[tuple, SQLServerConnectionPool] = {}
+_POOL_REGISTRY_LOCK = threading.Lock()
+
+
+def get_sql_server_pool(server: str, database: str, username: str, password: str = None, driver: str = None,
+                        **pool_options) -> SQLServerConnectionPool:
+    """
+    Devuelve el pool de conexiones pyodbc para el servidor, la base de datos, el usuario, un hash de la contraseña
+    indicada, el driver y las opciones del pool, creándolo si no existe. Con otra contraseña u otras opciones se crea un
+    pool nuevo. Si una conexión nueva falla por un inicio de sesión rechazado, el pool se cierra y se quita del registro,
+    y la siguiente llamada vuelve a leer las credenciales. Los pools se cierran al terminar el proceso o con
+    close_sql_server_pools.
+
+    Args:
+        server (str): El nombre del servidor SQL Server.
+        database (str): El nombre de la base de datos.
+        username (str): El nombre de usuario para la conexión.
+        password (str, opcional): La contraseña. Si no se proporciona, se buscará en el Credential Manager. Por defecto es None.
+        driver (str, opcional): Driver ODBC. Por defecto se detecta el instalado (ver detect_odbc_driver).
+        **pool_options: Opciones del pool (ver SQLServerConnectionPool).
+
+    Returns:
+        SQLServerConnectionPool: El pool de conexiones.
+    """
+    # Se guarda un hash y no la contraseña, para que no quede en texto plano en el registro
+    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest() if password is not None else None
+    registry_key = (server, database, username, password_hash, driver, tuple(sorted(pool_options.items())))
+
+    with _POOL_REGISTRY_LOCK:
+        pool = _POOL_REGISTRY.get(registry_key)
+        if pool is None:
+            pool = SQLServerConnectionPool(server, database, username, password, driver=driver, **pool_options)
+            _POOL_REGISTRY[registry_key] = pool
+
+    return pool
+
+
+def _evict_sql_server_pool(pool: SQLServerConnectionPool) -> None:
+    """
+    Cierra el pool, lo quita del registro de get_sql_server_pool e invalida sus credenciales en la caché si se
+    obtuvieron del Credential Manager.
+    """
+    with _POOL_REGISTRY_LOCK:
+        for key in [key for key, registered in _POOL_REGISTRY.items() if registered is pool]:
+            del _POOL_REGISTRY[key]
+
+    pool.close()
+    if pool._keyring_username is not None:
+        invalidate_credentials('keyring', pool.server, pool._keyring_username)
+
+
+def close_sql_server_pools() -> int:
+    """
+    Cierra los pools de get_sql_server_pool y los quita del registro. Se llama automáticamente al terminar el proceso.
+
+    Returns:
+        int: Cantidad de pools cerrados.
+    """
+    with _POOL_REGISTRY_LOCK:
+        pools = list(_POOL_REGISTRY.values())
+        _POOL_REGISTRY.clear()
+
+    for pool in pools:
+        pool.close()
+
+    return len(pools)
+
+
+atexit.register(close_sql_server_pools)
+
 
 @task(retries=2, retry_delay_seconds=5)
-def connect_sql_server(server: str, database: str, username: str, password: str = None) -> (pyodbc.Connection | str):
+def connect_sql_server(server: str, database: str, username: str, password: str = None,
+                       use_pool: bool = False, driver: str = None,
+                       pool_timeout: float = 30) -> (pyodbc.Connection | str):
     """
     Inicializa una conexión a la base de datos SQL Server.
 
@@ -22,6 +527,11 @@ def connect_sql_server(server: str, database: str, username: str, password: str
         database (str): El nombre de la base de datos.
         username (str): El nombre de usuario para la conexión.
         password (str, optional): La contraseña para la conexión. Si no se proporciona, se buscará en el Credential Manager. Defaults to None.
+        use_pool (bool, optional): Si es True la conexión se toma del pool de get_sql_server_pool y al llamar a close()
+            vuelve al pool en lugar de cerrarse. Los errores transitorios al conectar se reintentan dentro del pool. Defaults to False.
+        driver (str, optional): Driver ODBC. Si no se indica se detecta el instalado (ver detect_odbc_driver). Defaults to None.
+        pool_timeout (float, optional): Con use_pool, segundos a esperar por una conexión libre si el pool está agotado.
+            Con None espera indefinidamente. Defaults to 30.
 
     Returns:
         pyodbc.Connection: La conexión a la base de datos SQL Server si se establece correctamente.
@@ -30,30 +540,37 @@ def connect_sql_server(server: str, database: str, username: str, password: str
     Raises:
         kr.errors.KeyringError: Se produce si no se encuentran las credenciales en el Credential Manager.
         pyodb.Error: Se produce si hay un error al conectar a la base de datos.
+        TimeoutError: Se produce si con use_pool no se libera ninguna conexión del pool en pool_timeout segundos.
     """
 
     logger = logger_global.obtener_logger_prefect()
-
-    if password is None:
-        credencial = kr.get_credential(server, username)
-        if credencial:
-            username = credencial.username
-            password = credencial.password
-            logger.info("Se obtuvieron las credenciales para %s", username)
-        else:
-            error_msg = f"No se encontraron credenciales para {username} en el Credential Manager"
-            logger.warning(error_msg)
-            raise kr.errors.KeyringError(error_msg)
+    keyring_username = username
+    password_from_keyring = password is None
 
     try:
+        if use_pool:
+            conecc_sql = get_sql_server_pool(server, database, username, password, driver=driver).get(pool_timeout)
+            logger.info("Conexión a SQL Server obtenida del pool")
+            return conecc_sql
+
+        if password_from_keyring:
+            username, password = _get_credentials(server, username)
+
         # Conexión a SQL Server
-        conecc_sql = pyodbc.connect(
-            f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}')
+        conecc_sql = pyodbc.connect(_build_connection_string(server, database, username, password, driver))
         logger.info("Conectado exitosamente a SQL Server")
 
     except pyodbc.Error as connect_err:
         error_msg = f"Error al conectar a la base de datos: {str(connect_err)}"
         logger.error(error_msg)
+        if password_from_keyring:
+            # La contraseña pudo haber cambiado: el reintento la vuelve a buscar en el Credential Manager
+            invalidate_credentials('keyring', server, keyring_username)
+        raise
+    except kr.errors.KeyringError:
+        raise
+    except TimeoutError as timeout_err:
+        logger.error(f"Pool de conexiones agotado: {str(timeout_err)}")
         raise
     except Exception as generic_err:  # pylint: disable=broad-except
         error_msg = f"Error inesperado: {str(generic_err)}"
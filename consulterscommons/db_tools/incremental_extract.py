@@ -0,0 +1,318 @@
+"""
+Módulo para extraer de forma incremental las filas nuevas de una tabla según una columna de fecha (marca de agua).
+
+Guarda localmente, por tabla y columna de fecha, el valor máximo leído (high-water mark) y en la siguiente ejecución
+solo lee las filas posteriores. La marca de agua solo avanza cuando la escritura de los datos terminó correctamente.
+
+Las filas que una transacción confirma tarde, con una fecha anterior a una marca de agua ya guardada, no se leen salvo
+que se indique una ventana de relectura (lookback).
+"""
+
+import json
+import numbers
+import os
+from contextlib import closing
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+from prefect import task
+
+from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.db_tools.sqlalchemy_utils import _quote_identifier
+
+logger_global = PrefectLogger(__file__)
+
+
+def _serialize_watermark(value) -> dict:
+    if isinstance(value, (pd.Timestamp, date, np.datetime64)):
+        return {'type': 'datetime', 'value': pd.Timestamp(value).isoformat()}
+    if isinstance(value, Decimal):
+        # Se guarda como texto para no perder precisión (json no admite Decimal)
+        return {'type': 'Decimal', 'value': str(value)}
+    if isinstance(value, np.generic):
+        value = value.item()
+    return {'type': type(value).__name__, 'value': value}
+
+
+def _coerce_watermark(value):
+    """
+    Convierte las marcas de agua de fecha a datetime para poder compararlas entre sí. Por ejemplo, en SQLite el MAX
+    de una columna de fecha se devuelve como texto.
+    """
+    if isinstance(value, str):
+        try:
+            return pd.Timestamp(value).to_pydatetime()
+        except ValueError:
+            return value
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    return value
+
+
+def _deserialize_watermark(data: dict):
+    if data is None:
+        return None
+    if data['type'] == 'datetime':
+        return pd.Timestamp(data['value']).to_pydatetime()
+    if data['type'] == 'Decimal':
+        return Decimal(data['value'])
+    return data['value']
+
+
+def _validate_lookback(lookback) -> None:
+    if lookback is None:
+        return
+    if isinstance(lookback, bool) or not isinstance(lookback, (timedelta, numbers.Real, Decimal)):
+        raise TypeError(f"lookback debe ser timedelta o un número, no {type(lookback).__name__}.")
+    if lookback < (timedelta(0) if isinstance(lookback, timedelta) else 0):
+        raise ValueError("lookback no puede ser negativo.")
+
+
+def _apply_lookback(watermark, lookback, state_key: str, timestamp_column: str):
+    """
+    Resta la ventana de relectura a la marca de agua guardada. lookback debe ser timedelta si la marca de agua es una
+    fecha y un número si es numérica.
+    """
+    if isinstance(watermark, datetime) and isinstance(lookback, timedelta):
+        return watermark - lookback
+
+    is_number = isinstance(watermark, (numbers.Real, Decimal)) and not isinstance(watermark, bool)
+    if is_number and not isinstance(lookback, timedelta):
+        if isinstance(watermark, Decimal) or isinstance(lookback, Decimal):
+            return Decimal(str(watermark)) - Decimal(str(lookback))
+        return watermark - lookback
+
+    raise TypeError(f"lookback ({lookback!r}) no corresponde a la marca de agua de '{state_key}' en {timestamp_column} "
+                    f"({watermark!r}): debe ser timedelta si la columna es de fecha o un número si es numérica.")
+
+
+class WatermarkStore:
+    """
+    Almacén local de marcas de agua por (tabla, columna de fecha).
+
+    Parámetros:
+    - path (str): Ruta del archivo de estado. Si termina en '.json' se guarda como JSON, si no como base de datos SQLite.
+
+    Métodos:
+    - get(state_key, timestamp_column): Devuelve la marca de agua guardada o None si no existe.
+    - set(state_key, timestamp_column, value): Guarda la marca de agua de forma atómica.
+    - reset(state_key, timestamp_column): Elimina la marca de agua para volver a leer la tabla completa.
+
+    El archivo JSON se reescribe en un archivo temporal que luego reemplaza al original, por lo que un corte a mitad
+    de la escritura no deja el estado corrupto. En SQLite cada cambio se hace en una transacción.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.use_json = path.lower().endswith('.json')
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if not self.use_json:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS watermarks (
+                        state_key TEXT NOT NULL,
+                        timestamp_column TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        updated_at TEXT NOT NULL,
+                        PRIMARY KEY (state_key, timestamp_column)
+                    )
+                """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _read_json(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_json(self, state: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def get(self, state_key: str, timestamp_column: str):
+        with self._lock:
+            if self.use_json:
+                data = self._read_json().get(state_key, {}).get(timestamp_column)
+                return _deserialize_watermark(data)
+
+            with closing(self._connect()) as connection, connection:
+                row = connection.execute(
+                    "SELECT value FROM watermarks WHERE state_key = ? AND timestamp_column = ?",
+                    (state_key, timestamp_column)
+                ).fetchone()
+            return _deserialize_watermark(json.loads(row[0])) if row else None
+
+    def set(self, state_key: str, timestamp_column: str, value) -> None:
+        data = _serialize_watermark(value)
+        updated_at = datetime.now(timezone.utc).isoformat()
+
+        with self._lock:
+            if self.use_json:
+                state = self._read_json()
+                state.setdefault(state_key, {})[timestamp_column] = {**data, 'updated_at': updated_at}
+                self._write_json(state)
+                return
+
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO watermarks (state_key, timestamp_column, value, updated_at) VALUES (?, ?, ?, ?)",
+                    (state_key, timestamp_column, json.dumps(data), updated_at)
+                )
+
+    def reset(self, state_key: str, timestamp_column: str) -> None:
+        with self._lock:
+            if self.use_json:
+                state = self._read_json()
+                state.get(state_key, {}).pop(timestamp_column, None)
+                self._write_json(state)
+                return
+
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM watermarks WHERE state_key = ? AND timestamp_column = ?",
+                                   (state_key, timestamp_column))
+
+
+@task
+def extract_incremental(engine: sqlalchemy.engine.base.Engine,
+                        table_name: str,
+                        schema: str,
+                        state_store: WatermarkStore | str,
+                        timestamp_column: str = 'TIMESTAMP_LECTURA',
+                        columns: list[str] = None,
+                        write_fn: Callable[[pd.DataFrame], None] = None,
+                        chunksize: int = None,
+                        state_key: str = None,
+                        lookback: timedelta | int | float = None) -> pd.DataFrame | int:
+    """
+    Lee solo las filas de la tabla con timestamp_column posterior a la última marca de agua guardada.
+
+    Antes de leer se toma el máximo actual de timestamp_column como límite superior, así las filas que se inserten
+    durante la lectura con una fecha posterior quedan para la próxima ejecución. Las filas que una transacción
+    concurrente confirma después de tomar el máximo pero con una fecha anterior o igual a él no se leen en ninguna
+    ejecución, salvo que se indique lookback: en ese caso cada ejecución vuelve a leer las filas de la ventana
+    (marca de agua - lookback, marca de agua], por lo que write_fn debe tolerar filas repetidas (por ejemplo
+    bulk_insert_dataframe con key_columns).
+
+    Si se indica write_fn, se llama con los datos leídos (o con cada lote si se indica chunksize) y la marca de agua
+    avanza solo si todas las llamadas terminan sin error. Si no se indica write_fn se devuelven los datos y la marca
+    de agua no avanza: se debe llamar a state_store.set(state_key, timestamp_column, df[timestamp_column].max())
+    luego de escribirlos.
+
+    Args:
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+        table_name (str): El nombre de la tabla de origen.
+        schema (str): El nombre del esquema de la tabla.
+        state_store (WatermarkStore | str): Almacén de marcas de agua o ruta de su archivo (.json o SQLite).
+        timestamp_column (str, opcional): Columna de fecha que define la marca de agua. Por defecto es 'TIMESTAMP_LECTURA'.
+        columns (list[str], opcional): Columnas a leer. Por defecto se leen todas.
+        write_fn (Callable[[pandas.DataFrame], None], opcional): Función que escribe los datos leídos. Por defecto es None.
+        chunksize (int, opcional): Solo con write_fn. Cantidad de filas por lote. Por defecto es None.
+        state_key (str, opcional): Clave de la tabla en el almacén. Por defecto es 'schema.table_name'.
+        lookback (timedelta | int | float, opcional): Ventana que se vuelve a leer antes de la marca de agua guardada,
+            como timedelta si timestamp_column es de fecha o como número si es numérica. Por defecto es None.
+
+    Returns:
+        pandas.DataFrame: Sin write_fn, las filas nuevas.
+        int: Con write_fn, la cantidad de filas escritas.
+
+    Raises:
+        TypeError: Se produce si la marca de agua guardada no se puede comparar con el máximo de timestamp_column, o si
+            el tipo de lookback no corresponde al de timestamp_column.
+        ValueError: Se produce si lookback es negativo.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    _validate_lookback(lookback)
+
+    if isinstance(state_store, str):
+        state_store = WatermarkStore(state_store)
+
+    state_key = state_key or f'{schema}.{table_name}'
+    table_ref = f'{_quote_identifier(schema)}.{_quote_identifier(table_name)}'
+    timestamp_ref = _quote_identifier(timestamp_column)
+    columns_str = ', '.join([_quote_identifier(col) for col in columns]) if columns else '*'
+
+    low_watermark = _coerce_watermark(state_store.get(state_key, timestamp_column))
+
+    # Límite superior fijo para esta ejecución. En la consulta se usa el valor tal como lo devuelve la base de datos
+    with engine.connect() as connection:
+        max_value = connection.execute(text(f"SELECT MAX({timestamp_ref}) FROM {table_ref}")).scalar()
+    high_watermark = _coerce_watermark(max_value)
+
+    if high_watermark is not None and low_watermark is not None:
+        try:
+            has_new_rows = high_watermark > low_watermark
+        except TypeError as error:
+            raise TypeError(f"La marca de agua guardada para '{state_key}' ({low_watermark!r}) no se puede comparar "
+                            f"con el máximo de {timestamp_column} ({high_watermark!r}). Usar state_store.reset para "
+                            "volver a leer la tabla completa.") from error
+    else:
+        has_new_rows = high_watermark is not None
+
+    # Se valida antes de leer que lookback se pueda restar a la marca de agua (timedelta con fechas, número con números)
+    low_bound = low_watermark
+    if lookback is not None and low_watermark is not None:
+        low_bound = _apply_lookback(low_watermark, lookback, state_key, timestamp_column)
+    elif lookback is not None and high_watermark is not None:
+        _apply_lookback(high_watermark, lookback, state_key, timestamp_column)
+
+    # Con lookback se relee la ventana aunque el máximo no haya avanzado, por las filas confirmadas tarde
+    if high_watermark is None or (not has_new_rows and lookback is None):
+        logger.info("No hay filas nuevas en '%s' desde %s.", state_key, low_watermark)
+        return 0 if write_fn else pd.DataFrame(columns=columns)
+
+    conditions = [f"{timestamp_ref} <= :high_watermark"]
+    params = {'high_watermark': max_value}
+    if low_watermark is not None:
+        conditions.append(f"{timestamp_ref} > :low_watermark")
+        params['low_watermark'] = low_bound
+
+    query = text(f"SELECT {columns_str} FROM {table_ref} WHERE {' AND '.join(conditions)}")
+    if isinstance(params.get('low_watermark'), datetime):
+        # Con el tipo DateTime el dialecto da a la fecha el mismo formato que la columna (en SQLite, texto con microsegundos)
+        query = query.bindparams(sqlalchemy.bindparam('low_watermark', type_=sqlalchemy.DateTime()))
+    logger.info("Leyendo '%s' con %s en (%s, %s].", state_key, timestamp_column, params.get('low_watermark'),
+                high_watermark)
+
+    if write_fn is None:
+        return pd.read_sql_query(query, engine, params=params)
+
+    total_rows = 0
+    if chunksize:
+        for df_chunk in pd.read_sql_query(query, engine, params=params, chunksize=chunksize):
+            write_fn(df_chunk)
+            total_rows += len(df_chunk)
+    else:
+        df = pd.read_sql_query(query, engine, params=params)
+        write_fn(df)
+        total_rows = len(df)
+
+    # Solo se avanza la marca de agua si la escritura terminó correctamente, y nunca hacia atrás
+    if has_new_rows:
+        state_store.set(state_key, timestamp_column, high_watermark)
+    logger.info("Se escribieron %s filas de '%s'. Nueva marca de agua: %s", total_rows, state_key, high_watermark)
+
+    return total_rows
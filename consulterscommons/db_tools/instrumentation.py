@@ -0,0 +1,425 @@
+"""
+Módulo para medir las consultas que se ejecutan con los motores de SQLAlchemy.
+
+QueryProfiler registra listeners de eventos de SQLAlchemy en los motores a los que se asocia y acumula, por sentencia,
+la cantidad de ejecuciones, la latencia, las filas afectadas y las filas y bytes leídos, además del tiempo en abrir
+conexiones nuevas y la espera por conexiones del pool.
+Las consultas lentas se registran en el log apenas terminan y al final se puede exportar un resumen por ejecución del flujo.
+
+Es opcional: los motores sin un QueryProfiler asociado no tienen ningún costo adicional.
+"""
+
+import contextlib
+import json
+import re
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import event
+from prefect import runtime
+
+from consulterscommons.log_tools import PrefectLogger
+
+logger_global = PrefectLogger(__file__)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def _new_statement_stats() -> dict:
+    return {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'rows_affected': 0, 'rows_returned': 0,
+            'bytes_fetched': 0, 'errors': 0}
+
+
+def _new_connection_stats() -> dict:
+    return {'connects': 0, 'connect_seconds': 0.0, 'max_connect_seconds': 0.0, 'checkouts': 0,
+            'pool_wait_seconds': 0.0, 'max_pool_wait_seconds': 0.0}
+
+
+# Perfiladores asociados a cada motor que miden la espera del pool. Todos comparten un único envoltorio de
+# raw_connection por motor, que se quita cuando se desasocia el último
+_POOL_WAIT_PROFILERS: "weakref.WeakKeyDictionary[sqlalchemy.engine.base.Engine, tuple]" = weakref.WeakKeyDictionary()
+_POOL_WAIT_LOCK = threading.Lock()
+
+
+def _add_pool_wait_profiler(engine: sqlalchemy.engine.base.Engine, profiler: 'QueryProfiler') -> None:
+    """
+    Agrega el perfilador a los que miden la espera del pool del motor, envolviendo raw_connection la primera vez.
+    SQLAlchemy no tiene un evento antes del checkout, por eso se envuelve el método.
+    """
+    with _POOL_WAIT_LOCK:
+        entry = _POOL_WAIT_PROFILERS.get(engine)
+        if entry is not None:
+            entry[0].append(profiler)
+            return
+
+        profilers = [profiler]
+        # Se guarda el valor previo del atributo de la instancia (None si se usa el método de la clase)
+        previous = vars(engine).get('raw_connection')
+        raw_connection = engine.raw_connection
+
+        def timed_raw_connection(*args, **kwargs):
+            current_profilers = list(profilers)
+            for current in current_profilers:
+                current._local.checkout_connect_seconds = 0.0
+            start = time.perf_counter()
+            connection = raw_connection(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            for current in current_profilers:
+                current._record_pool_wait(seconds)
+            return connection
+
+        engine.raw_connection = timed_raw_connection
+        _POOL_WAIT_PROFILERS[engine] = (profilers, previous)
+
+
+def _remove_pool_wait_profiler(engine: sqlalchemy.engine.base.Engine, profiler: 'QueryProfiler') -> None:
+    """
+    Quita el perfilador de los que miden la espera del pool del motor. Al quitar el último se restaura raw_connection.
+    """
+    with _POOL_WAIT_LOCK:
+        entry = _POOL_WAIT_PROFILERS.get(engine)
+        if entry is None or profiler not in entry[0]:
+            return
+
+        profilers, previous = entry
+        profilers.remove(profiler)
+        if profilers:
+            return
+
+        del _POOL_WAIT_PROFILERS[engine]
+        if previous is None:
+            vars(engine).pop('raw_connection', None)
+        else:
+            engine.raw_connection = previous
+
+
+def _estimate_row_bytes(row) -> int:
+    """
+    Tamaño aproximado de una fila leída: el largo de los textos y binarios y 8 bytes por cada otro valor no nulo.
+    """
+    return sum(len(value) if isinstance(value, (str, bytes, bytearray)) else 8 for value in row if value is not None)
+
+
+class _ProfiledCursor:
+    """
+    Envuelve el cursor DBAPI de una sentencia con resultado para contar las filas y los bytes que se leen con fetchone,
+    fetchmany y fetchall. El resto de los atributos se delegan en el cursor original.
+    """
+
+    def __init__(self, cursor, profiler: 'QueryProfiler', statement: str):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._statement = statement
+
+    def __getattr__(self, item):
+        return getattr(self._cursor, item)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _record(self, rows: list) -> list:
+        if rows:
+            self._profiler._record_fetch(self._statement, len(rows), sum(_estimate_row_bytes(row) for row in rows))
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._record([row])
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._record(self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._record(self._cursor.fetchall())
+
+
+class QueryProfiler:
+    """
+    Perfilador de consultas para motores SQLAlchemy.
+
+    Parámetros:
+    - slow_query_seconds (float): Las sentencias que tardan al menos estos segundos se registran como lentas en el log.
+        Si es None no se registran. Por defecto es 1.0.
+    - max_statement_length (int): Largo máximo del texto de la sentencia en el log y en el resumen. Por defecto es 500.
+
+    Uso:
+        - profiler = QueryProfiler(slow_query_seconds=5)
+        - engine = get_sqlalchemy_engine(server, database, username)
+        - with profiler.profile(engine):
+            ...
+        - profiler.log_summary()
+        - profiler.export_json('perfil.json')
+
+    Por sentencia se registran: ejecuciones, segundos (total, promedio y máximo), filas afectadas, filas leídas, bytes
+    leídos y errores. Las filas afectadas son las que informa el cursor (cursor.rowcount) en INSERT, UPDATE, DELETE y
+    MERGE. Las filas y bytes leídos de un SELECT se cuentan a medida que se leen del cursor, por lo que los segundos de la
+    sentencia no incluyen la lectura del resultado; los bytes son aproximados (largo de textos y binarios, 8 por valor).
+    De las conexiones se mide el tiempo en abrir conexiones nuevas, la cantidad de checkouts del pool y la espera por
+    una conexión del pool (el tiempo del checkout sin contar la apertura de conexiones nuevas).
+
+    Los motores de get_sqlalchemy_engine se reutilizan en todo el proceso, por lo que conviene asociarlos con profile,
+    que quita los listeners al salir. Con attach los listeners quedan registrados hasta llamar a detach.
+    """
+
+    def __init__(self, slow_query_seconds: float = 1.0, max_statement_length: int = 500):
+        self.slow_query_seconds = slow_query_seconds
+        self.max_statement_length = max_statement_length
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = weakref.WeakSet()
+        self._started_at = datetime.now(timezone.utc)
+        self._statements = {}
+        self._connections = _new_connection_stats()
+
+    def _normalize(self, statement: str) -> str:
+        statement = _WHITESPACE_PATTERN.sub(' ', statement).strip()
+        if len(statement) > self.max_statement_length:
+            statement = statement[:self.max_statement_length] + '...'
+        return statement
+
+    def attach(self, engine: sqlalchemy.engine.base.Engine) -> 'QueryProfiler':
+        """
+        Registra los listeners en el motor. Llamarlo más de una vez con el mismo motor no tiene efecto.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy a medir.
+
+        Returns:
+            QueryProfiler: El mismo perfilador, para encadenar llamadas.
+        """
+        with self._lock:
+            self._attach(engine)
+
+        return self
+
+    def _attach(self, engine: sqlalchemy.engine.base.Engine) -> bool:
+        """
+        Registra los listeners si el motor no estaba asociado. Se llama con self._lock tomado.
+        Devuelve True si el motor se asoció en esta llamada.
+        """
+        if engine in self._engines:
+            return False
+        self._engines.add(engine)
+
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+        event.listen(engine, 'do_connect', self._do_connect)
+        event.listen(engine, 'connect', self._connect)
+        event.listen(engine, 'checkout', self._checkout)
+
+        _add_pool_wait_profiler(engine, self)
+        return True
+
+    def _detach(self, engine: sqlalchemy.engine.base.Engine) -> None:
+        """
+        Quita los listeners del motor si estaba asociado. Se llama con self._lock tomado.
+        """
+        if engine not in self._engines:
+            return
+        self._engines.discard(engine)
+
+        event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.remove(engine, 'handle_error', self._handle_error)
+        event.remove(engine, 'do_connect', self._do_connect)
+        event.remove(engine, 'connect', self._connect)
+        event.remove(engine, 'checkout', self._checkout)
+
+        _remove_pool_wait_profiler(engine, self)
+
+    @contextlib.contextmanager
+    def profile(self, *engines: sqlalchemy.engine.base.Engine):
+        """
+        Asocia el perfilador a los motores mientras dura el bloque with y quita los listeners al salir, incluso si
+        se produce una excepción. Los motores que ya estaban asociados antes del bloque siguen asociados.
+
+        Args:
+            *engines (sqlalchemy.engine.base.Engine): Los motores SQLAlchemy a medir.
+
+        Yields:
+            QueryProfiler: El mismo perfilador.
+        """
+        # Se decide qué motores asociar y se asocian con el lock tomado, para que otro hilo no los asocie en el medio
+        with self._lock:
+            attached = [engine for engine in dict.fromkeys(engines) if self._attach(engine)]
+        try:
+            yield self
+        finally:
+            with self._lock:
+                for engine in attached:
+                    self._detach(engine)
+
+    def detach(self, engine: sqlalchemy.engine.base.Engine) -> None:
+        """
+        Quita los listeners del motor.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy.
+        """
+        with self._lock:
+            self._detach(engine)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault('query_profiler_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        seconds = time.perf_counter() - conn.info['query_profiler_start'].pop()
+
+        # Con resultado (SELECT) el rowcount no indica las filas leídas, solo se usa en las sentencias sin resultado
+        rows_affected = None
+        if not cursor.description and cursor.rowcount is not None and cursor.rowcount >= 0:
+            rows_affected = cursor.rowcount
+
+        key = self._normalize(statement)
+        with self._lock:
+            stats = self._statements.setdefault(key, _new_statement_stats())
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['rows_affected'] += rows_affected or 0
+
+        # Las filas del resultado se cuentan al leerlas: SQLAlchemy arma el resultado con context.cursor
+        if cursor.description and context is not None:
+            context.cursor = _ProfiledCursor(cursor, self, key)
+
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            if rows_affected is None:
+                logger_global.obtener_logger().warning("Consulta lenta (%.2f s): %s", seconds, key)
+            else:
+                logger_global.obtener_logger().warning("Consulta lenta (%.2f s, filas afectadas: %s): %s", seconds, rows_affected, key)
+
+    def _handle_error(self, exception_context) -> None:
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_profiler_start'):
+            connection.info['query_profiler_start'].pop()
+
+        if exception_context.statement is None:
+            return
+
+        key = self._normalize(exception_context.statement)
+        with self._lock:
+            stats = self._statements.setdefault(key, _new_statement_stats())
+            stats['errors'] += 1
+
+    def _record_fetch(self, key: str, rows: int, n_bytes: int) -> None:
+        with self._lock:
+            stats = self._statements.setdefault(key, _new_statement_stats())
+            stats['rows_returned'] += rows
+            stats['bytes_fetched'] += n_bytes
+
+    def _record_pool_wait(self, checkout_seconds: float) -> None:
+        """
+        Registra el tiempo de un checkout (ver _add_pool_wait_profiler), descontando el tiempo de abrir conexiones nuevas
+        que se miden aparte.
+        """
+        seconds = max(0.0, checkout_seconds - getattr(self._local, 'checkout_connect_seconds', 0.0))
+        with self._lock:
+            self._connections['pool_wait_seconds'] += seconds
+            self._connections['max_pool_wait_seconds'] = max(self._connections['max_pool_wait_seconds'], seconds)
+
+    def _do_connect(self, dialect, conn_rec, cargs, cparams) -> None:
+        self._local.connect_start = time.perf_counter()
+
+    def _connect(self, dbapi_connection, connection_record) -> None:
+        start = getattr(self._local, 'connect_start', None)
+        if start is None:
+            return
+        self._local.connect_start = None
+
+        seconds = time.perf_counter() - start
+        self._local.checkout_connect_seconds = getattr(self._local, 'checkout_connect_seconds', 0.0) + seconds
+        with self._lock:
+            self._connections['connects'] += 1
+            self._connections['connect_seconds'] += seconds
+            self._connections['max_connect_seconds'] = max(self._connections['max_connect_seconds'], seconds)
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self._lock:
+            self._connections['checkouts'] += 1
+
+    def summary(self) -> dict:
+        """
+        Devuelve el resumen de lo registrado desde la creación o el último reset.
+
+        Returns:
+            dict: Con las claves 'flow_run_id', 'flow_run_name', 'started_at', 'finished_at', 'total_statements',
+                'total_seconds', 'connections' y 'statements' (lista ordenada por tiempo total descendente).
+        """
+        with self._lock:
+            statements = [
+                {'statement': statement, **stats,
+                 'avg_seconds': stats['total_seconds'] / stats['count'] if stats['count'] else 0.0}
+                for statement, stats in self._statements.items()
+            ]
+            connections = dict(self._connections)
+
+        statements.sort(key=lambda stats: stats['total_seconds'], reverse=True)
+
+        return {
+            'flow_run_id': str(runtime.flow_run.id) if runtime.flow_run.id else None,
+            'flow_run_name': runtime.flow_run.name,
+            'started_at': self._started_at.isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'total_statements': sum(stats['count'] for stats in statements),
+            'total_seconds': sum(stats['total_seconds'] for stats in statements),
+            'connections': connections,
+            'statements': statements,
+        }
+
+    def summary_frame(self) -> pd.DataFrame:
+        """
+        Devuelve las estadísticas por sentencia como DataFrame, ordenadas por tiempo total descendente.
+        """
+        return pd.DataFrame(self.summary()['statements'],
+                            columns=['statement', 'count', 'total_seconds', 'avg_seconds', 'max_seconds',
+                                     'rows_affected', 'rows_returned', 'bytes_fetched', 'errors'])
+
+    def export_json(self, path: str = None) -> str:
+        """
+        Exporta el resumen (ver summary) como JSON.
+
+        Args:
+            path (str, opcional): Si se indica, se escribe el JSON en ese archivo. Por defecto es None.
+
+        Returns:
+            str: El resumen en formato JSON.
+        """
+        summary_json = json.dumps(self.summary(), indent=2, ensure_ascii=False)
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(summary_json)
+        return summary_json
+
+    def log_summary(self, top: int = 10) -> None:
+        """
+        Registra en el log el resumen y las top sentencias con más tiempo total.
+        """
+        logger = logger_global.obtener_logger()
+        summary = self.summary()
+        connections = summary['connections']
+
+        logger.info("Perfil de consultas: %s sentencias en %.2f s. Conexiones nuevas: %s (%.2f s), checkouts del pool: %s "
+                    "(espera %.2f s).", summary['total_statements'], summary['total_seconds'], connections['connects'],
+                    connections['connect_seconds'], connections['checkouts'], connections['pool_wait_seconds'])
+
+        for stats in summary['statements'][:top]:
+            logger.info("%.2f s en %s ejecuciones (prom. %.3f s, máx. %.3f s, filas leídas: %s, bytes: %s, errores: %s): %s",
+                        stats['total_seconds'], stats['count'], stats['avg_seconds'], stats['max_seconds'],
+                        stats['rows_returned'], stats['bytes_fetched'], stats['errors'], stats['statement'])
+
+    def reset(self) -> None:
+        """
+        Borra todo lo registrado.
+        """
+        with self._lock:
+            self._started_at = datetime.now(timezone.utc)
+            self._statements.clear()
+            self._connections = _new_connection_stats()
@@ -0,0 +1,174 @@
+"""
+Módulo para leer consultas grandes de SQL Server en paralelo.
+
+Divide la consulta en particiones por rango o por módulo de una columna y ejecuta cada partición en un hilo con su propia
+conexión del pool del motor. Los resultados se pueden concatenar o recibir a medida que terminan.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+from prefect import task
+
+from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.db_tools.column_conversion import ColumnConversionPlan
+from consulterscommons.db_tools.sqlalchemy_utils import _quote_identifier
+
+logger_global = PrefectLogger(__file__)
+
+
+def _get_range_bounds(min_value, max_value, n_partitions: int) -> list:
+    """
+    Divide el intervalo [min_value, max_value] en n_partitions límites consecutivos.
+    Admite enteros, decimales, números con decimales y fechas. Los límites intermedios tienen el mismo tipo que los
+    extremos, que se devuelven tal cual los devolvió la base de datos.
+    """
+    if isinstance(min_value, int) and isinstance(max_value, int):
+        span = max_value - min_value + 1
+        inner_bounds = [min_value + span * i // n_partitions for i in range(1, n_partitions)]
+
+    elif isinstance(min_value, (str, date)):
+        # Algunos drivers (por ejemplo SQLite) devuelven las fechas como texto, en ese caso los límites también son texto.
+        # Las columnas DATE llegan como date (que no es datetime): se calcula con datetime y se vuelve a convertir
+        low, high = pd.Timestamp(min_value).to_pydatetime(), pd.Timestamp(max_value).to_pydatetime()
+        span = high - low
+        inner_bounds = [low + span * i / n_partitions for i in range(1, n_partitions)]
+        if isinstance(min_value, str):
+            inner_bounds = [str(bound) for bound in inner_bounds]
+        elif not isinstance(min_value, datetime):
+            inner_bounds = [bound.date() for bound in inner_bounds]
+
+    elif isinstance(min_value, Decimal) or isinstance(max_value, Decimal):
+        # Se calcula con Decimal para no perder precisión al pasar por float
+        low, high = Decimal(min_value), Decimal(max_value)
+        span = high - low
+        inner_bounds = [low + span * i / n_partitions for i in range(1, n_partitions)]
+
+    else:
+        span = float(max_value) - float(min_value)
+        inner_bounds = [float(min_value) + span * i / n_partitions for i in range(1, n_partitions)]
+
+    return [min_value] + inner_bounds + [max_value]
+
+
+def _build_partition_queries(query: str,
+                             engine: sqlalchemy.engine.base.Engine,
+                             partition_column: str,
+                             n_partitions: int,
+                             mode: str,
+                             params: dict) -> list[tuple[str, dict]]:
+    """
+    Construye las consultas de cada partición. Siempre se agrega una partición para los valores nulos de la columna.
+    """
+    column_ref = f"q.{_quote_identifier(partition_column)}"
+    base_query = f"SELECT * FROM ({query}) AS q"
+
+    partition_queries = [(f"{base_query} WHERE {column_ref} IS NULL", dict(params))]
+
+    if mode == 'modulo':
+        for i in range(n_partitions):
+            partition_queries.append((f"{base_query} WHERE ABS({column_ref}) % {n_partitions} = {i}", dict(params)))
+        return partition_queries
+
+    with engine.connect() as connection:
+        min_value, max_value = connection.execute(
+            text(f"SELECT MIN({column_ref}), MAX({column_ref}) FROM ({query}) AS q"), params
+        ).one()
+
+    if min_value is None:
+        return partition_queries
+
+    bounds = _get_range_bounds(min_value, max_value, n_partitions)
+    for i in range(n_partitions):
+        # La última partición incluye el máximo
+        upper_operator = '<=' if i == n_partitions - 1 else '<'
+        partition_params = {**params, 'partition_low': bounds[i], 'partition_high': bounds[i + 1]}
+        partition_queries.append((
+            f"{base_query} WHERE {column_ref} >= :partition_low AND {column_ref} {upper_operator} :partition_high",
+            partition_params
+        ))
+
+    return partition_queries
+
+
+def iter_sql_partitioned(query: str,
+                         engine: sqlalchemy.engine.base.Engine,
+                         partition_column: str,
+                         n_partitions: int = 8,
+                         mode: str = 'range',
+                         max_workers: int = None,
+                         params: dict = None,
+                         column_types: dict | ColumnConversionPlan = None) -> Iterator[pd.DataFrame]:
+    """
+    Ejecuta la consulta dividida en particiones en paralelo y devuelve el resultado de cada partición a medida que termina.
+
+    Args:
+        query (str): Consulta SELECT a leer. Se usa como subconsulta, por lo que no debe tener ORDER BY.
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy. Cada partición usa una conexión de su pool, por lo que
+            conviene que pool_size + max_overflow sea al menos max_workers.
+        partition_column (str): Columna por la que se particiona la consulta.
+        n_partitions (int, opcional): Cantidad de particiones. Por defecto es 8.
+        mode (str, opcional): Forma de particionar. Por defecto es 'range'.
+            - 'range': Divide el rango [MIN, MAX] de la columna en intervalos iguales. Admite números y fechas.
+            - 'modulo': Usa el resto de dividir la columna por n_partitions. Solo para columnas enteras.
+        max_workers (int, opcional): Cantidad de hilos. Por defecto es n_partitions.
+        params (dict, opcional): Parámetros de la consulta. Por defecto es None.
+        column_types (dict | ColumnConversionPlan, opcional): Tipos de la tabla (por ejemplo de get_column_types) a aplicar
+            a cada partición. El plan de conversión se arma una sola vez. Por defecto es None.
+
+    Yields:
+        pandas.DataFrame: El resultado de cada partición, en el orden en que terminan.
+    """
+    if mode not in ('range', 'modulo'):
+        raise ValueError("mode debe ser 'range' o 'modulo'.")
+
+    plan = None
+    if column_types is not None:
+        plan = column_types if isinstance(column_types, ColumnConversionPlan) else ColumnConversionPlan(column_types)
+
+    partition_queries = _build_partition_queries(query, engine, partition_column, n_partitions, mode, params or {})
+
+    def read_partition(partition_query: str, partition_params: dict) -> pd.DataFrame:
+        with engine.connect() as connection:
+            df_partition = pd.read_sql_query(text(partition_query), connection, params=partition_params)
+        return plan.apply(df_partition) if plan is not None else df_partition
+
+    with ThreadPoolExecutor(max_workers=max_workers or n_partitions) as executor:
+        futures = [executor.submit(read_partition, partition_query, partition_params)
+                   for partition_query, partition_params in partition_queries]
+
+        for future in as_completed(futures):
+            yield future.result()
+
+
+@task
+def read_sql_partitioned(query: str,
+                         engine: sqlalchemy.engine.base.Engine,
+                         partition_column: str,
+                         n_partitions: int = 8,
+                         mode: str = 'range',
+                         max_workers: int = None,
+                         params: dict = None,
+                         column_types: dict | ColumnConversionPlan = None) -> pd.DataFrame:
+    """
+    Lee una consulta en paralelo por particiones y concatena los resultados (ver iter_sql_partitioned).
+
+    Returns:
+        pandas.DataFrame: El resultado completo de la consulta, sin un orden garantizado.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    df_partitions = list(iter_sql_partitioned(query, engine, partition_column, n_partitions,
+                                              mode, max_workers, params, column_types))
+
+    # Se descartan las particiones vacías, salvo que todas lo estén para conservar las columnas
+    df_partitions = [df_partition for df_partition in df_partitions if not df_partition.empty] or df_partitions[:1]
+    df = pd.concat(df_partitions, ignore_index=True)
+    logger.info("Se leyeron %s filas en %s particiones (%s).", len(df), n_partitions, mode)
+
+    return df
@@ -10,39 +10,442 @@ select_query = qm.fetch_data
 insert_query = qm.insert_data
 update_query = qm.update_data
 delete_query = qm.delete_data
+report_query = qm.reports.monthly  # sql_files/reports/monthly.sql
+
+# Query con identificadores y parámetros: sql_files/select_by_id.sql
+#   SELECT * FROM {{schema}}.{{table}} WHERE ID = :id
+df = qm.read('select_by_id', engine, params={'id': 10}, identifiers={'schema': 'dbo', 'table': 'CLIENTES'})
+print(qm.stats)
 
 """
 
 import os
+import re
+import threading
+import time
+import warnings
+from typing import Callable
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+SQL_EXTENSION = '.sql'
+
+# Marcadores de identificadores (esquemas, tablas, columnas) en los archivos .sql: {{nombre}}
+IDENTIFIER_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# Cantidad máxima de combinaciones de identificadores compiladas que se guardan por query
+MAX_RENDERED_PER_QUERY = 256
+
+# Métodos de QueryManager que quedan ocultos por un archivo .sql con el mismo nombre en la carpeta principal, para que
+# el código que ya usaba qm.get, qm.read, etc. con get.sql o read.sql siga recibiendo el texto de la query
+SHADOWABLE_METHODS = frozenset({
+    'get', 'read', 'execute', 'render', 'stats', 'reload', 'preload', 'invalidate', 'get_sql', 'get_text',
+    'get_params', 'get_identifiers', 'reset_stats',
+})
+
+# Atributos de configuración: un archivo .sql con el mismo nombre no se puede leer como atributo
+CONFIG_ATTRIBUTES = frozenset({'sql_dir', 'sql_files', 'compile_text', 'auto_reload', 'reload_interval', 'on_execute'})
+
+
+class _QueryDirectory:
+    """Subcarpeta de un QueryManager, permite acceder a sus queries como atributos (qm.subcarpeta.query)"""
+
+    def __init__(self, manager, prefix: str):
+        self._manager = manager
+        self._prefix = prefix
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        return self._manager._resolve(f'{self._prefix}/{item}')
+
 
 class QueryManager:
     """Clase para manejar queries SQL
 
+    Los archivos .sql se leen una sola vez y se guardan en memoria. Si auto_reload es True, al pedir una query se
+    compara la fecha de modificación del archivo (como máximo una vez cada reload_interval segundos) y se vuelve
+    a leer si cambió. Si se pide una query que no está en la lista y auto_reload es True se vuelve a listar la carpeta
+    (como máximo una vez cada reload_interval segundos), por lo que los archivos nuevos quedan visibles sin crear otro
+    QueryManager. Con auto_reload en False la carpeta solo se vuelve a listar con reload o invalidate.
+
+    Si un archivo de la carpeta principal tiene el nombre de un método (por ejemplo get.sql o read.sql), qm.get devuelve
+    la query como siempre y el método se usa como QueryManager.get(qm, ...). Los archivos con el nombre de un atributo
+    de configuración (por ejemplo compile_text.sql) se leen con qm.get_sql('compile_text'). En ambos casos se emite un
+    aviso al listar la carpeta.
+
+    Parámetros:
+        - sql_dir (str): Carpeta con los archivos .sql. Se incluyen las subcarpetas.
+        - compile_text (bool): Si es True las queries se devuelven como objetos text() de SQLAlchemy, con los
+            parámetros (:nombre) ya interpretados. Si es False se devuelven como str. Por defecto es False.
+        - preload (bool): Si es True se leen todas las queries al crear el QueryManager. Por defecto es False.
+        - auto_reload (bool): Si es True se vuelven a leer los archivos modificados. Por defecto es True.
+        - reload_interval (float): Segundos mínimos entre dos verificaciones de un mismo archivo y entre dos listados
+            de la carpeta por queries no encontradas. Por defecto es 2.0.
+        - on_execute (Callable): Función que se llama luego de cada ejecución con read o execute, con los argumentos
+            (nombre, segundos, filas, error). error es None si la ejecución terminó bien. Por defecto es None.
+
+    Parámetros e identificadores:
+        Los valores se pasan como parámetros enlazados (:nombre en el archivo), nunca se insertan en el texto, por lo que
+        SQL Server reutiliza el plan de ejecución. Los nombres de esquemas, tablas o columnas, que no pueden ser
+        parámetros, se escriben como {{nombre}} y se reemplazan por el identificador entre corchetes. El text() resultante
+        se guarda por combinación de identificadores.
+
     Returns:
         - QueryManager
-    
+
     Uso:
         - qm = QueryManager(sql_dir)
         - select_query = qm.fetch_data
+        - report_query = qm.reports.monthly  # o qm.get('reports/monthly')
+        - df = qm.read('select_by_id', engine, params={'id': 10}, identifiers={'schema': 'dbo', 'table': 'CLIENTES'})
     """
     sql_dir = None
     sql_files = None
 
-    def __init__(self, sql_dir):
+    def __init__(self, sql_dir, compile_text: bool = False, preload: bool = False,
+                 auto_reload: bool = True, reload_interval: float = 2.0,
+                 on_execute: Callable[[str, float, int, Exception], None] = None):
         self.sql_dir = sql_dir
-        # - Find all .sql files for the given directory and put them in a list
-        self.sql_files = [
-            f for f in os.listdir(self.sql_dir) if os.path.isfile(os.path.join(self.sql_dir, f)) and '.sql' in f
-        ]
+        self.compile_text = compile_text
+        self.auto_reload = auto_reload
+        self.reload_interval = reload_interval
+        self.on_execute = on_execute
+
+        self._lock = threading.RLock()
+        # Clave: nombre de la query. Valor: dict con mtime, momento de la última verificación, texto y text() compilado
+        self._cache = {}
+        self._paths = {}
+        self._directories = set()
+        self._scanned_at = 0.0
+        # Clave: nombre de la query. Valor: dict con count, total_seconds, max_seconds, rows y errors
+        self._stats = {}
+        self._scan()
+
+        if preload:
+            self._preload()
+
+    def _scan(self) -> None:
+        """
+        Lista los archivos .sql de la carpeta y sus subcarpetas. Los nombres usan '/' como separador.
+        """
+        paths = {}
+        directories = set()
+
+        for root, _, files in os.walk(self.sql_dir):
+            relative_root = os.path.relpath(root, self.sql_dir).replace(os.sep, '/')
+            if relative_root != '.':
+                directories.add(relative_root)
+
+            for f in files:
+                if not f.endswith(SQL_EXTENSION):
+                    continue
+                name = f[:-len(SQL_EXTENSION)] if relative_root == '.' else f'{relative_root}/{f[:-len(SQL_EXTENSION)]}'
+                paths[name] = os.path.join(root, f)
+
+        with self._lock:
+            new_names = (paths.keys() | directories) - (self._paths.keys() | self._directories)
+            self._paths = paths
+            self._directories = directories
+            self._scanned_at = time.monotonic()
+            self.sql_files = sorted(name + SQL_EXTENSION for name in paths)
+
+        for name in sorted(new_names & SHADOWABLE_METHODS):
+            warnings.warn(f"El archivo {name}.sql oculta el método QueryManager.{name}: qm.{name} devuelve la query. "
+                          f"Para usar el método llamar a QueryManager.{name}(qm, ...).", stacklevel=3)
+        for name in sorted(new_names & CONFIG_ATTRIBUTES):
+            warnings.warn(f"El archivo {name}.sql tiene el nombre de un atributo de QueryManager: leerlo con "
+                          f"qm.get_sql('{name}').", stacklevel=3)
+
+    def _rescan_if_due(self) -> bool:
+        """
+        Vuelve a listar la carpeta si auto_reload es True y pasaron reload_interval segundos desde el último listado.
+        Evita recorrer la carpeta en cada atributo inexistente (por ejemplo hasattr o autocompletado).
+        """
+        with self._lock:
+            if not self.auto_reload or time.monotonic() - self._scanned_at < self.reload_interval:
+                return False
+        self._scan()
+        return True
+
+    def _load(self, name: str) -> dict:
+        """
+        Devuelve la entrada de la caché de la query, leyendo el archivo si no está o si cambió.
+        """
+        with self._lock:
+            entry = self._cache.get(name)
+            now = time.monotonic()
+
+            if entry is not None and (not self.auto_reload or now - entry['checked'] < self.reload_interval):
+                return entry
+
+            path = self._paths[name]
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                self._cache.pop(name, None)
+                self._scan()
+                raise AttributeError(f'QueryManager no encontro el archivo {name}.sql') from None
+
+            if entry is not None and entry['mtime'] == mtime:
+                entry['checked'] = now
+                return entry
+
+            with open(path, 'r', encoding='utf-8') as f:
+                sql = f.read()
+
+            entry = {'mtime': mtime, 'checked': now, 'sql': sql, 'text': None, 'rendered': {}}
+            self._cache[name] = entry
+            return entry
+
+    def _resolve(self, name: str):
+        """
+        Devuelve la query o la subcarpeta con ese nombre. Si no existe vuelve a listar la carpeta antes de fallar
+        (ver _rescan_if_due).
+        """
+        for attempt in range(2):
+            if name in self._paths:
+                return self._get(name)
+            if name in self._directories:
+                return _QueryDirectory(self, name)
+            if attempt == 1 or not self._rescan_if_due():
+                break
+
+        raise AttributeError(f'QueryManager no encontro el archivo {name}.sql')
+
+    def get_sql(self, name: str) -> str:
+        """
+        Devuelve el texto de la query. name es la ruta relativa sin extensión, por ejemplo 'reports/monthly'.
+        """
+        if name not in self._paths:
+            self._rescan_if_due()
+        if name not in self._paths:
+            raise AttributeError(f'QueryManager no encontro el archivo {name}.sql')
+        return self._load(name)['sql']
+
+    def get_text(self, name: str) -> TextClause:
+        """
+        Devuelve la query como objeto text() de SQLAlchemy. El objeto se arma una sola vez por versión del archivo.
+        """
+        with self._lock:
+            self._get_sql(name)
+            entry = self._cache[name]
+            if entry['text'] is None:
+                entry['text'] = text(entry['sql'])
+            return entry['text']
+
+    def get(self, name: str):
+        """
+        Devuelve la query como str o como text() según compile_text.
+        """
+        return self._get_text(name) if self.compile_text else self._get_sql(name)
+
+    def get_params(self, name: str) -> list[str]:
+        """
+        Devuelve los nombres de los parámetros (:nombre) de la query.
+        """
+        return list(self._get_text(name).compile().params)
+
+    def get_identifiers(self, name: str) -> list[str]:
+        """
+        Devuelve los nombres de los identificadores ({{nombre}}) de la query.
+        """
+        return list(dict.fromkeys(IDENTIFIER_PATTERN.findall(self._get_sql(name))))
+
+    def render(self, name: str, identifiers: dict = None) -> TextClause:
+        """
+        Devuelve la query como text() con los identificadores reemplazados por su valor entre corchetes.
+
+        Args:
+            name (str): El nombre de la query.
+            identifiers (dict, opcional): Valores de los identificadores ({{nombre}}) de la query. Por defecto es None.
+
+        Returns:
+            sqlalchemy.sql.elements.TextClause: La query lista para ejecutar con parámetros enlazados.
+
+        Raises:
+            ValueError: Se produce si falta el valor de algún identificador o si un valor está vacío.
+        """
+        # Import diferido: sqlalchemy_utils carga Prefect y el resto de db_tools, que no hacen falta para leer queries
+        from consulterscommons.db_tools.sqlalchemy_utils import _quote_identifier
+
+        identifiers = identifiers or {}
+
+        with self._lock:
+            self._get_sql(name)
+            entry = self._cache[name]
+
+            key = tuple(sorted((key, str(value)) for key, value in identifiers.items()))
+            clause = entry['rendered'].get(key)
+            if clause is not None:
+                return clause
+
+            sql = entry['sql']
+            missing = [identifier for identifier in IDENTIFIER_PATTERN.findall(sql) if identifier not in identifiers]
+            if missing:
+                raise ValueError(f"Faltan los identificadores {sorted(set(missing))} para la query {name}.")
+
+            for identifier, value in identifiers.items():
+                if not str(value) or '\x00' in str(value):
+                    raise ValueError(f"Valor inválido para el identificador {identifier} de la query {name}.")
+
+            clause = text(IDENTIFIER_PATTERN.sub(lambda match: _quote_identifier(identifiers[match.group(1)]), sql))
+
+            if len(entry['rendered']) >= MAX_RENDERED_PER_QUERY:
+                entry['rendered'].clear()
+            entry['rendered'][key] = clause
+
+            return clause
+
+    def _record(self, name: str, seconds: float, rows: int, error: Exception = None) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                                   'rows': 0, 'errors': 0})
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['rows'] += max(rows or 0, 0)
+            stats['errors'] += error is not None
+
+        if self.on_execute is not None:
+            self.on_execute(name, seconds, rows, error)
+
+    def read(self, name: str,
+             connectable: sqlalchemy.engine.base.Engine | sqlalchemy.engine.base.Connection,
+             params: dict = None,
+             identifiers: dict = None,
+             **kwargs) -> pd.DataFrame:
+        """
+        Ejecuta una query de lectura con parámetros enlazados y devuelve el resultado (ver render).
+
+        Args:
+            name (str): El nombre de la query.
+            connectable (Engine | Connection): El motor SQLAlchemy o una conexión abierta.
+            params (dict, opcional): Valores de los parámetros (:nombre) de la query. Por defecto es None.
+            identifiers (dict, opcional): Valores de los identificadores ({{nombre}}) de la query. Por defecto es None.
+            **kwargs: Argumentos adicionales para pd.read_sql_query, por ejemplo dtype.
+
+        Returns:
+            pandas.DataFrame: El resultado de la query.
+        """
+        clause = self._render(name, identifiers)
+
+        start = time.perf_counter()
+        try:
+            df = pd.read_sql_query(clause, connectable, params=params, **kwargs)
+        except Exception as error:
+            self._record(name, time.perf_counter() - start, 0, error)
+            raise
+
+        self._record(name, time.perf_counter() - start, len(df) if isinstance(df, pd.DataFrame) else 0)
+        return df
+
+    def execute(self, name: str,
+                connection: sqlalchemy.engine.base.Connection,
+                params: dict | list[dict] = None,
+                identifiers: dict = None) -> sqlalchemy.engine.CursorResult:
+        """
+        Ejecuta una query con parámetros enlazados en la conexión indicada (ver render). No confirma la transacción.
+
+        Args:
+            name (str): El nombre de la query.
+            connection (sqlalchemy.engine.base.Connection): Una conexión abierta.
+            params (dict | list[dict], opcional): Valores de los parámetros (:nombre) de la query. Con una lista de
+                diccionarios se ejecuta una vez por elemento (executemany). Por defecto es None.
+            identifiers (dict, opcional): Valores de los identificadores ({{nombre}}) de la query. Por defecto es None.
+
+        Returns:
+            sqlalchemy.engine.CursorResult: El resultado de la ejecución.
+        """
+        if not isinstance(connection, sqlalchemy.engine.base.Connection):
+            raise TypeError("connection debe ser un objeto SQLAlchemy Connection.")
+
+        clause = self._render(name, identifiers)
+
+        start = time.perf_counter()
+        try:
+            result = connection.execute(clause, params or {})
+        except Exception as error:
+            self._record(name, time.perf_counter() - start, 0, error)
+            raise
+
+        self._record(name, time.perf_counter() - start, result.rowcount)
+        return result
+
+    @property
+    def stats(self) -> dict:
+        """
+        Estadísticas por query de las ejecuciones con read y execute: count, total_seconds, avg_seconds,
+        max_seconds, rows y errors.
+        """
+        with self._lock:
+            return {
+                name: {**stats, 'avg_seconds': stats['total_seconds'] / stats['count'] if stats['count'] else 0.0}
+                for name, stats in self._stats.items()
+            }
+
+    def reset_stats(self) -> None:
+        """
+        Reinicia las estadísticas de ejecución.
+        """
+        with self._lock:
+            self._stats.clear()
+
+    def preload(self) -> int:
+        """
+        Lee todas las queries de la carpeta y las guarda en la caché (y las compila si compile_text es True).
+        Devuelve la cantidad de queries leídas.
+        """
+        self._scan()
+        for name in list(self._paths):
+            if self.compile_text:
+                self._get_text(name)
+            else:
+                self._load(name)
+        return len(self._paths)
+
+    def reload(self) -> int:
+        """
+        Vuelve a listar la carpeta sin vaciar la caché. Devuelve la cantidad de queries encontradas.
+        """
+        self._scan()
+        return len(self._paths)
+
+    def invalidate(self, name: str = None) -> None:
+        """
+        Elimina una query de la caché, o todas si no se indica el nombre, y vuelve a listar la carpeta.
+        """
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+        self._scan()
+
+    # Alias que usan los métodos internamente, porque los nombres públicos pueden quedar ocultos por archivos .sql
+    _get = get
+    _get_sql = get_sql
+    _get_text = get_text
+    _render = render
+    _preload = preload
+
+    def __getattribute__(self, item):
+        # Los archivos .sql de la carpeta principal tienen prioridad sobre los métodos con el mismo nombre
+        if item in SHADOWABLE_METHODS:
+            instance_vars = object.__getattribute__(self, '__dict__')
+            if item in instance_vars.get('_paths', ()) or item in instance_vars.get('_directories', ()):
+                return object.__getattribute__(self, '_resolve')(item)
+        return object.__getattribute__(self, item)
 
-    def __getattr__(self, item) -> str:
+    def __getattr__(self, item):
         """
            Lets query file be fetched by calling the query manager class object with the name of the query as the attribute
         """
+        # Los atributos internos no son queries (evita recursión antes de terminar __init__)
+        if item.startswith('_'):
+            raise AttributeError(item)
 
-        if item + '.sql' in self.sql_files:
-            # - This is where the file is actually read
-            with open(os.path.join(self.sql_dir, item + '.sql'), 'r', encoding='utf-8') as f:
-                return f.read()
-        else:
-            raise AttributeError(f'QueryManager no encontro el archivo {str(item)}.sql')
+        return self._resolve(item)
@@ -0,0 +1,147 @@
+"""
+Módulo con una caché de la estructura de las tablas de la base de datos.
+
+Evita reflejar la base de datos completa y crear un inspector nuevo en cada consulta de metadatos.
+Las tablas se reflejan de forma perezosa, solo cuando se piden, y se guardan durante un tiempo (TTL) configurable.
+"""
+
+import threading
+import time
+import weakref
+
+import sqlalchemy
+from sqlalchemy import inspect
+
+
+class SchemaCache:
+    """
+    Caché de existencia y tipos de columnas de las tablas de un motor SQLAlchemy.
+
+    Parámetros:
+    - engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy de la base de datos.
+    - ttl (float): Segundos durante los que una entrada se considera válida.
+
+    Atributos:
+    - DEFAULT_TTL (float): Tiempo de vida predeterminado de las entradas, en segundos.
+
+    Uso:
+        - cache = get_schema_cache(engine)
+        - cache.get_column_types('TABLA', 'dbo')
+        - cache.invalidate('TABLA', 'dbo')  # Luego de modificar la tabla
+
+    Solo se guardan las tablas que existen. Si una tabla no existe se vuelve a consultar en cada llamada,
+    para que una tabla creada luego sea visible de inmediato.
+    """
+
+    DEFAULT_TTL = 300
+
+    def __init__(self, engine: sqlalchemy.engine.base.Engine, ttl: float = DEFAULT_TTL):
+        # Referencia débil para que la caché no mantenga vivo al motor en el registro de get_schema_cache
+        self._engine_ref = weakref.ref(engine)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Clave: (schema, table_name). Valor: (momento de carga, dict de columnas o None si solo se verificó la existencia)
+        self._tables: dict[tuple, tuple] = {}
+
+    @property
+    def engine(self) -> sqlalchemy.engine.base.Engine:
+        """
+        Motor SQLAlchemy asociado a la caché.
+        """
+        return self._engine_ref()
+
+    def _get_entry(self, table_name: str, schema: str):
+        with self._lock:
+            entry = self._tables.get((schema, table_name))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry
+
+    def has_table(self, table_name: str, schema: str, connection: sqlalchemy.engine.base.Connection = None) -> bool:
+        """
+        Indica si la tabla existe en la base de datos. Si se indica connection se consulta con esa conexión
+        en lugar de tomar una del motor.
+        """
+        if self._get_entry(table_name, schema) is not None:
+            return True
+
+        exists = inspect(connection if connection is not None else self.engine).has_table(table_name, schema=schema)
+        if exists:
+            with self._lock:
+                self._tables.setdefault((schema, table_name), (time.monotonic(), None))
+        return exists
+
+    def get_column_types(self, table_name: str, schema: str, connection: sqlalchemy.engine.base.Connection = None) -> dict:
+        """
+        Obtiene los tipos de datos de las columnas de la tabla, reflejando solo esa tabla si no está en la caché.
+        Si se indica connection se consulta con esa conexión en lugar de tomar una del motor.
+
+        Raises:
+            sqlalchemy.exc.NoSuchTableError: Se produce si la tabla no se encuentra en la base de datos.
+        """
+        entry = self._get_entry(table_name, schema)
+        if entry is None or entry[1] is None:
+            columns = inspect(connection if connection is not None else self.engine).get_columns(table_name, schema=schema)
+            column_types = {col['name']: col['type'] for col in columns}
+            self.prime(table_name, schema, column_types)
+        else:
+            column_types = entry[1]
+
+        return dict(column_types)
+
+    def get_cached_column_types(self, table_name: str, schema: str) -> dict:
+        """
+        Devuelve los tipos de datos de las columnas de la tabla si están en la caché, o None, sin consultar la base de datos.
+        """
+        entry = self._get_entry(table_name, schema)
+        if entry is None or entry[1] is None:
+            return None
+        return dict(entry[1])
+
+    def prime(self, table_name: str, schema: str, column_types: dict) -> None:
+        """
+        Guarda en la caché los tipos de columnas de una tabla obtenidos por otro medio.
+        """
+        with self._lock:
+            self._tables[(schema, table_name)] = (time.monotonic(), dict(column_types))
+
+    def invalidate(self, table_name: str = None, schema: str = None) -> None:
+        """
+        Elimina entradas de la caché. Sin argumentos elimina todas, con schema todas las de ese esquema
+        y con table_name y schema solo esa tabla.
+        """
+        with self._lock:
+            if table_name is None and schema is None:
+                self._tables.clear()
+                return
+
+            for key in list(self._tables):
+                if (schema is None or key[0] == schema) and (table_name is None or key[1] == table_name):
+                    del self._tables[key]
+
+
+# Una caché por motor, se libera cuando el motor deja de usarse
+_SCHEMA_CACHES: "weakref.WeakKeyDictionary[sqlalchemy.engine.base.Engine, SchemaCache]" = weakref.WeakKeyDictionary()
+_SCHEMA_CACHES_LOCK = threading.Lock()
+
+
+def get_schema_cache(engine: sqlalchemy.engine.base.Engine, ttl: float = None) -> SchemaCache:
+    """
+    Devuelve la caché de esquema asociada al motor, creándola si no existe.
+
+    Args:
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy de la base de datos.
+        ttl (float, opcional): Si se indica, actualiza el tiempo de vida de las entradas de la caché. Por defecto es None.
+
+    Returns:
+        SchemaCache: La caché de esquema del motor.
+    """
+    with _SCHEMA_CACHES_LOCK:
+        cache = _SCHEMA_CACHES.get(engine)
+        if cache is None:
+            cache = SchemaCache(engine, SchemaCache.DEFAULT_TTL if ttl is None else ttl)
+            _SCHEMA_CACHES[engine] = cache
+        elif ttl is not None:
+            cache.ttl = ttl
+
+    return cache
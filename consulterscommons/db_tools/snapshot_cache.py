@@ -0,0 +1,366 @@
+"""
+Módulo con una caché local en disco de la última versión de cada fila de las tablas del Data Warehouse.
+
+La instantánea se guarda en archivos Parquet particionados por el hash de las columnas clave y se actualiza de forma
+incremental con la columna de fecha: en cada actualización solo se leen las filas posteriores a la última marca de agua
+y se reemplazan las claves afectadas en sus particiones. Así get_only_new_rows puede comparar contra el disco local
+en lugar de volver a descargar la tabla completa en cada ejecución.
+
+Requiere pyarrow>=14.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.db_tools.column_conversion import ColumnConversionPlan
+from consulterscommons.db_tools.columnar_fetch import _check_pyarrow
+from consulterscommons.db_tools.incremental_extract import _coerce_watermark, _deserialize_watermark, _serialize_watermark
+from consulterscommons.db_tools.sqlalchemy_utils import (
+    _build_latest_rows_query,
+    _get_key_partitions,
+    _quote_identifier,
+    get_column_types,
+)
+
+logger_global = PrefectLogger(__file__)
+
+META_FILE_NAME = 'meta.json'
+
+
+def _partition_file_name(partition: int) -> str:
+    return f'part-{partition:05d}.parquet'
+
+
+def _write_parquet_atomic(df: pd.DataFrame, path: str) -> None:
+    """
+    Escribe el DataFrame en un archivo temporal que luego reemplaza al original.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class SnapshotCache:
+    """
+    Caché en disco (Parquet) de la última versión de cada fila de tablas del Data Warehouse.
+
+    Parámetros:
+    - cache_dir (str): Carpeta donde se guardan las instantáneas.
+    - max_size_bytes (int): Tamaño máximo total de la caché. Al superarlo se eliminan las instantáneas usadas hace más
+        tiempo. Por defecto es None (sin límite).
+    - n_partitions (int): Cantidad de particiones por hash de las columnas clave de cada instantánea. Por defecto es 16.
+
+    Uso:
+        - cache = SnapshotCache('C:/cache/dw', max_size_bytes=5 * 1024**3)
+        - df_only_new = get_only_new_rows(df_new, engine, 'TABLA', 'dbo', columns, keys, snapshot_cache=cache)
+
+    Cada instantánea se identifica por la tabla, las columnas, las columnas clave y la columna de fecha. Las columnas se
+    guardan con los tipos de la tabla (ver ColumnConversionPlan), con DECIMAL/NUMERIC como float. La actualización
+    incremental solo ve filas nuevas o modificadas con una fecha posterior a la marca de agua: las filas borradas de la
+    tabla o insertadas con una fecha anterior no se reflejan hasta una actualización completa (refresh con full=True).
+    Si el máximo de la columna de fecha queda por debajo de la marca de agua, o la tabla queda vacía, la instantánea se
+    descarta y se vuelve a leer completa.
+
+    Las particiones se reescriben de forma atómica y la marca de agua se guarda al final, por lo que si una actualización
+    se interrumpe la siguiente vuelve a aplicar los mismos cambios. La caché no está pensada para ser actualizada por
+    varios procesos a la vez.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = None, n_partitions: int = 16):
+        _check_pyarrow()
+
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.n_partitions = n_partitions
+        self._lock = threading.RLock()
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _get_snapshot_dir(self, table_name: str, schema: str, columns: list[str], key_columns: list[str],
+                          timestamp_column: str) -> str:
+        signature = json.dumps([columns, key_columns, timestamp_column, self.n_partitions])
+        signature_hash = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'{schema}.{table_name}', signature_hash)
+
+    @staticmethod
+    def _read_meta(snapshot_dir: str) -> dict:
+        meta_path = os.path.join(snapshot_dir, META_FILE_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_meta(snapshot_dir: str, meta: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+            os.replace(tmp_path, os.path.join(snapshot_dir, META_FILE_NAME))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def _write_partitions(self, snapshot_dir: str, df: pd.DataFrame, key_columns: list[str], replace: bool) -> None:
+        """
+        Agrega las filas de df a sus particiones. Si replace es True, antes se quitan de cada partición las filas
+        con las mismas claves.
+        """
+        partitions = _get_key_partitions(df, key_columns, self.n_partitions)
+
+        for partition, df_partition in df.groupby(partitions, sort=False):
+            path = os.path.join(snapshot_dir, _partition_file_name(partition))
+
+            if os.path.exists(path):
+                df_current = pq.read_table(path, memory_map=True).to_pandas()
+                if replace:
+                    df_keys = df_partition[key_columns].drop_duplicates()
+                    df_merge = df_current.merge(df_keys, on=key_columns, how='left', indicator=True)
+                    df_current = df_current[(df_merge['_merge'] == 'left_only').to_numpy()]
+                df_partition = pd.concat([df_current, df_partition], ignore_index=True)
+
+            _write_parquet_atomic(df_partition, path)
+
+    def refresh(self,
+                engine: sqlalchemy.engine.base.Engine,
+                table_name: str,
+                schema: str,
+                columns: list[str],
+                key_columns: list[str],
+                timestamp_column: str = 'TIMESTAMP_LECTURA',
+                full: bool = False,
+                chunksize: int = 100_000) -> int:
+        """
+        Actualiza la instantánea con las filas posteriores a su marca de agua, o la crea si no existe.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+            table_name (str): El nombre de la tabla.
+            schema (str): El nombre del esquema de la tabla.
+            columns (list[str]): Columnas a guardar. Siempre se agregan las columnas clave y la columna de fecha.
+            key_columns (list[str]): Columnas clave que identifican las filas.
+            timestamp_column (str, opcional): Columna de fecha que define la última versión. Por defecto es 'TIMESTAMP_LECTURA'.
+            full (bool, opcional): Si es True se descarta la instantánea y se vuelve a leer la tabla completa. Por defecto es False.
+            chunksize (int, opcional): Cantidad de filas por lote en la lectura. Por defecto es 100_000.
+
+        Returns:
+            int: La cantidad de filas leídas de la base de datos.
+        """
+        logger = logger_global.obtener_logger_prefect()
+
+        columns = list(dict.fromkeys(list(columns) + list(key_columns) + [timestamp_column]))
+        snapshot_dir = self._get_snapshot_dir(table_name, schema, columns, key_columns, timestamp_column)
+        timestamp_ref = _quote_identifier(timestamp_column)
+
+        with self._lock:
+            meta = None if full else self._read_meta(snapshot_dir)
+            low_watermark = _deserialize_watermark(meta['watermark']) if meta else None
+
+            with engine.connect() as connection:
+                high_watermark = connection.execute(
+                    text(f"SELECT MAX({timestamp_ref}) FROM {_quote_identifier(schema)}.{_quote_identifier(table_name)}")
+                ).scalar()
+
+            # Se compara con las fechas convertidas a datetime (en SQLite el MAX de una fecha se devuelve como texto)
+            low_value, high_value = _coerce_watermark(low_watermark), _coerce_watermark(high_watermark)
+
+            if meta is not None and (high_value == low_value):
+                logger.info("La instantánea de '%s.%s' está al día (%s).", schema, table_name, low_watermark)
+                meta['last_access'] = time.time()
+                self._write_meta(snapshot_dir, meta)
+                return 0
+
+            # Si la tabla quedó vacía o su máximo bajó (filas borradas) la instantánea ya no es válida y se lee completa
+            incremental = meta is not None and low_value is not None and high_value is not None and high_value > low_value
+            if meta is not None and not incremental:
+                logger.info("La instantánea de '%s.%s' se descarta: el máximo de %s pasó de %s a %s.",
+                            schema, table_name, timestamp_column, low_watermark, high_watermark)
+            if not incremental:
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+                os.makedirs(snapshot_dir)
+
+            total_rows = 0
+            if high_watermark is not None:
+                def watermark_filter(prefix: str) -> str:
+                    condition = f"{prefix}{timestamp_ref} <= :snapshot_high"
+                    if incremental:
+                        condition += f" AND {prefix}{timestamp_ref} > :snapshot_low"
+                    return condition
+
+                params = {'snapshot_high': high_watermark}
+                if incremental:
+                    params['snapshot_low'] = low_watermark
+
+                query = _build_latest_rows_query(schema, table_name, columns, key_columns, timestamp_column,
+                                                 order_by_keys=False, key_filter=watermark_filter)
+                plan = ColumnConversionPlan(get_column_types(engine, table_name, schema), decimal_mode='float', convert_dates=True)
+
+                for df_chunk in pd.read_sql_query(text(query), engine, params=params, chunksize=chunksize):
+                    df_chunk = plan.apply(df_chunk)
+                    self._write_partitions(snapshot_dir, df_chunk, key_columns, replace=incremental)
+                    total_rows += len(df_chunk)
+
+            # La marca de agua se guarda al final, luego de escribir todas las particiones
+            self._write_meta(snapshot_dir, {
+                'schema': schema,
+                'table_name': table_name,
+                'columns': columns,
+                'key_columns': list(key_columns),
+                'timestamp_column': timestamp_column,
+                'n_partitions': self.n_partitions,
+                'watermark': _serialize_watermark(high_watermark) if high_watermark is not None else None,
+                'last_access': time.time(),
+            })
+
+            logger.info("Instantánea de '%s.%s' actualizada (%s): %s filas leídas. Marca de agua: %s",
+                        schema, table_name, 'incremental' if incremental else 'completa', total_rows, high_watermark)
+
+            self.evict(keep=snapshot_dir)
+
+        return total_rows
+
+    def read(self,
+             engine: sqlalchemy.engine.base.Engine,
+             table_name: str,
+             schema: str,
+             columns: list[str],
+             key_columns: list[str],
+             timestamp_column: str = 'TIMESTAMP_LECTURA',
+             df_keys: pd.DataFrame = None,
+             refresh: bool = True) -> pd.DataFrame:
+        """
+        Lee la instantánea de la tabla desde el disco, actualizándola antes si se indica.
+
+        Args:
+            engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+            table_name (str): El nombre de la tabla.
+            schema (str): El nombre del esquema de la tabla.
+            columns (list[str]): Columnas a leer (ver refresh).
+            key_columns (list[str]): Columnas clave que identifican las filas.
+            timestamp_column (str, opcional): Columna de fecha que define la última versión. Por defecto es 'TIMESTAMP_LECTURA'.
+            df_keys (pandas.DataFrame, opcional): Si se indica, solo se leen las particiones de las claves presentes
+                en este DataFrame. Las particiones leídas pueden incluir otras claves. Por defecto es None.
+            refresh (bool, opcional): Si es True se actualiza la instantánea antes de leerla. Por defecto es True.
+
+        Returns:
+            pandas.DataFrame: La última versión de cada fila, con las columnas, las columnas clave y la columna de fecha.
+        """
+        columns = list(dict.fromkeys(list(columns) + list(key_columns) + [timestamp_column]))
+        snapshot_dir = self._get_snapshot_dir(table_name, schema, columns, key_columns, timestamp_column)
+
+        with self._lock:
+            meta = self._read_meta(snapshot_dir)
+            if refresh or meta is None:
+                self.refresh(engine, table_name, schema, columns, key_columns, timestamp_column)
+                meta = self._read_meta(snapshot_dir)
+
+            partitions = range(self.n_partitions)
+            if df_keys is not None:
+                plan = ColumnConversionPlan(get_column_types(engine, table_name, schema), decimal_mode='float', convert_dates=True)
+                df_keys = plan.apply(df_keys[key_columns].drop_duplicates().copy())
+                partitions = np.unique(_get_key_partitions(df_keys, key_columns, self.n_partitions))
+
+            paths = [os.path.join(snapshot_dir, _partition_file_name(partition)) for partition in partitions]
+            tables = [pq.read_table(path, memory_map=True) for path in paths if os.path.exists(path)]
+
+            meta['last_access'] = time.time()
+            self._write_meta(snapshot_dir, meta)
+
+        if not tables:
+            return pd.DataFrame(columns=columns)
+
+        return pa.concat_tables(tables, promote_options='permissive').to_pandas()
+
+    def _list_snapshots(self) -> list[tuple[str, dict, int]]:
+        """
+        Devuelve (carpeta, metadatos, tamaño en bytes) de cada instantánea de la caché.
+        """
+        snapshots = []
+        for table_dir in os.listdir(self.cache_dir):
+            table_path = os.path.join(self.cache_dir, table_dir)
+            if not os.path.isdir(table_path):
+                continue
+            for signature in os.listdir(table_path):
+                snapshot_dir = os.path.join(table_path, signature)
+                size = sum(entry.stat().st_size for entry in os.scandir(snapshot_dir) if entry.is_file())
+                snapshots.append((snapshot_dir, self._read_meta(snapshot_dir) or {}, size))
+        return snapshots
+
+    def size_bytes(self) -> int:
+        """
+        Devuelve el tamaño total de la caché en bytes.
+        """
+        return sum(size for _, _, size in self._list_snapshots())
+
+    def evict(self, keep: str = None) -> int:
+        """
+        Elimina las instantáneas usadas hace más tiempo hasta que la caché no supere max_size_bytes.
+
+        Args:
+            keep (str, opcional): Carpeta de una instantánea que no se debe eliminar. Por defecto es None.
+
+        Returns:
+            int: La cantidad de instantáneas eliminadas.
+        """
+        if self.max_size_bytes is None:
+            return 0
+
+        logger = logger_global.obtener_logger_prefect()
+
+        with self._lock:
+            snapshots = sorted(self._list_snapshots(), key=lambda snapshot: snapshot[1].get('last_access', 0))
+            total_size = sum(size for _, _, size in snapshots)
+
+            evicted = 0
+            for snapshot_dir, meta, size in snapshots:
+                if total_size <= self.max_size_bytes:
+                    break
+                if snapshot_dir == keep:
+                    continue
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+                total_size -= size
+                evicted += 1
+                logger.info("Instantánea de '%s.%s' eliminada de la caché (%s bytes).",
+                            meta.get('schema'), meta.get('table_name'), size)
+
+        return evicted
+
+    def invalidate(self, table_name: str = None, schema: str = None) -> None:
+        """
+        Elimina las instantáneas de una tabla, o todas si no se indica la tabla.
+
+        Args:
+            table_name (str, opcional): El nombre de la tabla. Por defecto es None.
+            schema (str, opcional): El nombre del esquema de la tabla. Por defecto es None.
+        """
+        with self._lock:
+            if table_name is None:
+                for table_dir in os.listdir(self.cache_dir):
+                    shutil.rmtree(os.path.join(self.cache_dir, table_dir), ignore_errors=True)
+                return
+
+            shutil.rmtree(os.path.join(self.cache_dir, f'{schema}.{table_name}'), ignore_errors=True)
@@ -5,6 +5,16 @@ Además reune funciones comunes para la manipulación de datos.
 Utiliza Prefect para el manejo de logs y keyring para la obtención de contraseñas.
 """
 
+import atexit
+import contextlib
+import decimal
+import hashlib
+import math
+import os
+import threading
+import tempfile
+from typing import Callable, Iterator
+
 import keyring as kr
 import sqlalchemy
 from sqlalchemy import create_engine, inspect, text
@@ -14,20 +24,90 @@ import numpy as np
 from prefect import task
 
 from consulterscommons.log_tools import PrefectLogger
+from consulterscommons.credential_tools import get_keyring_credential, invalidate_credentials
+from consulterscommons.db_tools.column_conversion import ColumnConversionPlan
+from consulterscommons.db_tools.columnar_fetch import _arrow_to_pandas, iter_record_batches, read_sql_columnar
+from consulterscommons.db_tools.schema_cache import get_schema_cache
+from consulterscommons.db_tools.type_inference import infer_sql_column_types
 
 logger_global = PrefectLogger(__file__)
 
+# SQL Server admite hasta 2100 parámetros por consulta, se deja margen para otros parámetros
+MAX_QUERY_PARAMETERS = 2000
+
+
+# Motores creados por get_sqlalchemy_engine, reutilizados dentro del proceso
+# Clave: (server, database, username, hash de la contraseña, pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping)
+# El hash es None si la contraseña se busca en el Credential Manager
+_ENGINE_REGISTRY: dict[tuple, sqlalchemy.engine.base.Engine] = {}
+_ENGINE_REGISTRY_LOCK = threading.Lock()
+
+
+def _get_keyring_credentials(server: str, username: str) -> tuple[str, str]:
+    """
+    Obtiene el usuario y la contraseña del Credential Manager. Se guardan en la caché de credenciales (ver
+    get_credential_cache) para no volver a consultar el Credential Manager en cada llamada.
+
+    Raises:
+        kr.errors.KeyringError: Se produce si no se encuentran las credenciales en el Credential Manager.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    credencial = get_keyring_credential(server, username)
+    if not credencial:
+        error_msg = f"Credentials not found for {username} in the Credential Manager"
+        logger.warning(error_msg)
+        raise kr.errors.KeyringError(error_msg)
+
+    logger.info("Credentials obtained for %s", credencial.username)
+    return credencial.username, credencial.password
+
+
+def _build_connection_url(drivername: str, server: str, database: str, username: str, password: str) -> sqlalchemy.URL:
+    """
+    Arma la URL de conexión a SQL Server por ODBC para el driver de SQLAlchemy indicado (mssql+pyodbc o mssql+aioodbc).
+    """
+    connection_string = (
+        f'DRIVER={{ODBC Driver 17 for SQL Server}};'
+        f'SERVER={server};'
+        f'DATABASE={database};'
+        f'UID={username};'
+        f'PWD={password}'
+    )
+
+    return sqlalchemy.URL.create(drivername, query={"odbc_connect": connection_string})
+
 
 @task(retries=2, retry_delay_seconds=5)
-def get_sqlalchemy_engine(server: str, database: str, username: str, password: str = None) -> sqlalchemy.engine.base.Engine:
+def get_sqlalchemy_engine(server: str,
+                          database: str,
+                          username: str,
+                          password: str = None,
+                          use_cache: bool = True,
+                          pool_size: int = 5,
+                          max_overflow: int = 10,
+                          pool_timeout: int = 30,
+                          pool_recycle: int = 3600,
+                          pool_pre_ping: bool = True) -> sqlalchemy.engine.base.Engine:
     """
     Inicializa una conexión a la base de datos SQL Server utilizando SQLAlchemy.
 
+    Los motores se guardan en un registro del proceso según el servidor, la base de datos, el usuario, un hash de la
+    contraseña indicada y las opciones del pool, por lo que llamadas posteriores con los mismos parámetros devuelven el mismo
+    motor (y su pool de conexiones) sin volver a buscar las credenciales ni validar la conexión; con otra contraseña se crea
+    un motor nuevo. Los motores se cierran al terminar el proceso o con dispose_sqlalchemy_engines.
+
     Args:
         server (str): El nombre del servidor SQL Server.
         database (str): El nombre de la base de datos.
         username (str): El nombre de usuario para la conexión.
         password (str, opcional): La contraseña para la conexión. Si no se proporciona, se buscará en el Credential Manager. Por defecto es None.
+        use_cache (bool, opcional): Si es True se reutiliza el motor del registro si existe. Por defecto es True.
+        pool_size (int, opcional): Cantidad de conexiones que se mantienen abiertas en el pool. Por defecto es 5.
+        max_overflow (int, opcional): Conexiones adicionales permitidas por encima de pool_size. Por defecto es 10.
+        pool_timeout (int, opcional): Segundos a esperar por una conexión libre del pool. Por defecto es 30.
+        pool_recycle (int, opcional): Segundos tras los cuales se recicla una conexión. Por defecto es 3600.
+        pool_pre_ping (bool, opcional): Si es True se valida cada conexión al tomarla del pool. Por defecto es True.
 
     Returns:
         sqlalchemy.engine.base.Engine: El motor SQLAlchemy si la conexión se establece correctamente.
@@ -40,33 +120,33 @@ def get_sqlalchemy_engine(server: str, database: str, username: str, password: s
 
     logger = logger_global.obtener_logger_prefect()
 
-    if password is None:
-        credencial = kr.get_credential(server, username)
-        if credencial:
-            username = credencial.username
-            password = credencial.password
-            logger.info("Credentials obtained for %s", username)
-        else:
-            error_msg = f"Credentials not found for {username} in the Credential Manager"
-            logger.warning(error_msg)
-            raise kr.errors.KeyringError(error_msg)
+    # Se guarda un hash y no la contraseña, para que no quede en texto plano en el registro
+    password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest() if password is not None else None
+    registry_key = (server, database, username, password_hash, pool_size, max_overflow, pool_timeout, pool_recycle,
+                    pool_pre_ping)
+
+    if use_cache:
+        with _ENGINE_REGISTRY_LOCK:
+            engine = _ENGINE_REGISTRY.get(registry_key)
+        if engine is not None:
+            logger.info("Reutilizando motor SQLAlchemy existente para %s/%s.", server, database)
+            return engine
+
+    keyring_username = username
+    password_from_keyring = password is None
+    if password_from_keyring:
+        username, password = _get_keyring_credentials(server, username)
 
     try:
         # Create SQLAlchemy engine
-        connection_string = (
-            f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-            f'SERVER={server};'
-            f'DATABASE={database};'
-            f'UID={username};'
-            f'PWD={password}'
-        )
-
-        connection_url = sqlalchemy.URL.create(
-            "mssql+pyodbc",
-            query={"odbc_connect": connection_string}
-        )
+        connection_url = _build_connection_url("mssql+pyodbc", server, database, username, password)
 
-        engine = create_engine(connection_url)
+        engine = create_engine(connection_url,
+                               pool_size=pool_size,
+                               max_overflow=max_overflow,
+                               pool_timeout=pool_timeout,
+                               pool_recycle=pool_recycle,
+                               pool_pre_ping=pool_pre_ping)
 
         with engine.connect() as connection:
             connection.execute(text("SELECT 1"))
@@ -75,22 +155,70 @@ def get_sqlalchemy_engine(server: str, database: str, username: str, password: s
     except sqlalchemy.exc.SQLAlchemyError as connect_err:
         error_msg = f"Error al conectar a la base de datos: {str(connect_err)}"
         logger.error(error_msg)
+        if password_from_keyring:
+            # La contraseña pudo haber cambiado: el reintento la vuelve a buscar en el Credential Manager
+            invalidate_credentials('keyring', server, keyring_username)
         raise
     except Exception as generic_err:
         error_msg = f"Error inesperado: {str(generic_err)}"
         logger.error(error_msg)
         raise
 
+    if use_cache:
+        with _ENGINE_REGISTRY_LOCK:
+            # Si otro hilo registró un motor mientras se creaba este, se conserva el primero
+            cached_engine = _ENGINE_REGISTRY.setdefault(registry_key, engine)
+        if cached_engine is not engine:
+            engine.dispose()
+            engine = cached_engine
+
     return engine
 
 
-def check_if_table_exists(engine: sqlalchemy.engine.base.Engine, table_name: str, schema: str) -> bool:
+def dispose_sqlalchemy_engines(server: str = None, database: str = None) -> int:
+    """
+    Cierra los pools de conexiones de los motores del registro de get_sqlalchemy_engine y los quita del registro.
+    Se llama automáticamente al terminar el proceso.
+
+    Args:
+        server (str, opcional): Si se indica, solo se cierran los motores de ese servidor. Por defecto es None.
+        database (str, opcional): Si se indica, solo se cierran los motores de esa base de datos. Por defecto es None.
+
+    Returns:
+        int: Cantidad de motores cerrados.
+    """
+    with _ENGINE_REGISTRY_LOCK:
+        keys_to_dispose = [
+            key for key in _ENGINE_REGISTRY
+            if (server is None or key[0] == server) and (database is None or key[1] == database)
+        ]
+        engines = [_ENGINE_REGISTRY.pop(key) for key in keys_to_dispose]
+
+    for engine in engines:
+        engine.dispose()
+
+    return len(engines)
+
+
+atexit.register(dispose_sqlalchemy_engines)
+
+
+def check_if_table_exists(engine: sqlalchemy.engine.base.Engine, table_name: str, schema: str, use_cache: bool = True) -> bool:
+    if use_cache:
+        return get_schema_cache(engine).has_table(table_name, schema)
+
     inspector = inspect(engine)
     return inspector.has_table(table_name, schema=schema)
 
 
 @task
-def get_columns_to_add(df: pd.DataFrame, engine: sqlalchemy.engine.base.Engine, table_name: str, schema: str) -> dict:
+def get_columns_to_add(df: pd.DataFrame,
+                       engine: sqlalchemy.engine.base.Engine,
+                       table_name: str,
+                       schema: str,
+                       infer_types: bool = False,
+                       sample_size: int = None,
+                       type_overrides: dict = None) -> dict:
     """
     Obtiene las columnas faltantes a agregar a una tabla en la base de datos si no existen en el esquema actual.
 
@@ -99,6 +227,10 @@ def get_columns_to_add(df: pd.DataFrame, engine: sqlalchemy.engine.base.Engine,
         engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
         table_name (str): El nombre de la tabla.
         schema (str): El nombre del esquema de la tabla.
+        infer_types (bool, opcional): Si es True el tipo de las columnas a agregar se infiere de los datos con el tipo más
+            ajustado (ver infer_sql_column_types) en lugar de usar INTEGER, FLOAT, DATETIME o NVARCHAR(MAX). Por defecto es False.
+        sample_size (int, opcional): Solo con infer_types. Cantidad de filas a muestrear para inferir los tipos. Por defecto es None.
+        type_overrides (dict, opcional): Tipos a usar para columnas específicas en lugar del calculado. Por defecto es None.
 
     Returns:
         dict: Un diccionario que contiene las columnas a agregar como claves y sus tipos de datos como valores.
@@ -109,9 +241,8 @@ def get_columns_to_add(df: pd.DataFrame, engine: sqlalchemy.engine.base.Engine,
 
     logger = logger_global.obtener_logger_prefect()
 
-    # Refleja el esquema de la base de datos existente
-    metadata = MetaData()
-    metadata.reflect(engine)
+    type_overrides = type_overrides or {}
+
     table_name_with_schema = f'{schema}.{table_name}'
 
     if check_if_table_exists(engine, table_name, schema) is False:
@@ -121,11 +252,20 @@ def get_columns_to_add(df: pd.DataFrame, engine: sqlalchemy.engine.base.Engine,
     existing_columns_info = get_column_types(engine, table_name, schema)
 
     # Determina las columnas a agregar basándose en las columnas del DataFrame
+    new_columns = [column for column in df.columns if column not in existing_columns_info]
+    inferred_types = {}
+    if infer_types and new_columns:
+        inferred_types = infer_sql_column_types(df[new_columns], sample_size, type_overrides)
+
     columns_to_add = {}
     for column in df.columns:
         if column not in existing_columns_info:
             # Determina el tipo de columna basándose en los tipos de datos del DataFrame
-            if pd.api.types.is_integer_dtype(df[column]):
+            if column in inferred_types:
+                column_type = inferred_types[column]
+            elif column in type_overrides:
+                column_type = type_overrides[column]
+            elif pd.api.types.is_integer_dtype(df[column]):
                 column_type = 'INTEGER'
             elif pd.api.types.is_float_dtype(df[column]):
                 column_type = 'FLOAT'
@@ -149,7 +289,7 @@ def get_columns_to_add(df: pd.DataFrame, engine: sqlalchemy.engine.base.Engine,
     return columns_to_add
 
 
-def get_column_types(engine: sqlalchemy.engine.base.Engine, table_name: str, schema: str) -> dict:
+def get_column_types(engine: sqlalchemy.engine.base.Engine, table_name: str, schema: str, use_cache: bool = True) -> dict:
     """
     Obtiene los tipos de datos de las columnas de una tabla en la base de datos.
 
@@ -157,65 +297,236 @@ def get_column_types(engine: sqlalchemy.engine.base.Engine, table_name: str, sch
         engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
         table_name (str): El nombre de la tabla.
         schema (str): El nombre del esquema de la tabla.
+        use_cache (bool, opcional): Si es True se usa la caché de esquema del motor (ver get_schema_cache). Por defecto es True.
 
     Returns:
         dict: Un diccionario que contiene los nombres de las columnas como claves y sus tipos de datos como valores.
     """
+    if use_cache:
+        return get_schema_cache(engine).get_column_types(table_name, schema)
+
     inspector = inspect(engine)
     columns = inspector.get_columns(table_name, schema=schema)
     column_types = {col['name']: col['type'] for col in columns}
     return column_types
 
 
-def convert_dataframe_column_types(df: pd.DataFrame, column_types: dict) -> pd.DataFrame:
+def _mssql_column_type(dialect: sqlalchemy.engine.Dialect,
+                       data_type: str,
+                       char_length: int,
+                       numeric_precision: int,
+                       numeric_scale: int,
+                       datetime_precision: int,
+                       collation: str) -> sqlalchemy.types.TypeEngine:
+    """
+    Convierte una fila de INFORMATION_SCHEMA.COLUMNS en el tipo de SQLAlchemy, igual que la reflexión del dialecto de SQL Server.
+    """
+    type_class = dialect.ischema_names.get(data_type.lower())
+    if type_class is None:
+        return sqlalchemy.types.NullType()
+
+    kwargs = {}
+    if issubclass(type_class, (sqlalchemy.types.String, sqlalchemy.types._Binary)):
+        # -1 indica (MAX)
+        kwargs['length'] = None if char_length == -1 else char_length
+        if collation and issubclass(type_class, sqlalchemy.types.String):
+            kwargs['collation'] = collation
+    elif issubclass(type_class, sqlalchemy.types.Float):
+        kwargs['precision'] = numeric_precision
+    elif issubclass(type_class, sqlalchemy.types.Numeric):
+        kwargs['precision'] = numeric_precision
+        kwargs['scale'] = numeric_scale
+    elif data_type.lower() in ('datetime2', 'datetimeoffset', 'time'):
+        kwargs['precision'] = datetime_precision
+
+    try:
+        return type_class(**kwargs)
+    except TypeError:
+        return type_class()
+
+
+def _fetch_mssql_tables_columns(connection: sqlalchemy.engine.base.Connection,
+                                tables: list[tuple[str, str]]) -> dict:
+    """
+    Obtiene las columnas de todas las tablas con consultas a INFORMATION_SCHEMA.COLUMNS, en lotes que respetan
+    el límite de parámetros. Devuelve {(schema, table_name): {columna: tipo}} solo con las tablas que existen, con las
+    claves tal como se pidieron aunque el catálogo devuelva los nombres con otras mayúsculas.
+    """
+    schemas = sorted({schema for schema, _ in tables})
+    table_names = sorted({table_name for _, table_name in tables})
+
+    # Los nombres se comparan sin distinguir mayúsculas, como en la intercalación por defecto de SQL Server
+    requested = {}
+    for schema, table_name in tables:
+        requested.setdefault((schema.casefold(), table_name.casefold()), []).append((schema, table_name))
+
+    names_per_query = max(1, MAX_QUERY_PARAMETERS - len(schemas))
+    schema_params = {f'schema_{i}': schema for i, schema in enumerate(schemas)}
+    schema_placeholders = ', '.join([f':{name}' for name in schema_params])
+
+    result = {}
+    for start in range(0, len(table_names), names_per_query):
+        names_chunk = table_names[start:start + names_per_query]
+        params = {**schema_params, **{f'table_{i}': name for i, name in enumerate(names_chunk)}}
+        table_placeholders = ', '.join([f':table_{i}' for i in range(len(names_chunk))])
+
+        query = f"""
+        SELECT
+            TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH,
+            NUMERIC_PRECISION, NUMERIC_SCALE, DATETIME_PRECISION, COLLATION_NAME
+        FROM
+            INFORMATION_SCHEMA.COLUMNS
+        WHERE
+            TABLE_SCHEMA IN ({schema_placeholders})
+            AND TABLE_NAME IN ({table_placeholders})
+        ORDER BY
+            TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION
+        """
+
+        for row in connection.execute(text(query), params):
+            # El filtro IN por esquema y por nombre también trae combinaciones que no se pidieron
+            requested_keys = requested.get((row.TABLE_SCHEMA.casefold(), row.TABLE_NAME.casefold()))
+            if requested_keys is None:
+                continue
+            column_type = _mssql_column_type(
+                connection.dialect, row.DATA_TYPE, row.CHARACTER_MAXIMUM_LENGTH, row.NUMERIC_PRECISION,
+                row.NUMERIC_SCALE, row.DATETIME_PRECISION, row.COLLATION_NAME
+            )
+            for key in requested_keys:
+                result.setdefault(key, {})[row.COLUMN_NAME] = column_type
+
+    return result
+
+
+def _fetch_tables_columns(engine: sqlalchemy.engine.base.Engine, tables: list[tuple[str, str]]) -> dict:
+    """
+    Obtiene las columnas de varias tablas. En SQL Server con una consulta a INFORMATION_SCHEMA.COLUMNS,
+    en otros dialectos con un único inspector y una llamada a get_multi_columns por esquema.
+    """
+    if not tables:
+        return {}
+
+    with engine.connect() as connection:
+        if connection.dialect.name == 'mssql':
+            return _fetch_mssql_tables_columns(connection, tables)
+
+        names_by_schema = {}
+        for schema, table_name in tables:
+            names_by_schema.setdefault(schema, []).append(table_name)
+
+        inspector = inspect(connection)
+        result = {}
+        for schema, table_names in names_by_schema.items():
+            multi_columns = inspector.get_multi_columns(schema=schema, filter_names=table_names,
+                                                        kind=sqlalchemy.engine.reflection.ObjectKind.ANY)
+            for (_, table_name), columns in multi_columns.items():
+                result[(schema, table_name)] = {col['name']: col['type'] for col in columns}
+
+    return result
+
+
+def get_tables_column_types(engine: sqlalchemy.engine.base.Engine,
+                            tables: list[tuple[str, str]],
+                            use_cache: bool = True) -> dict:
+    """
+    Obtiene los tipos de datos de las columnas de varias tablas a la vez.
+
+    En SQL Server se resuelven todas las tablas con una consulta a INFORMATION_SCHEMA.COLUMNS (en lotes de hasta
+    MAX_QUERY_PARAMETERS nombres) en lugar de crear un inspector y hacer varias consultas al catálogo por tabla.
+    Los resultados se guardan en la caché de esquema del motor, por lo que las llamadas siguientes a get_column_types
+    y check_if_table_exists para esas tablas no consultan la base de datos.
+
+    Args:
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+        tables (list[tuple[str, str]]): Lista de tablas como tuplas (schema, table_name).
+        use_cache (bool, opcional): Si es True solo se consultan las tablas que no están en la caché de esquema del motor
+            y el resultado se guarda en ella. Por defecto es True.
+
+    Returns:
+        dict: Un diccionario con (schema, table_name) como claves y los tipos de las columnas de cada tabla como valores
+            (igual que get_column_types). Las tablas que no existen no se incluyen.
+    """
+    tables = list(dict.fromkeys((schema, table_name) for schema, table_name in tables))
+    cache = get_schema_cache(engine) if use_cache else None
+
+    result = {}
+    tables_to_fetch = []
+    for schema, table_name in tables:
+        column_types = cache.get_cached_column_types(table_name, schema) if cache is not None else None
+        if column_types is None:
+            tables_to_fetch.append((schema, table_name))
+        else:
+            result[(schema, table_name)] = column_types
+
+    fetched = _fetch_tables_columns(engine, tables_to_fetch)
+    if cache is not None:
+        for (schema, table_name), column_types in fetched.items():
+            cache.prime(table_name, schema, column_types)
+
+    result.update(fetched)
+
+    # Se devuelven en el orden en que se pidieron
+    return {table: result[table] for table in tables if table in result}
+
+
+def check_if_tables_exist(engine: sqlalchemy.engine.base.Engine,
+                          tables: list[tuple[str, str]],
+                          use_cache: bool = True) -> dict:
+    """
+    Verifica la existencia de varias tablas a la vez (ver get_tables_column_types).
+
+    Args:
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+        tables (list[tuple[str, str]]): Lista de tablas como tuplas (schema, table_name).
+        use_cache (bool, opcional): Si es True se usa y se completa la caché de esquema del motor. Por defecto es True.
+
+    Returns:
+        dict: Un diccionario con (schema, table_name) como claves y True o False según si la tabla existe.
+    """
+    existing = get_tables_column_types(engine, tables, use_cache)
+    return {(schema, table_name): (schema, table_name) in existing for schema, table_name in tables}
+
+
+def convert_dataframe_column_types(df: pd.DataFrame, column_types: dict | ColumnConversionPlan) -> pd.DataFrame:
     """
     Convierte los tipos de datos de las columnas del DataFrame para que coincidan con los tipos de datos de las columnas de la tabla SQL.
 
     Args:
         df (pandas.DataFrame): El DataFrame con los datos.
-        column_types (dict): Un diccionario con los nombres de las columnas y sus tipos de datos en la tabla SQL.
+        column_types (dict | ColumnConversionPlan): Un diccionario con los nombres de las columnas y sus tipos de datos en la tabla SQL,
+            o un ColumnConversionPlan ya armado. Para convertir varios DataFrames con los mismos tipos conviene armar el plan una vez.
 
     Returns:
         pandas.DataFrame: El DataFrame con los tipos de datos de las columnas convertidos.
     """
     logger = logger_global.obtener_logger_prefect()
 
-    lista_columnas = df.columns.tolist()
-
-    for column, dtype in column_types.items():
-        if column in lista_columnas:
-            # current_dtype = df[column].dtype
-            if isinstance(dtype, sqlalchemy.types.Integer) or isinstance(dtype, sqlalchemy.types.BigInteger):
-                # if not pd.api.types.is_integer_dtype(current_dtype):
-                logger.info("Convirtiendo columna '%s' a tipo Integer", column)
-                df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
-            elif isinstance(dtype, sqlalchemy.types.Float):
-                # if not pd.api.types.is_float_dtype(current_dtype):
-                logger.info("Convirtiendo columna '%s' a tipo Float", column)
-                df[column] = pd.to_numeric(df[column], errors='coerce').astype('float')
-            elif isinstance(dtype, sqlalchemy.types.DateTime):
-                # if not pd.api.types.is_datetime64_any_dtype(current_dtype):
-                logger.info("Convirtiendo columna '%s' a tipo DateTime", column)
-                df[column] = pd.to_datetime(df[column], errors='coerce')
-            elif isinstance(dtype, sqlalchemy.types.String):
-                # if not pd.api.types.is_string_dtype(current_dtype):
-                logger.info("Convirtiendo columna '%s' a tipo String", column)
-                df[column] = df[column].astype(str).replace(['nan', 'NaN', 'None', 'none', 'NULL', 'null'], None)
-
-    logger.info("Tipos de datos convertidos exitosamente.")
+    plan = column_types if isinstance(column_types, ColumnConversionPlan) else ColumnConversionPlan(column_types)
+    df = plan.apply(df)
+
+    logger.info("Tipos de datos convertidos exitosamente (%s columnas en el plan).", len(plan.conversions))
     return df
 
 
 @task
-def add_columns_to_table(columns_to_add: dict, engine: sqlalchemy.engine.base.Engine, table_name: str, schema: str) -> None:
+def add_columns_to_table(columns_to_add: dict,
+                         engine: sqlalchemy.engine.base.Engine,
+                         table_name: str,
+                         schema: str,
+                         single_statement: bool = True) -> None:
     """
     Agrega las columnas faltantes a una tabla en la base de datos.
 
+    Por defecto todas las columnas se agregan en una única transacción. En SQL Server además se usa una única sentencia
+    ALTER TABLE ... ADD col1 tipo1, col2 tipo2, ..., por lo que el bloqueo de la tabla se toma una sola vez.
+
     Args:
         columns_to_add (dict): Un diccionario que contiene las columnas a agregar como claves y sus tipos de datos como valores.
+            Los tipos pueden ser strings (por ejemplo 'NVARCHAR(MAX)') o tipos de SQLAlchemy.
         engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
         table_name (str): El nombre de la tabla.
         schema (str): El nombre del esquema de la tabla.
+        single_statement (bool, opcional): Si es False se agrega cada columna en su propia transacción. Por defecto es True.
 
     Raises:
         sqlalchemy.exc.NoSuchTableError: Se produce si la tabla no se encuentra en la base de datos.
@@ -224,42 +535,559 @@ def add_columns_to_table(columns_to_add: dict, engine: sqlalchemy.engine.base.En
     logger = logger_global.obtener_logger_prefect()
 
     table_name_with_schema = f'{schema}.{table_name}'
+    quoted_table_name = f'{_quote_identifier(schema)}.{_quote_identifier(table_name)}'
+
+    if not columns_to_add:
+        logger.info("No es necesario agregar columnas.")
+        return
+
+    column_definitions = []
+    for column_name, column_type in columns_to_add.items():
+        if isinstance(column_type, sqlalchemy.types.TypeEngine):
+            column_type = column_type.compile(dialect=engine.dialect)
+        column_definitions.append(f"{_quote_identifier(column_name)} {column_type}")
+
+    try:
+        if not single_statement:
+            for column_definition in column_definitions:
+                with engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {quoted_table_name} ADD {column_definition}"))
+
+        elif engine.dialect.name == 'mssql':
+            # Construye una única consulta SQL para agregar todas las columnas
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {quoted_table_name} ADD {', '.join(column_definitions)}"))
+
+        else:
+            # Otros dialectos (por ejemplo SQLite) no admiten varias columnas por ALTER TABLE
+            with engine.begin() as connection:
+                for column_definition in column_definitions:
+                    connection.execute(text(f"ALTER TABLE {quoted_table_name} ADD {column_definition}"))
+    finally:
+        get_schema_cache(engine).invalidate(table_name, schema)
+
+    for column_name, column_type in columns_to_add.items():
+        logger.info("Se agregó la columna '%s' de tipo '%s' a la tabla '%s'", column_name, column_type, table_name_with_schema)
+
+
+@task
+def sync_table_columns(df: pd.DataFrame,
+                       engine: sqlalchemy.engine.base.Engine,
+                       table_name: str,
+                       schema: str) -> dict:
+    """
+    Calcula las columnas del DataFrame que faltan en la tabla (ver get_columns_to_add) y las agrega en una única
+    transacción (ver add_columns_to_table).
+
+    Args:
+        df (pandas.DataFrame): El DataFrame que contiene los datos.
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+        table_name (str): El nombre de la tabla.
+        schema (str): El nombre del esquema de la tabla.
+
+    Returns:
+        dict: Las columnas agregadas como claves y sus tipos de datos como valores.
+    """
+    columns_to_add = get_columns_to_add.fn(df, engine, table_name, schema)
+    add_columns_to_table.fn(columns_to_add, engine, table_name, schema)
+    return columns_to_add
+
+
+# Contexto con precisión suficiente para representar cualquier float de forma exacta como Decimal
+_EXACT_DECIMAL_CONTEXT = decimal.Context(prec=2000)
+
+# Desde pandas 3 replace ya no reduce el tipo de las columnas y la opción future.no_silent_downcasting está deprecada
+_USE_NO_SILENT_DOWNCASTING = int(pd.__version__.split('.')[0]) < 3
+
+
+def _replace_none_with_nan(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reemplaza None por NaN, para poder comparar los valores nulos. En pandas 2 se activa
+    future.no_silent_downcasting solo durante el reemplazo, para evitar warnings sin cambiar la configuración global.
+    """
+    if _USE_NO_SILENT_DOWNCASTING:
+        with pd.option_context("future.no_silent_downcasting", True):
+            return df.replace({None: np.nan})
+    return df.replace({None: np.nan})
+
+
+def _tag_object_value(value) -> str:
+    """
+    Representación de un valor de una columna object que distingue el tipo igual que el merge de pandas: los números
+    iguales (1, 1.0, Decimal('1.0'), True) tienen la misma representación, pero distinta a la del texto '1'.
+    """
+    if isinstance(value, str):
+        return 's:' + value
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and math.isnan(value)):
+        return 'null'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return 'n:' + str(decimal.Decimal(value).normalize(_EXACT_DECIMAL_CONTEXT))
+    return 'o:' + str(value)
+
+
+def compute_row_hash(df: pd.DataFrame, columns: list[str] = None) -> pd.Series:
+    """
+    Calcula un hash de contenido por fila de forma vectorizada.
+
+    Los valores None se normalizan a NaN antes de calcular el hash, igual que en la comparación de get_only_new_rows,
+    por lo que dos filas con los mismos valores (incluyendo nulos) tienen el mismo hash. En las columnas object que no
+    son solo texto cada valor se representa junto con su tipo, para que, igual que en el merge, el número 1 y el texto '1'
+    tengan hashes distintos.
+    El resultado puede guardarse en una columna BIGINT de la tabla para usar el modo 'hash' de get_only_new_rows.
+
+    Args:
+        df (pandas.DataFrame): El DataFrame con los datos.
+        columns (list[str], opcional): Columnas a incluir en el hash. Por defecto se usan todas las columnas del DataFrame.
+
+    Returns:
+        pandas.Series: Serie de tipo int64 con el hash de cada fila, con el mismo índice que df.
+    """
+    columns = df.columns.tolist() if columns is None else list(columns)
+
+    df_normalized = _replace_none_with_nan(df[columns])
+
+    for column in columns:
+        series = df_normalized[column]
+        if not pd.api.types.is_object_dtype(series.dtype):
+            continue
+        if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+            # Solo texto y nulos: se agrega la etiqueta de forma vectorizada
+            df_normalized[column] = ('s:' + series).fillna('null')
+        else:
+            df_normalized[column] = series.map(_tag_object_value)
+
+    hashes = pd.util.hash_pandas_object(df_normalized, index=False).to_numpy()
+    # Se reinterpretan los uint64 como int64 para poder almacenarlos en una columna BIGINT
+    return pd.Series(hashes.view('int64'), index=df.index, name='ROW_HASH')
+
+
+def _quote_identifier(name: str) -> str:
+    """
+    Devuelve el identificador entre corchetes, escapando los corchetes de cierre.
+    """
+    return '[' + str(name).replace(']', ']]') + ']'
+
+
+def _sqlalchemy_type_from_dtype(dtype) -> sqlalchemy.types.TypeEngine:
+    """
+    Obtiene el tipo de SQLAlchemy equivalente a un dtype de pandas.
+    """
+    if pd.api.types.is_bool_dtype(dtype):
+        return sqlalchemy.types.Boolean()
+    if pd.api.types.is_integer_dtype(dtype):
+        return sqlalchemy.types.BigInteger()
+    if pd.api.types.is_float_dtype(dtype):
+        return sqlalchemy.types.Float()
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return sqlalchemy.types.DateTime()
+    return sqlalchemy.types.Unicode()
+
+
+def _create_staging_table(connection: sqlalchemy.engine.base.Connection,
+                          df: pd.DataFrame,
+                          table_name: str,
+                          column_types: dict = None) -> sqlalchemy.Table:
+    """
+    Crea una tabla temporal con las columnas del DataFrame en la conexión indicada.
+    En SQL Server se crea como tabla temporal local (#tabla), en otros dialectos con CREATE TEMPORARY TABLE.
+    La tabla solo es visible desde la misma conexión, por lo que debe eliminarse antes de devolverla al pool.
+
+    Las columnas que están en column_types (por ejemplo, los tipos de la tabla destino según get_column_types) se crean
+    con ese tipo, incluida su intercalación. Así las comparaciones con la tabla destino usan el mismo tipo y la misma
+    intercalación, en lugar de NVARCHAR(MAX) con la intercalación de tempdb. El resto se crea según el dtype de pandas.
+    """
+    is_mssql = connection.dialect.name == 'mssql'
+    staging_name = f'#{table_name}' if is_mssql else table_name
+    prefixes = [] if is_mssql else ['TEMPORARY']
+    column_types = column_types or {}
+
+    columns = []
+    for col in df.columns:
+        column_type = column_types.get(col)
+        if column_type is None or isinstance(column_type, sqlalchemy.types.NullType):
+            column_type = _sqlalchemy_type_from_dtype(df[col].dtype)
+        columns.append(sqlalchemy.Column(col, column_type))
+    staging_table = sqlalchemy.Table(staging_name, MetaData(), *columns, prefixes=prefixes)
+    staging_table.create(connection)
+
+    return staging_table
+
+
+def _enable_fast_executemany(conn, cursor, statement, parameters, context, executemany) -> None:
+    """
+    Listener de SQLAlchemy que activa fast_executemany de pyodbc en los cursores de executemany.
+    """
+    if executemany:
+        cursor.fast_executemany = True
+
+
+def _insert_dataframe(connection: sqlalchemy.engine.base.Connection,
+                      table: sqlalchemy.Table,
+                      df: pd.DataFrame,
+                      chunksize: int = 10_000) -> None:
+    """
+    Inserta el DataFrame en la tabla por lotes, convirtiendo los nulos de pandas a None.
+
+    Con SQL Server y pyodbc se usa executemany con fast_executemany, que envía cada lote como un arreglo de parámetros.
+    En el resto de los casos se usan INSERT de múltiples filas con la cantidad de filas que entra en MAX_QUERY_PARAMETERS.
+    """
+    df_records = df.astype(object)
+    records = df_records.where(df_records.notna(), None).to_dict('records')
+
+    if not records:
+        return
+
+    if connection.dialect.name == 'mssql' and connection.dialect.driver == 'pyodbc':
+        sqlalchemy.event.listen(connection, 'before_cursor_execute', _enable_fast_executemany)
+        try:
+            for start in range(0, len(records), chunksize):
+                connection.execute(table.insert(), records[start:start + chunksize])
+        finally:
+            sqlalchemy.event.remove(connection, 'before_cursor_execute', _enable_fast_executemany)
+        return
+
+    # Con aioodbc fast_executemany se activa en el dialecto al crear el motor (ver get_async_sqlalchemy_engine)
+    if connection.dialect.name == 'mssql' and getattr(connection.dialect, 'fast_executemany', False):
+        for start in range(0, len(records), chunksize):
+            connection.execute(table.insert(), records[start:start + chunksize])
+        return
+
+    # SQL Server no admite más de 1000 filas por INSERT ... VALUES
+    rows_per_statement = max(1, min(1000, MAX_QUERY_PARAMETERS // max(1, len(df.columns))))
+    for start in range(0, len(records), rows_per_statement):
+        connection.execute(table.insert().values(records[start:start + rows_per_statement]))
+
+
+def _build_latest_rows_query(table_schema: str,
+                             table_name: str,
+                             select_columns: list[str],
+                             key_columns: list[str],
+                             timestamp_column: str,
+                             distinct: bool = False,
+                             order_by_keys: bool = True,
+                             key_filter=None) -> str:
+    """
+    Construye la consulta que obtiene la última versión de cada fila (según timestamp_column) para las columnas clave.
+    key_filter es una función que recibe el prefijo de la tabla ('tk.') y devuelve la condición a aplicar en la subconsulta.
+    No se repite en el SELECT exterior: el INNER JOIN por las columnas clave ya limita las filas a las claves filtradas,
+    y repetirla duplicaría los parámetros enlazados (SQL Server admite hasta 2100 por consulta).
+    """
+    columns_str = ', '.join([f't.[{col}]' for col in select_columns])
+    key_columns_str = ', '.join(key_columns)
+    prefix_key_columns_str = ', '.join([f'sub.[{col}]' for col in key_columns]) # Prefijo para columnas claves cuando se llama desde el SELECT exterior
+
+    inner_where = f"WHERE {key_filter('tk.')}" if key_filter else ''
+
+    query = f"""
+    SELECT {'DISTINCT' if distinct else ''}
+        {columns_str}
+    FROM
+        [{table_schema}].[{table_name}] AS t
+    INNER JOIN (
+        SELECT
+            {key_columns_str},
+            MAX({timestamp_column}) AS LAST_TIMESTAMP_LECTURA
+        FROM
+            [{table_schema}].[{table_name}] AS tk
+        {inner_where}
+        GROUP BY
+            {key_columns_str}
+    ) AS sub ON {" AND ".join([f"t.{col} = sub.{col}" for col in key_columns])} AND t.{timestamp_column} = sub.LAST_TIMESTAMP_LECTURA
+    """
+
+    if order_by_keys:
+        query += f"""ORDER BY
+        {prefix_key_columns_str}
+    """
+
+    return query
+
+
+def _build_key_filters(df_new: pd.DataFrame, key_columns: list[str], key_pushdown: str = None) -> list[tuple]:
+    """
+    Construye los filtros sobre las columnas clave presentes en df_new para limitar la lectura de la tabla.
+
+    Devuelve una lista de tuplas (key_filter, params) donde key_filter es la función que se pasa a _build_latest_rows_query
+    y params son los parámetros a enlazar en la consulta. Se debe ejecutar una consulta por cada elemento de la lista.
+        - None: Sin filtro, se lee la tabla completa.
+        - 'range': Un único filtro BETWEEN con el mínimo y máximo de cada columna clave.
+        - 'in': Filtros con la lista de claves presentes, en lotes que respetan el límite de parámetros de SQL Server.
+    """
+    if key_pushdown is None:
+        return [(None, {})]
+
+    # Las claves nulas nunca coinciden en el INNER JOIN con la subconsulta, por lo que no se incluyen
+    df_keys = df_new[key_columns].dropna().drop_duplicates()
+
+    if df_keys.empty:
+        return [(None, {})]
+
+    if key_pushdown == 'range':
+        params = {}
+        for i, col in enumerate(key_columns):
+            params[f'key_min_{i}'] = df_keys[col].min()
+            params[f'key_max_{i}'] = df_keys[col].max()
+        # Los tipos de numpy no son soportados por los drivers, se convierten a tipos de Python
+        params = {name: value.item() if isinstance(value, np.generic) else value for name, value in params.items()}
+
+        def range_filter(prefix: str) -> str:
+            return ' AND '.join([f"{prefix}{_quote_identifier(col)} BETWEEN :key_min_{i} AND :key_max_{i}"
+                                 for i, col in enumerate(key_columns)])
+
+        return [(range_filter, params)]
+
+    key_tuples = list(df_keys.astype(object).itertuples(index=False, name=None))
+    rows_per_chunk = max(1, MAX_QUERY_PARAMETERS // len(key_columns))
 
-    # Agrega las columnas faltantes a la tabla
-    if columns_to_add:
-        for column_name, column_type in columns_to_add.items():
-            with engine.connect() as connection:
-                # Construye la consulta SQL para agregar la columna
-                sql_query = text(f"ALTER TABLE {table_name_with_schema} ADD {column_name} {column_type}")
-                connection.execute(sql_query)
+    key_filters = []
+    for start in range(0, len(key_tuples), rows_per_chunk):
+        chunk = key_tuples[start:start + rows_per_chunk]
+        params = {f'key_{i}_{j}': value for j, key_tuple in enumerate(chunk) for i, value in enumerate(key_tuple)}
+
+        def in_filter(prefix: str, n_rows: int = len(chunk)) -> str:
+            if len(key_columns) == 1:
+                placeholders = ', '.join([f':key_0_{j}' for j in range(n_rows)])
+                return f"{prefix}{_quote_identifier(key_columns[0])} IN ({placeholders})"
+
+            conditions = [
+                '(' + ' AND '.join([f"{prefix}{_quote_identifier(col)} = :key_{i}_{j}" for i, col in enumerate(key_columns)]) + ')'
+                for j in range(n_rows)
+            ]
+            return '(' + ' OR '.join(conditions) + ')'
+
+        key_filters.append((in_filter, params))
+
+    return key_filters
+
+
+def _connect(connectable: sqlalchemy.engine.base.Engine | sqlalchemy.engine.base.Connection):
+    """
+    Devuelve un contexto con una conexión: una nueva del motor, o la misma conexión si ya se recibió una.
+    """
+    if isinstance(connectable, sqlalchemy.engine.base.Engine):
+        return connectable.connect()
+    return contextlib.nullcontext(connectable)
+
+
+def _get_new_row_ids_from_staging(engine: sqlalchemy.engine.base.Engine | sqlalchemy.engine.base.Connection,
+                                  df_new: pd.DataFrame,
+                                  table_name: str,
+                                  table_schema: str,
+                                  columns_to_compare: list[str],
+                                  key_columns: list[str],
+                                  timestamp_column: str,
+                                  row_id_column: str,
+                                  key_pushdown: str = None) -> list:
+    """
+    Carga df_new en una tabla temporal y deja que el motor de base de datos haga el anti-join contra la última versión de
+    cada fila. Devuelve los valores de row_id_column de las filas que no existen en la tabla.
+    Con key_pushdown='in' la tabla temporal se usa además como tabla de claves para leer solo las claves presentes.
+    """
+    staging_columns = [row_id_column] + columns_to_compare + [col for col in key_columns if col not in columns_to_compare]
+    # Si se recibe una conexión la transacción es de quien llama: la tabla temporal se elimina sin confirmar
+    owns_connection = isinstance(engine, sqlalchemy.engine.base.Engine)
+
+    with _connect(engine) as connection:
+        # Las columnas de la tabla temporal toman el tipo y la intercalación de la tabla, para comparar igual que ella
+        table_column_types = get_schema_cache(connection.engine).get_column_types(table_name, table_schema, connection=connection)
+        staging_table = _create_staging_table(connection, df_new[staging_columns], f'STG_{table_name}', table_column_types)
+        try:
+            _insert_dataframe(connection, staging_table, df_new[staging_columns])
+
+            if key_pushdown == 'in':
+                def key_filter(prefix: str) -> str:
+                    key_conditions = ' AND '.join([f"k.{_quote_identifier(col)} = {prefix}{_quote_identifier(col)}" for col in key_columns])
+                    return f"EXISTS (SELECT 1 FROM {_quote_identifier(staging_table.name)} AS k WHERE {key_conditions})"
+                params = {}
+            else:
+                key_filter, params = _build_key_filters(df_new, key_columns, key_pushdown)[0]
+
+            latest_query = _build_latest_rows_query(table_schema, table_name, columns_to_compare, key_columns,
+                                                    timestamp_column, order_by_keys=False, key_filter=key_filter)
+
+            # Comparación tolerante a nulos, equivalente al merge de pandas donde NaN coincide con NaN
+            conditions = ' AND '.join([
+                f"(e.{_quote_identifier(col)} = s.{_quote_identifier(col)} OR (e.{_quote_identifier(col)} IS NULL AND s.{_quote_identifier(col)} IS NULL))"
+                for col in columns_to_compare
+            ])
+
+            query = f"""
+            SELECT
+                s.{_quote_identifier(row_id_column)}
+            FROM
+                {_quote_identifier(staging_table.name)} AS s
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM ({latest_query}) AS e
+                WHERE {conditions}
+            )
+            """
+
+            new_row_ids = connection.execute(text(query), params).scalars().all()
+        finally:
+            staging_table.drop(connection)
+            if owns_connection:
                 connection.commit()
 
-            logger.info("Se agregó la columna '%s' de tipo '%s' a la tabla '%s'", column_name, column_type, table_name_with_schema)
-    else:
-        logger.info("No es necesario agregar columnas.")
+    return new_row_ids
+
+
+def _read_existing(query: str,
+                   engine: sqlalchemy.engine.base.Engine,
+                   params: dict,
+                   column_types: dict = None,
+                   fetch_mode: str = 'pandas') -> pd.DataFrame:
+    """
+    Lee el resultado de la consulta con pd.read_sql_query o por lotes columnares de Arrow (ver read_sql_columnar).
+    En ambos casos las columnas quedan con los tipos de numpy para poder compararlas con los datos nuevos.
+    """
+    if fetch_mode == 'arrow':
+        return read_sql_columnar(query, engine, params=params, dtype=column_types, arrow_dtypes=False)
+    return pd.read_sql_query(text(query), engine, params=params, dtype=column_types)
+
+
+def _iter_existing_chunks(query: str,
+                          engine: sqlalchemy.engine.base.Engine,
+                          params: dict,
+                          column_types: dict = None,
+                          chunksize: int = 100_000,
+                          fetch_mode: str = 'pandas') -> Iterator[pd.DataFrame]:
+    """
+    Igual que _read_existing pero devuelve el resultado en partes de hasta chunksize filas.
+    """
+    if fetch_mode != 'arrow':
+        yield from pd.read_sql_query(text(query), engine, params=params, dtype=column_types, chunksize=chunksize)
+        return
+
+    for batch in iter_record_batches(query, engine, params=params, batch_size=chunksize):
+        df_chunk = _arrow_to_pandas(batch, arrow_dtypes=False)
+        yield df_chunk.astype(column_types) if column_types else df_chunk
+
+
+def _get_existing_hashes(engine: sqlalchemy.engine.base.Engine,
+                         table_name: str,
+                         table_schema: str,
+                         columns_to_compare: list[str],
+                         key_columns: list[str],
+                         timestamp_column: str,
+                         column_types: dict,
+                         hash_column: str = None,
+                         key_filters: list[tuple] = None,
+                         chunksize: int = 100_000,
+                         fetch_mode: str = 'pandas') -> np.ndarray:
+    """
+    Obtiene los hashes de la última versión de cada fila de la tabla.
+
+    Si se indica hash_column solo se trae esa columna desde la base de datos. Si no, se traen las columnas a comparar
+    por partes y se calcula el hash localmente, conservando en memoria únicamente los hashes.
+    """
+    hashes = []
+
+    for key_filter, params in key_filters or [(None, {})]:
+        if hash_column is not None:
+            query = _build_latest_rows_query(table_schema, table_name, [hash_column], key_columns, timestamp_column,
+                                             distinct=True, order_by_keys=False, key_filter=key_filter)
+            df_hashes = _read_existing(query, engine, params, fetch_mode=fetch_mode)
+            hashes.append(df_hashes[hash_column].dropna().astype('int64').unique())
+            continue
+
+        query = _build_latest_rows_query(table_schema, table_name, columns_to_compare, key_columns, timestamp_column,
+                                         order_by_keys=False, key_filter=key_filter)
+
+        for df_chunk in _iter_existing_chunks(query, engine, params, column_types, chunksize, fetch_mode):
+            hashes.append(compute_row_hash(df_chunk, columns_to_compare).unique())
+
+    if not hashes:
+        return np.array([], dtype='int64')
+
+    return np.unique(np.concatenate(hashes))
+
+
+def _get_only_new_rows_from_snapshot(df_new: pd.DataFrame,
+                                     engine: sqlalchemy.engine.base.Engine,
+                                     table_name: str,
+                                     table_schema: str,
+                                     columns_to_compare: list[str],
+                                     key_columns: list[str],
+                                     timestamp_column: str,
+                                     snapshot_cache) -> pd.DataFrame:
+    """
+    Compara df_new con la instantánea local de la tabla (ver SnapshotCache). Las columnas a comparar de df_new se
+    convierten a los tipos de la tabla, igual que la instantánea, y se devuelven las filas originales de df_new.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    # Solo se pueden descartar particiones por clave si las claves forman parte de la comparación
+    df_keys = df_new if all(col in columns_to_compare for col in key_columns) else None
+    df_existing = snapshot_cache.read(engine, table_name, table_schema, columns_to_compare, key_columns,
+                                      timestamp_column, df_keys=df_keys)
+
+    if df_existing.empty:
+        logger.info("No se encontraron datos en la tabla '%s.%s'. Se insertarán todos los datos nuevos.", table_schema, table_name)
+        return df_new
+
+    df_new = _replace_none_with_nan(df_new)
+    df_new = df_new.sort_values(by=key_columns)
+    df_new = df_new.reset_index(drop=True)
+
+    plan = ColumnConversionPlan(get_column_types(engine, table_name, table_schema), decimal_mode='float', convert_dates=True)
+    df_compare = plan.apply(df_new[columns_to_compare].copy())
+    df_existing = df_existing[columns_to_compare].drop_duplicates()
+
+    df_merge = pd.merge(df_compare, df_existing, on=columns_to_compare, how='left', indicator=True)
+    df_only_new = df_new[(df_merge['_merge'] == 'left_only').to_numpy()]
+    logger.info("Se encontraron %s filas nuevas de %s en la tabla '%s.%s'.", len(df_only_new), len(df_new), table_schema, table_name)
+
+    return df_only_new
 
 
 @task
 def get_only_new_rows(df_new: pd.DataFrame,
-                      engine: sqlalchemy.engine.base.Engine,
+                      engine: sqlalchemy.engine.base.Engine | sqlalchemy.engine.base.Connection,
                       table_name: str,
                       table_schema: str,
                       columns_to_compare: list[str],
                       key_columns: list[str],
-                      timestamp_column: str = 'TIMESTAMP_LECTURA'
+                      timestamp_column: str = 'TIMESTAMP_LECTURA',
+                      compare_mode: str = 'merge',
+                      hash_column: str = None,
+                      key_pushdown: str = None,
+                      fetch_mode: str = 'pandas',
+                      snapshot_cache=None
                       ) -> pd.DataFrame:
     """
     Compara los datos de un DataFrame con los datos actuales en una tabla en el Data Warehouse y devuelve solo las filas nuevas.
     Utiliza las columnas clave para determinar la última versión de cada fila y solo traer esa.
 
     Args:
-    - engine: Objeto SQLAlchemy Engine que representa la conexión a la base de datos.
+    - engine: Objeto SQLAlchemy Engine que representa la conexión a la base de datos. También se acepta una Connection
+        abierta, por ejemplo desde AsyncConnection.run_sync (ver async_get_only_new_rows).
     - df_new: DataFrame que contiene los datos nuevos a comparar.
     - table_name: Nombre de la tabla en el Data Warehouse.
     - table_schema: Esquema de la tabla en el Data Warehouse.
     - columns_to_compare: Lista de columnas a utilizar para la comparación.
     - key_columns: Lista de columnas clave que identifican las filas de forma única.
     - timestamp_column: Nombre de la columna que contiene la fecha de lectura de los datos. Por defecto es 'TIMESTAMP_LECTURA'.
+    - compare_mode: Estrategia de comparación. Por defecto es 'merge'.
+        - 'merge': Trae las columnas a comparar de la última versión de cada fila y hace un merge en pandas.
+        - 'hash': Compara un hash por fila de las columnas a comparar (ver compute_row_hash) en lugar de las columnas completas.
+        - 'staging': Carga df_new en una tabla temporal y hace la comparación en la base de datos, trayendo solo las filas nuevas.
+    - hash_column: Solo para compare_mode='hash'. Columna de la tabla que almacena el hash de las columnas a comparar
+        calculado con compute_row_hash. Si se indica, solo se traen los hashes desde la base de datos. Por defecto es None.
+    - key_pushdown: Filtra la lectura de la tabla a las claves presentes en df_new para evitar recorrer toda la tabla.
+        Solo debe usarse si las columnas clave forman parte de las columnas a comparar. Por defecto es None.
+        - None: Se lee la última versión de todas las filas de la tabla.
+        - 'in': Se filtra por la lista de claves de df_new, en lotes de hasta MAX_QUERY_PARAMETERS parámetros.
+            Con compare_mode='staging' se usa la tabla temporal como tabla de claves.
+        - 'range': Se filtra por el mínimo y máximo de cada columna clave de df_new.
+    - fetch_mode: Forma de leer los datos actuales de la tabla en los modos 'merge' y 'hash'. Por defecto es 'pandas'.
+        - 'pandas': Se lee con pd.read_sql_query.
+        - 'arrow': Se lee por lotes columnares de Arrow (ver read_sql_columnar), más rápido en tablas anchas. Requiere pyarrow.
+    - snapshot_cache: Solo para compare_mode='merge'. Objeto SnapshotCache con la instantánea local de la tabla. Si se indica,
+        se actualiza la instantánea de forma incremental y la comparación se hace contra el disco local en lugar de leer
+        la tabla completa. Los valores se comparan con los tipos de la tabla. Por defecto es None.
 
     Returns:
     DataFrame que contiene solo las filas nuevas encontradas en df_new en comparación con los datos actuales en la tabla del Data Warehouse.
@@ -271,8 +1099,8 @@ def get_only_new_rows(df_new: pd.DataFrame,
     if not isinstance(df_new, pd.DataFrame):
         raise TypeError("df_new debe ser un DataFrame de pandas.")
 
-    if not isinstance(engine, sqlalchemy.engine.base.Engine):
-        raise TypeError("engine debe ser un objeto SQLAlchemy Engine.")
+    if not isinstance(engine, (sqlalchemy.engine.base.Engine, sqlalchemy.engine.base.Connection)):
+        raise TypeError("engine debe ser un objeto SQLAlchemy Engine o Connection.")
 
     if not isinstance(table_name, str):
         raise TypeError("table_name debe ser un string.")
@@ -295,6 +1123,24 @@ def get_only_new_rows(df_new: pd.DataFrame,
     if not isinstance(timestamp_column, str):
         raise TypeError("timestamp_column debe ser un string.")
 
+    if compare_mode not in ('merge', 'hash', 'staging'):
+        raise ValueError("compare_mode debe ser 'merge', 'hash' o 'staging'.")
+
+    if hash_column is not None and not isinstance(hash_column, str):
+        raise TypeError("hash_column debe ser un string.")
+
+    if key_pushdown not in (None, 'in', 'range'):
+        raise ValueError("key_pushdown debe ser None, 'in' o 'range'.")
+
+    if fetch_mode not in ('pandas', 'arrow'):
+        raise ValueError("fetch_mode debe ser 'pandas' o 'arrow'.")
+
+    if snapshot_cache is not None and compare_mode != 'merge':
+        raise ValueError("snapshot_cache solo se puede usar con compare_mode='merge'.")
+
+    if snapshot_cache is not None and not isinstance(engine, sqlalchemy.engine.base.Engine):
+        raise TypeError("snapshot_cache requiere que engine sea un objeto SQLAlchemy Engine.")
+
     columns_df_new = df_new.columns.tolist()
 
     if not all(col in columns_df_new for col in columns_to_compare):
@@ -303,43 +1149,73 @@ def get_only_new_rows(df_new: pd.DataFrame,
     # if not all(col in columns_df_new for col in key_columns):
     #     raise ValueError("Las columnas clave deben estar presentes en el DataFrame df_new.")
 
-    # Construir las cadenas de columnas para la consulta SQL
-    columns_str = ', '.join([f't.[{col}]' for col in columns_to_compare])
-    key_columns_str = ', '.join(key_columns)
-    prefix_key_columns_str = ', '.join([f'sub.[{col}]' for col in key_columns]) # Prefijo para columnas claves cuando se llama desde el SELECT exterior
-
-    # Paso 1: Obtener los datos actuales de la tabla en el DW
-    query = f"""
-    SELECT
-        {columns_str}
-    FROM
-        [{table_schema}].[{table_name}] AS t
-    INNER JOIN (
-        SELECT
-            {key_columns_str},
-            MAX({timestamp_column}) AS LAST_TIMESTAMP_LECTURA
-        FROM
-            [{table_schema}].[{table_name}]
-        GROUP BY
-            {key_columns_str}
-    ) AS sub ON {" AND ".join([f"t.{col} = sub.{col}" for col in key_columns])} AND t.{timestamp_column} = sub.LAST_TIMESTAMP_LECTURA
-    ORDER BY
-        {prefix_key_columns_str}
-    """
+    if key_pushdown is not None and not all(col in columns_df_new for col in key_columns):
+        raise ValueError("Las columnas clave deben estar presentes en el DataFrame df_new para usar key_pushdown.")
 
     # Quitar columnas que no se van a comparar
     column_types = {col: df_new[col].dtype for col in columns_to_compare}
-    df_existing = pd.read_sql_query(query, engine, dtype=column_types)
+
+    if compare_mode == 'hash':
+        # Paso 1: Obtener solo los hashes de los datos actuales de la tabla en el DW
+        key_filters = _build_key_filters(df_new, key_columns, key_pushdown)
+        existing_hashes = _get_existing_hashes(engine, table_name, table_schema, columns_to_compare, key_columns,
+                                               timestamp_column, column_types, hash_column, key_filters,
+                                               fetch_mode=fetch_mode)
+
+        if existing_hashes.size == 0:
+            logger.info("No se encontraron datos en la tabla '%s.%s'. Se insertarán todos los datos nuevos.", table_schema, table_name)
+            return df_new
+
+        # Paso 2: Ordenar el dataframe nuevo para comparar
+        df_new = _replace_none_with_nan(df_new)
+        df_new = df_new.sort_values(by=key_columns)
+        df_new = df_new.reset_index(drop=True)
+
+        # Paso 3: Comparar los hashes de df_new con los hashes actuales en el DW
+        new_hashes = compute_row_hash(df_new, columns_to_compare)
+        df_only_new = df_new[~new_hashes.isin(existing_hashes)]
+
+        return df_only_new
+
+    if compare_mode == 'staging':
+        # Paso 1: Ordenar el dataframe nuevo y agregarle un identificador de fila
+        df_new = _replace_none_with_nan(df_new)
+        df_new = df_new.sort_values(by=key_columns)
+        df_new = df_new.reset_index(drop=True)
+
+        row_id_column = 'ROW_ID_STAGING'
+        staging_columns = list(dict.fromkeys(columns_to_compare + key_columns))
+        df_staging = df_new[staging_columns].assign(**{row_id_column: df_new.index})
+
+        # Paso 2: Comparar en la base de datos y traer solo los identificadores de las filas nuevas
+        new_row_ids = _get_new_row_ids_from_staging(engine, df_staging, table_name, table_schema, columns_to_compare,
+                                                    key_columns, timestamp_column, row_id_column, key_pushdown)
+
+        df_only_new = df_new[df_new.index.isin(new_row_ids)]
+        logger.info("Se encontraron %s filas nuevas de %s en la tabla '%s.%s'.", len(df_only_new), len(df_new), table_schema, table_name)
+
+        return df_only_new
+
+    if snapshot_cache is not None:
+        return _get_only_new_rows_from_snapshot(df_new, engine, table_name, table_schema, columns_to_compare,
+                                                key_columns, timestamp_column, snapshot_cache)
+
+    # Paso 1: Obtener los datos actuales de la tabla en el DW
+    df_existing_parts = []
+    for key_filter, params in _build_key_filters(df_new, key_columns, key_pushdown):
+        query = _build_latest_rows_query(table_schema, table_name, columns_to_compare, key_columns, timestamp_column,
+                                         key_filter=key_filter)
+        df_existing_parts.append(_read_existing(query, engine, params, column_types, fetch_mode))
+
+    df_existing = pd.concat(df_existing_parts, ignore_index=True) if len(df_existing_parts) > 1 else df_existing_parts[0]
 
     if df_existing.empty:
         logger.info("No se encontraron datos en la tabla '%s.%s'. Se insertarán todos los datos nuevos.", table_schema, table_name)
         return df_new
 
-    pd.set_option("future.no_silent_downcasting", True) # Para evitar warnings de pandas
-
     # En Pandas los valores None no pueden ser comparados, por lo que se reemplazan por NaN
-    df_existing = df_existing.replace({None: np.nan})
-    df_new = df_new.replace({None: np.nan})
+    df_existing = _replace_none_with_nan(df_existing)
+    df_new = _replace_none_with_nan(df_new)
 
     # Paso 2: Ordenar el dataframe nuevo para comparar
     df_new = df_new.sort_values(by=key_columns)
@@ -350,3 +1226,212 @@ def get_only_new_rows(df_new: pd.DataFrame,
     df_only_new = df_merge[df_merge['_merge'] == 'left_only'].drop(columns=['_merge'])
 
     return df_only_new
+
+
+def _get_key_partitions(df: pd.DataFrame, key_columns: list[str], n_partitions: int) -> np.ndarray:
+    """
+    Asigna a cada fila una partición según el hash de sus columnas clave.
+    """
+    key_hashes = pd.util.hash_pandas_object(df[key_columns], index=False).to_numpy()
+    return (key_hashes % np.uint64(n_partitions)).astype('int64')
+
+
+def _get_table_row_count(engine: sqlalchemy.engine.base.Engine, table_name: str, table_schema: str) -> int:
+    """
+    Obtiene la cantidad de filas de la tabla. En SQL Server se lee de los metadatos de sys.partitions (montón o índice
+    clustered), que es aproximada pero no recorre la tabla; en otros dialectos se usa COUNT(*).
+    """
+    quoted_table_name = f'{_quote_identifier(table_schema)}.{_quote_identifier(table_name)}'
+
+    with engine.connect() as connection:
+        if connection.dialect.name == 'mssql':
+            query = """
+            SELECT SUM(p.rows)
+            FROM sys.partitions AS p
+            WHERE p.object_id = OBJECT_ID(:table_name) AND p.index_id IN (0, 1)
+            """
+            return connection.execute(text(query), {'table_name': quoted_table_name}).scalar() or 0
+
+        return connection.execute(text(f"SELECT COUNT(*) FROM {quoted_table_name}")).scalar() or 0
+
+
+def _estimate_partitions(df_new: pd.DataFrame,
+                         engine: sqlalchemy.engine.base.Engine,
+                         table_name: str,
+                         table_schema: str,
+                         columns_to_compare: list[str],
+                         max_memory_mb: int) -> tuple[int, int]:
+    """
+    Estima la cantidad de particiones y el tamaño de lectura necesarios para no superar max_memory_mb.
+    Se usa el tamaño por fila de df_new y la cantidad de filas de la tabla como cota superior del snapshot.
+    Se reserva el triple del tamaño de cada partición para el merge y sus copias intermedias.
+    """
+    table_rows = _get_table_row_count(engine, table_name, table_schema)
+
+    bytes_per_row = max(1.0, df_new[columns_to_compare].memory_usage(deep=True, index=False).sum() / max(1, len(df_new)))
+    max_bytes = max_memory_mb * 1024 ** 2
+
+    n_partitions = max(1, math.ceil(3 * bytes_per_row * (table_rows + len(df_new)) / max_bytes))
+    chunksize = max(1_000, int(max_bytes // (3 * bytes_per_row)))
+
+    return n_partitions, chunksize
+
+
+def iter_only_new_rows(df_new: pd.DataFrame,
+                       engine: sqlalchemy.engine.base.Engine,
+                       table_name: str,
+                       table_schema: str,
+                       columns_to_compare: list[str],
+                       key_columns: list[str],
+                       timestamp_column: str = 'TIMESTAMP_LECTURA',
+                       n_partitions: int = 16,
+                       chunksize: int = 100_000,
+                       max_memory_mb: int = None,
+                       key_pushdown: str = None) -> Iterator[pd.DataFrame]:
+    """
+    Versión por partes de get_only_new_rows con memoria acotada. Los argumentos se validan al llamar a la función,
+    antes de empezar a iterar.
+
+    Lee la última versión de las filas de la tabla por lotes de chunksize filas y las reparte en particiones según un hash de
+    las columnas clave, guardándolas en disco en un directorio temporal. Luego compara df_new contra la tabla partición por
+    partición, por lo que en memoria solo hay una partición a la vez.
+
+    Las columnas clave deben formar parte de las columnas a comparar para que la comparación por partición sea equivalente
+    a la de get_only_new_rows.
+
+    Args:
+        df_new (pandas.DataFrame): DataFrame que contiene los datos nuevos a comparar.
+        engine (sqlalchemy.engine.base.Engine): El motor SQLAlchemy para la conexión a la base de datos.
+        table_name (str): Nombre de la tabla en el Data Warehouse.
+        table_schema (str): Esquema de la tabla en el Data Warehouse.
+        columns_to_compare (list[str]): Lista de columnas a utilizar para la comparación.
+        key_columns (list[str]): Lista de columnas clave que identifican las filas de forma única.
+        timestamp_column (str, opcional): Nombre de la columna con la fecha de lectura. Por defecto es 'TIMESTAMP_LECTURA'.
+        n_partitions (int, opcional): Cantidad de particiones. Por defecto es 16.
+        chunksize (int, opcional): Cantidad de filas a leer por lote de la tabla. Por defecto es 100_000.
+        max_memory_mb (int, opcional): Memoria máxima aproximada a utilizar. Si se indica, se calculan n_partitions y
+            chunksize a partir del tamaño de la tabla. En SQL Server la cantidad de filas se lee de los metadatos, en
+            otros dialectos con COUNT(*); si eso es costoso conviene indicar n_partitions. Por defecto es None.
+        key_pushdown (str, opcional): Filtro de claves a aplicar en la lectura, igual que en get_only_new_rows. Por defecto es None.
+
+    Returns:
+        Iterator[pandas.DataFrame]: Filas nuevas de cada partición, ordenadas por las columnas clave.
+
+    Raises:
+        ValueError: Si las columnas a comparar no están en df_new o las columnas clave no forman parte de las columnas a comparar.
+    """
+    if isinstance(columns_to_compare, pd.Index):
+        columns_to_compare = columns_to_compare.tolist()
+
+    if isinstance(key_columns, pd.Index):
+        key_columns = key_columns.tolist()
+
+    if not all(col in df_new.columns for col in columns_to_compare):
+        raise ValueError("Las columnas a comparar deben estar presentes en el DataFrame df_new.")
+
+    if not all(col in columns_to_compare for col in key_columns):
+        raise ValueError("Las columnas clave deben formar parte de las columnas a comparar para comparar por particiones.")
+
+    if max_memory_mb is not None:
+        n_partitions, chunksize = _estimate_partitions(df_new, engine, table_name, table_schema, columns_to_compare, max_memory_mb)
+
+    return _iter_only_new_rows(df_new, engine, table_name, table_schema, columns_to_compare, key_columns,
+                               timestamp_column, n_partitions, chunksize, key_pushdown)
+
+
+def _iter_only_new_rows(df_new: pd.DataFrame,
+                        engine: sqlalchemy.engine.base.Engine,
+                        table_name: str,
+                        table_schema: str,
+                        columns_to_compare: list[str],
+                        key_columns: list[str],
+                        timestamp_column: str,
+                        n_partitions: int,
+                        chunksize: int,
+                        key_pushdown: str) -> Iterator[pd.DataFrame]:
+    """
+    Generador de iter_only_new_rows, con los argumentos ya validados.
+    """
+    column_types = {col: df_new[col].dtype for col in columns_to_compare}
+
+    # En Pandas los valores None no pueden ser comparados, por lo que se reemplazan por NaN
+    df_new = _replace_none_with_nan(df_new)
+    df_new = df_new.sort_values(by=key_columns)
+    df_new = df_new.reset_index(drop=True)
+    new_partitions = _get_key_partitions(df_new, key_columns, n_partitions)
+
+    with tempfile.TemporaryDirectory(prefix='only_new_rows_') as spill_dir:
+        # Paso 1: Leer la tabla por lotes y repartir las filas en particiones en disco
+        n_chunks = 0
+        for key_filter, params in _build_key_filters(df_new, key_columns, key_pushdown):
+            query = _build_latest_rows_query(table_schema, table_name, columns_to_compare, key_columns, timestamp_column,
+                                             order_by_keys=False, key_filter=key_filter)
+
+            for df_chunk in pd.read_sql_query(text(query), engine, params=params, dtype=column_types, chunksize=chunksize):
+                df_chunk = _replace_none_with_nan(df_chunk)
+                chunk_partitions = _get_key_partitions(df_chunk, key_columns, n_partitions)
+
+                for partition in np.unique(chunk_partitions):
+                    df_chunk[chunk_partitions == partition].to_pickle(os.path.join(spill_dir, f'{partition}_{n_chunks}.pkl'))
+                n_chunks += 1
+
+        # Paso 2: Comparar partición por partición
+        for partition in range(n_partitions):
+            df_new_partition = df_new[new_partitions == partition]
+            if df_new_partition.empty:
+                continue
+
+            partition_files = [os.path.join(spill_dir, f'{partition}_{chunk}.pkl') for chunk in range(n_chunks)]
+            existing_parts = [pd.read_pickle(path) for path in partition_files if os.path.exists(path)]
+
+            if not existing_parts:
+                yield df_new_partition
+                continue
+
+            df_existing = pd.concat(existing_parts, ignore_index=True)
+            df_merge = pd.merge(df_new_partition.reset_index(), df_existing, on=columns_to_compare, how='left', indicator=True)
+            df_only_new = df_merge[df_merge['_merge'] == 'left_only'].drop(columns=['_merge']).set_index('index')
+            df_only_new.index.name = None
+
+            if not df_only_new.empty:
+                yield df_only_new
+
+
+@task
+def stream_only_new_rows(df_new: pd.DataFrame,
+                         engine: sqlalchemy.engine.base.Engine,
+                         table_name: str,
+                         table_schema: str,
+                         columns_to_compare: list[str],
+                         key_columns: list[str],
+                         sink: Callable[[pd.DataFrame], None],
+                         timestamp_column: str = 'TIMESTAMP_LECTURA',
+                         n_partitions: int = 16,
+                         chunksize: int = 100_000,
+                         max_memory_mb: int = None,
+                         key_pushdown: str = None) -> int:
+    """
+    Compara df_new contra la tabla con memoria acotada (ver iter_only_new_rows) y envía las filas nuevas de cada
+    partición a sink a medida que se encuentran, sin juntarlas en un único DataFrame.
+
+    Args:
+        sink (Callable[[pandas.DataFrame], None]): Función que recibe cada DataFrame de filas nuevas, por ejemplo
+            lambda df: df.to_sql(table_name, engine, schema=table_schema, if_exists='append', index=False).
+        Resto de los argumentos: Ver iter_only_new_rows. Las columnas clave deben formar parte de las columnas a comparar.
+
+    Returns:
+        int: Cantidad total de filas nuevas enviadas a sink.
+
+    Raises:
+        ValueError: Si las columnas a comparar no están en df_new o las columnas clave no forman parte de las columnas a comparar.
+    """
+    logger = logger_global.obtener_logger_prefect()
+
+    total_rows = 0
+    for df_only_new in iter_only_new_rows(df_new, engine, table_name, table_schema, columns_to_compare, key_columns,
+                                          timestamp_column, n_partitions, chunksize, max_memory_mb, key_pushdown):
+        sink(df_only_new)
+        total_rows += len(df_only_new)
+
+    logger.info("Se encontraron %s filas nuevas de %s en la tabla '%s.%s'.", total_rows, len(df_new), table_schema, table_name)
+    return total_rows
@@ -2,25 +2,111 @@
     Módulo para estandarizar los nombres de las columnas de una tabla SQL.
 """
 
+import functools
 import re
 import string
+import sys
 import unicodedata
 
-def standardize_sql_column_names(original_col_names: list, remove_punct: bool = True, remove_accents: bool = True) -> list:
+import numpy as np
+import pandas as pd
+
+# Punctuation contiene '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'
+# Extiendo la lista con otros caracteres especiales
+PUNCTUATION = string.punctuation + '¡¿' + '“”‘’' + '´¨' + '°'
+
+_PUNCTUATION_TRANSLATOR = str.maketrans(PUNCTUATION, ' ' * len(PUNCTUATION))
+_UNDERSCORES_PATTERN = re.compile(r'\_+')
+
+
+@functools.cache
+def _get_combining_translator() -> dict:
+    """
+    Tabla de traducción que elimina los caracteres combinables (acentos, diéresis, etc.) tras la normalización NFKD.
+    Se arma una sola vez, la primera vez que aparece un nombre con caracteres no ASCII.
+    """
+    return {cp: None for cp in range(sys.maxunicode + 1) if unicodedata.combining(chr(cp))}
+
+
+@functools.lru_cache(maxsize=16_384)
+def _standardize_name(name: str, remove_punct: bool, remove_accents: bool) -> str:
+    """
+    Estandariza un nombre de columna. El resultado se guarda en caché, porque los mismos encabezados se repiten
+    en todas las hojas y archivos.
+    """
+    # Eliminar saltos de linea
+    new_name = name.replace('\n', '').strip()
+    # Eliminar acentos
+    if remove_accents and not new_name.isascii():
+        new_name = unicodedata.normalize('NFKD', new_name).translate(_get_combining_translator())
+    # Convertir a mayúsculas
+    new_name = new_name.upper()
+
+    # Eliminar puntuación, por ejemplo ['.', ',', '!', '?', '-', '_', '(', ')', '[', ']', '{', '}', ':', ';']
+    if remove_punct:
+        new_name = new_name.translate(_PUNCTUATION_TRANSLATOR)
+
+    # Reemplazar espacios por guiones bajos
+    new_name = new_name.replace(' ', '_')
+
+    # Eliminar guiones bajos consecutivos
+    if new_name.endswith('_'):
+        new_name = new_name[:-1]
+    return _UNDERSCORES_PATTERN.sub('_', new_name)
+
+
+def _resolve_collisions(col_names: list[str]) -> list[str]:
+    """
+    Renombra los nombres repetidos agregando los sufijos _2, _3, etc. en orden de aparición. La primera aparición
+    conserva el nombre y no se usan sufijos que coincidan con otro nombre de la lista.
+    """
+    taken = set(col_names)
+    if len(taken) == len(col_names):
+        return col_names
+
+    seen = set()
+    next_suffix = {}
+    resolved = []
+    for name in col_names:
+        if name not in seen:
+            seen.add(name)
+            resolved.append(name)
+            continue
+
+        suffix = next_suffix.get(name, 2)
+        while f'{name}_{suffix}' in taken:
+            suffix += 1
+        new_name = f'{name}_{suffix}'
+        next_suffix[name] = suffix + 1
+        taken.add(new_name)
+        resolved.append(new_name)
+
+    return resolved
+
+
+def standardize_sql_column_names(original_col_names: list | pd.Index,
+                                 remove_punct: bool = True,
+                                 remove_accents: bool = True,
+                                 resolve_collisions: bool = True) -> list | pd.Index:
     """
     Estandariza los nombres de las columnas eliminando la puntuación, normalizando los caracteres unicode,
     convirtiéndolos a mayúsculas, reemplazando los espacios por guiones bajos y eliminando guiones bajos consecutivos.
 
+    Cada nombre distinto se estandariza una sola vez y el resultado queda en caché para las siguientes llamadas.
+
     Args:
-        original_col_names (list): Una lista de nombres de columnas originales.
+        original_col_names (list | pandas.Index): Los nombres de columnas originales, por ejemplo df.columns.
         remove_punct (bool, opcional): Bandera para indicar si se debe eliminar la puntuación. Por defecto es True.
-            Ejemplo: 
+            Ejemplo:
                 Si es True, la columna 'Producción' se estandarizará como 'PRODUCCION'.
                 Si es False, la columna 'Producción' se estandarizará como 'PRODUCCIÓN'.
+        resolve_collisions (bool, opcional): Si es True, los nombres que quedan repetidos tras estandarizar se renombran
+            con los sufijos _2, _3, etc. en orden de aparición, por ejemplo ['Año', 'ANO'] -> ['ANO', 'ANO_2'].
+            Por defecto es True.
 
     Returns:
-        list: Una lista de nombres de columnas estandarizados.
-    
+        list | pandas.Index: Los nombres de columnas estandarizados, como lista o como Index según la entrada.
+
     Ejemplo:
     ```python
         original_col_names = ['Fasón', '''Ho?a sóy
@@ -32,41 +118,23 @@ def standardize_sql_column_names(original_col_names: list, remove_punct: bool =
     ```
     """
 
-    # Punctuation contiene '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'
-    # Extiendo la lista con otros caracteres especiales
-    punctuation = string.punctuation + '¡¿' + '“”‘’' + '´¨' + '°'
-
-    translator = str.maketrans(punctuation, ' ' * len(punctuation))
-    new_col_names = []
-
     if not remove_punct:
         print('Advertencia: No se eliminó la puntuación de los nombres de las columnas. Se recomienda hacerlo para evitar problemas de codificación.')
 
     if not remove_accents:
         print('Advertencia: No se eliminaron los acentos de los nombres de las columnas. Se recomienda hacerlo para evitar problemas de codificación.')
 
-    for c in original_col_names:
-        # Eliminar saltos de linea
-        c_new = c.replace('\n', '').strip()
-        # Eliminar acentos
-        if remove_accents:
-            c_new = ''.join(char for char in unicodedata.normalize('NFKD', c_new) if not unicodedata.combining(char))
-        # Convertir a mayúsculas
-        c_new = c_new.upper()
-
-        # Eliminar puntuación, por ejemplo ['.', ',', '!', '?', '-', '_', '(', ')', '[', ']', '{', '}', ':', ';']
-        if remove_punct:
-            c_new = c_new.translate(translator)
-
-        # Reemplazar espacios por guiones bajos
-        c_new = '_'.join(c_new.split(' '))
+    # Se estandariza cada nombre distinto una sola vez y se reparte el resultado con los códigos de factorize
+    codes, uniques = pd.factorize(pd.Index(original_col_names, dtype=object), use_na_sentinel=False)
+    standardized_uniques = np.array([_standardize_name(str(name), remove_punct, remove_accents) for name in uniques],
+                                    dtype=object)
+    new_col_names = standardized_uniques[codes].tolist()
 
-        # Eliminar guiones bajos consecutivos
-        if c_new[-1] == '_':
-            c_new = c_new[:-1]
-        c_new = re.sub(r'\_+', '_', c_new)
+    if resolve_collisions:
+        new_col_names = _resolve_collisions(new_col_names)
 
-        new_col_names.append(c_new)
+    if isinstance(original_col_names, pd.Index):
+        return pd.Index(new_col_names, dtype=object, name=original_col_names.name)
 
     return new_col_names
 
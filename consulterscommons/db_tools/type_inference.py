@@ -0,0 +1,241 @@
+"""
+Módulo para inferir el tipo de SQL Server más ajustado para cada columna de un DataFrame.
+
+A diferencia del mapeo fijo de get_columns_to_add (INTEGER, FLOAT, DATETIME o NVARCHAR(MAX)) se miran los datos:
+rango de los enteros, decimales de los números, si las fechas tienen hora y el largo máximo de los textos.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# Largos de NVARCHAR a los que se redondea el largo inferido, por encima del último se usa NVARCHAR(MAX)
+NVARCHAR_LENGTHS = [16, 32, 64, 128, 255, 500, 1000, 2000, 4000]
+
+# Escala máxima a probar para los DECIMAL y precisión máxima admitida por SQL Server
+MAX_DECIMAL_SCALE = 6
+MAX_DECIMAL_PRECISION = 38
+
+
+def _infer_integer_type(values: pd.Series) -> str | None:
+    """
+    Devuelve None si los valores no entran en DECIMAL(38,0). Admite columnas object con enteros de Python fuera del rango
+    de int64, que se mapean a DECIMAL(p,0).
+    """
+    if values.empty:
+        return 'INT'
+
+    min_value, max_value = int(values.min()), int(values.max())
+
+    if min_value >= 0 and max_value <= 255:
+        return 'TINYINT'
+    if min_value >= -2**15 and max_value < 2**15:
+        return 'SMALLINT'
+    if min_value >= -2**31 and max_value < 2**31:
+        return 'INT'
+    if min_value >= -2**63 and max_value < 2**63:
+        return 'BIGINT'
+
+    precision = len(str(max(abs(min_value), abs(max_value))))
+    return f'DECIMAL({precision},0)' if precision <= MAX_DECIMAL_PRECISION else None
+
+
+def _get_decimal_type(max_abs: float, scale: int) -> str:
+    integer_digits = len(str(int(max_abs))) if max_abs >= 1 else 1
+    precision = integer_digits + scale
+    if precision > MAX_DECIMAL_PRECISION:
+        return 'FLOAT'
+    return f'DECIMAL({precision},{scale})'
+
+
+def _infer_float_type(values: pd.Series) -> str:
+    values = values.astype('float64').to_numpy()
+    values = values[np.isfinite(values)]
+
+    if values.size == 0:
+        return 'FLOAT'
+
+    # Busca la menor escala con la que todos los valores se recuperan exactamente al redondear. La comparación es exacta
+    # (sin tolerancia absoluta) para no truncar decimales, por ejemplo 3.0000005 no entra en ninguna escala hasta 6
+    for scale in range(MAX_DECIMAL_SCALE + 1):
+        if (np.round(values * 10**scale) / 10**scale == values).all():
+            return _get_decimal_type(np.abs(values).max(), scale)
+
+    return 'FLOAT'
+
+
+def _infer_decimal_type(values: pd.Series) -> str:
+    """
+    Calcula DECIMAL(p,s) a partir de los exponentes de los valores Decimal, sin pasar por float.
+    """
+    values = [value for value in values if value.is_finite()]
+
+    if not values:
+        return 'FLOAT'
+
+    scale = max(max(-value.normalize().as_tuple().exponent, 0) for value in values)
+    if scale > MAX_DECIMAL_SCALE:
+        return 'FLOAT'
+    return _get_decimal_type(max(abs(value) for value in values), scale)
+
+
+def _infer_datetime_type(values: pd.Series) -> str:
+    values = pd.to_datetime(values, errors='coerce').dropna()
+
+    if not values.empty and (values == values.dt.normalize()).all():
+        return 'DATE'
+    return 'DATETIME2'
+
+
+def _infer_string_type(values: pd.Series, headroom: float) -> str:
+    if values.empty:
+        return f'NVARCHAR({NVARCHAR_LENGTHS[4]})'
+
+    max_length = int(values.astype(str).str.len().max())
+    target_length = math.ceil(max_length * headroom)
+
+    for length in NVARCHAR_LENGTHS:
+        if target_length <= length:
+            return f'NVARCHAR({length})'
+    return 'NVARCHAR(MAX)'
+
+
+def _infer_type_family(values: pd.Series) -> str:
+    """
+    Clasifica los valores (sin nulos) en 'bit', 'integer', 'float', 'datetime' o 'string'.
+    """
+    # En las columnas object se infiere el tipo de los valores
+    if pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype):
+        inferred = pd.api.types.infer_dtype(values, skipna=True)
+        if inferred == 'boolean':
+            return 'bit'
+        if inferred == 'integer':
+            return 'integer'
+        if inferred in ('floating', 'mixed-integer-float', 'decimal'):
+            return 'float'
+        if inferred in ('datetime', 'datetime64', 'date'):
+            return 'datetime'
+        return 'string'
+
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return 'bit'
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return 'integer'
+    if pd.api.types.is_float_dtype(values.dtype):
+        return 'float'
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return 'datetime'
+    return 'string'
+
+
+def _infer_sized_type(family: str, values: pd.Series, headroom: float) -> str | None:
+    """
+    Calcula el tipo de SQL Server de la familia indicada (rango, precisión, escala o largo) sobre los valores sin nulos.
+    Devuelve None si algún valor no corresponde a la familia, por ejemplo si la familia se eligió con una muestra.
+    """
+    if family == 'bit':
+        if pd.api.types.is_bool_dtype(values.dtype) or pd.api.types.infer_dtype(values, skipna=True) in ('boolean', 'empty'):
+            return 'BIT'
+        return None
+
+    # En las columnas object se infiere el tipo de los valores una sola vez
+    inferred = pd.api.types.infer_dtype(values, skipna=True) if pd.api.types.is_object_dtype(values.dtype) else None
+
+    if family == 'integer' and inferred == 'integer':
+        # Se usan los enteros de Python tal cual: pueden superar el rango de int64
+        return _infer_integer_type(values)
+
+    if family == 'float' and inferred == 'decimal':
+        return _infer_decimal_type(values)
+
+    if family in ('integer', 'float'):
+        numeric = values if pd.api.types.is_numeric_dtype(values.dtype) else pd.to_numeric(values, errors='coerce')
+        if numeric.isna().any():
+            return None
+        if family == 'float':
+            # Los enteros con nulos llegan como float64 (pandas, Excel): si todos los valores son enteros se usa el
+            # tipo entero según el rango, igual que con Int64
+            if not numeric.empty and np.isfinite(numeric).all() and (numeric == np.floor(numeric)).all():
+                integer_type = _infer_integer_type(numeric)
+                if integer_type is not None:
+                    return integer_type
+            return _infer_float_type(numeric)
+        if pd.api.types.is_float_dtype(numeric.dtype) and not (numeric == np.floor(numeric)).all():
+            return None
+        return _infer_integer_type(numeric.astype('int64'))
+
+    if family == 'datetime':
+        if pd.to_datetime(values, errors='coerce').isna().any():
+            return None
+        return _infer_datetime_type(values)
+
+    return _infer_string_type(values, headroom)
+
+
+def infer_sql_column_type(series: pd.Series, headroom: float = 1.5, sample: pd.Series = None) -> str:
+    """
+    Infiere el tipo de SQL Server más ajustado para una columna.
+
+    Args:
+        series (pandas.Series): La columna con los datos.
+        headroom (float, opcional): Margen que se aplica al largo máximo de los textos. Por defecto es 1.5.
+        sample (pandas.Series, opcional): Muestra de la columna con la que se decide la familia del tipo (entero, decimal,
+            fecha, texto o BIT). Solo ahorra esa decisión: el rango, la precisión, la escala y el largo siempre se
+            calculan sobre la columna completa, para que ningún valor fuera de la muestra quede truncado, y si algún
+            valor no corresponde a la familia se vuelve a inferir con la columna completa. Por defecto es None y se usa
+            la columna completa.
+
+    Returns:
+        str: El tipo de SQL Server, por ejemplo 'SMALLINT', 'DECIMAL(10,2)', 'DATE' o 'NVARCHAR(64)'.
+    """
+    values = series.dropna()
+
+    if sample is not None:
+        sized_type = _infer_sized_type(_infer_type_family(sample.dropna()), values, headroom)
+        if sized_type is not None:
+            return sized_type
+
+    return _infer_sized_type(_infer_type_family(values), values, headroom) or _infer_string_type(values, headroom)
+
+
+def infer_sql_column_types(df: pd.DataFrame,
+                           sample_size: int = None,
+                           type_overrides: dict = None,
+                           headroom: float = 1.5) -> dict:
+    """
+    Infiere el tipo de SQL Server más ajustado para cada columna del DataFrame.
+
+    Los enteros (incluidas las columnas float64 cuyos valores son todos enteros, como los enteros con nulos) se mapean
+    a TINYINT/SMALLINT/INT/BIGINT según su rango, los números con decimales a DECIMAL(p,s)
+    (o FLOAT si no alcanza la precisión), las fechas a DATE si no tienen hora o DATETIME2 si la tienen,
+    los booleanos a BIT y los textos a NVARCHAR(n) según su largo máximo más un margen.
+
+    Args:
+        df (pandas.DataFrame): El DataFrame con los datos.
+        sample_size (int, opcional): Si se indica y el DataFrame tiene más filas, la familia de cada tipo se decide con una
+            muestra de ese tamaño. El rango de los enteros, la precisión y escala de los DECIMAL y el largo de los textos
+            siempre se calculan sobre todos los datos (para no truncar valores fuera de la muestra), por lo que la
+            muestra solo ahorra la clasificación de las columnas object y el tiempo total sigue creciendo con la
+            cantidad de filas. Por defecto es None.
+        type_overrides (dict, opcional): Tipos a usar para columnas específicas en lugar del inferido. Por defecto es None.
+        headroom (float, opcional): Margen que se aplica al largo máximo de los textos. Por defecto es 1.5.
+
+    Returns:
+        dict: Un diccionario con los nombres de las columnas como claves y sus tipos de SQL Server como valores.
+    """
+    type_overrides = type_overrides or {}
+
+    df_sample = df
+    if sample_size is not None and len(df) > sample_size:
+        df_sample = df.sample(n=sample_size, random_state=0)
+
+    column_types = {}
+    for column in df.columns:
+        if column in type_overrides:
+            column_types[column] = type_overrides[column]
+        else:
+            sample = df_sample[column] if df_sample is not df else None
+            column_types[column] = infer_sql_column_type(df[column], headroom, sample)
+
+    return column_types
@@ -15,9 +15,8 @@ from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 
 from prefect import task
-from prefect.blocks.system import Secret
-from prefect.variables import Variable
 
+from consulterscommons.credential_tools import get_prefect_secret, get_prefect_variable, invalidate_credentials
 from consulterscommons.log_tools.prefect_log_config import PrefectLogger
 
 
@@ -62,11 +61,11 @@ def send_email(mail_to: Union[str, list[str]], subject: str, body: str, attachme
         mail_to = ", ".join(mail_to)
 
     # Configurar el mensaje de correo
-    mail_username = Variable.get('alertas_email')
-    mail_server = Variable.get('alertas_email_sv')
+    # Se leen a través de la caché de credenciales para no consultar la API de Prefect en cada correo
+    mail_username = get_prefect_variable('alertas_email')
+    mail_server = get_prefect_variable('alertas_email_sv')
     mail_port = 587  # Esto esta hardcodeado pero se puede implementar como una variable en caso que cambie
-    secret_block_alertas = Secret.load("alertas-email-pass")
-    mail_password = secret_block_alertas.get()
+    mail_password = get_prefect_secret("alertas-email-pass")
 
     mimemsg = MIMEMultipart()
     mimemsg['From'] = mail_username
@@ -97,5 +96,11 @@ def send_email(mail_to: Union[str, list[str]], subject: str, body: str, attachme
         logger.info("Destinatario: %s", mail_to)
     except email.errors.MessageError as error_email:
         logger.error("Error en estructura del correo: %s", error_email)
+    except smtplib.SMTPAuthenticationError as error_auth:
+        logger.error("Error de autenticación al enviar el correo: %s", error_auth)
+        # El servidor, el usuario o la contraseña pudieron haber cambiado: el próximo envío los vuelve a leer de Prefect
+        invalidate_credentials('prefect_variable', 'alertas_email')
+        invalidate_credentials('prefect_variable', 'alertas_email_sv')
+        invalidate_credentials('prefect_secret', 'alertas-email-pass')
     except smtplib.SMTPException as error_smpt:
         logger.error("Error al enviar el correo: %s", error_smpt)
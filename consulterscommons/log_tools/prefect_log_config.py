@@ -53,6 +53,9 @@ class PrefectLogger(object):
     - obtener_logger_prefect(self):
         - Obtiene el logger de Prefect.
     
+    - obtener_logger(self):
+        - Obtiene el logger de Prefect, o un logger estándar si no se está dentro de un flujo o tarea.
+    
     - cambiar_rotfile_handler_params(self, log_path: str = None, when: str = DEFAULT_WHEN, interval: int = DEFAULT_INTERVAL, backup_count: int = DEFAULT_BACKUP_COUNT):
         - Cambia los parámetros del manejador de archivos rotativos.
 
@@ -179,6 +182,19 @@ class PrefectLogger(object):
         else:
             raise ValueError("No se pudo obtener el nombre del flujo o tarea. Verifique que se esta intentando obtener el logger desde un flujo o tarea de Prefect.")
 
+    def obtener_logger(self):
+        """
+        Obtiene el logger de Prefect, o un logger estándar con el nombre del script si no se está dentro de un flujo o
+        tarea (por ejemplo, desde hilos de un pool o listeners de SQLAlchemy).
+
+        Retorna:
+            prefect_logger | logging.Logger: El logger de Prefect o el logger estándar.
+        """
+        try:
+            return self.obtener_logger_prefect()
+        except Exception:  # pylint: disable=broad-except
+            return logging.getLogger(self.script_name)
+
     def cambiar_rotfile_handler_params(self, log_path: str = DEFAULT_LOG_PATH,
                                     when: str = DEFAULT_WHEN,
                                     interval: int = DEFAULT_INTERVAL,
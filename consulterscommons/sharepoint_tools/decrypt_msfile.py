@@ -2,23 +2,94 @@
 Modulo para desencriptar archivos de Microsoft Office.
 """
 
+import io
 import os
-import shutil
-import msoffcrypto
+import tempfile
+from typing import IO
 
+import msoffcrypto
 
-def decrypt_msfile(file_path: str, decrypt_password: str):
-    file_name = os.path.basename(file_path)
-    directory = os.path.dirname(file_path)
+DECRYPT_MODES = ('path', 'tempfile', 'memory')
 
-    # Copiar para desencriptar el archivo nuevo
-    aux_path = os.path.join(directory, 'decrypt_' + file_name)
-    shutil.copy(file_path, aux_path)
 
-    # Desencripta el archivo nuevo
-    with open(file_path, "rb") as fp_read, open(aux_path, "wb") as fp_write:
+def _decrypt_to_path(file_path: str, decrypt_password: str, output_path: str) -> str:
+    """
+    Desencripta el archivo en un temporal de la carpeta de output_path y lo mueve a output_path al terminar. Si falla (por
+    ejemplo, por una contraseña incorrecta) solo se borra el temporal: un archivo existente en output_path no se toca.
+    """
+    with open(file_path, "rb") as fp_read:
         msf = msoffcrypto.OfficeFile(fp_read)
         msf.load_key(password=decrypt_password)
-        msf.decrypt(fp_write)
 
-    return aux_path
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), prefix='decrypt_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, "wb") as fp_write:
+                msf.decrypt(fp_write)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return output_path
+
+
+def decrypt_msfile(file_path: str,
+                   decrypt_password: str,
+                   mode: str = 'path',
+                   buffer: IO[bytes] = None) -> str | IO[bytes]:
+    """
+    Desencripta un archivo de Microsoft Office protegido con contraseña.
+
+    Args:
+        file_path (str): Ruta del archivo encriptado.
+        decrypt_password (str): Contraseña del archivo.
+        mode (str, opcional): Dónde se escribe el archivo desencriptado. Por defecto es 'path'.
+            - 'path': En 'decrypt_<nombre>' junto al archivo original. Devuelve la ruta.
+            - 'tempfile': En un archivo temporal del directorio temporal del sistema, para no dejar datos desencriptados en
+                unidades compartidas. Devuelve la ruta y quien llama debe borrarlo.
+            - 'memory': En memoria, sin escribir a disco. Devuelve el buffer posicionado al inicio, que se puede pasar
+                directamente a pd.read_excel.
+        buffer (IO[bytes], opcional): Buffer binario donde escribir en modo 'memory'. Si se indica, el modo es 'memory'.
+            Por defecto se crea un io.BytesIO.
+
+    Returns:
+        str | IO[bytes]: La ruta del archivo desencriptado, o el buffer en modo 'memory'.
+
+    Raises:
+        ValueError: Se produce si el modo no es válido.
+        msoffcrypto.exceptions.InvalidKeyError: Se produce si la contraseña es incorrecta.
+    """
+    if buffer is not None:
+        mode = 'memory'
+
+    if mode not in DECRYPT_MODES:
+        raise ValueError(f"mode debe ser uno de {DECRYPT_MODES}.")
+
+    if mode == 'memory':
+        if buffer is None:
+            buffer = io.BytesIO()
+
+        start = buffer.tell() if buffer.seekable() else None
+        with open(file_path, "rb") as fp_read:
+            msf = msoffcrypto.OfficeFile(fp_read)
+            msf.load_key(password=decrypt_password)
+            msf.decrypt(buffer)
+
+        if start is not None:
+            buffer.seek(start)
+        return buffer
+
+    file_name = os.path.basename(file_path)
+
+    if mode == 'path':
+        # El archivo desencriptado se escribe una sola vez, sin copiar antes el archivo encriptado
+        return _decrypt_to_path(file_path, decrypt_password, os.path.join(os.path.dirname(file_path), 'decrypt_' + file_name))
+
+    fd, output_path = tempfile.mkstemp(prefix='decrypt_', suffix=os.path.splitext(file_name)[1])
+    os.close(fd)
+    try:
+        return _decrypt_to_path(file_path, decrypt_password, output_path)
+    except BaseException:
+        # El archivo temporal lo creó esta función, por lo que se borra si la desencriptación falla
+        os.remove(output_path)
+        raise
@@ -27,7 +27,12 @@ setup(
         'prefect',
         'sqlalchemy',
     ], # Dependencias de terceros
-    # extras_require={
-    #     'dev': extra_dev,
-    # } # Dependencias opcionales
+    extras_require={
+        # 'dev': extra_dev,
+        # db_tools.async_utils: greenlet lo requiere la extensión asyncio de SQLAlchemy y no siempre se instala con ella
+        # (aiosqlite para probar localmente con SQLite)
+        'async': ['aioodbc', 'aiosqlite', 'greenlet'],
+        'arrow': ['pyarrow>=14'],  # db_tools.columnar_fetch y db_tools.snapshot_cache (concat_tables con promote_options)
+        'excel': ['openpyxl'],  # data_tools.ingestion (lectura por lotes de archivos .xlsx)
+    }, # Dependencias opcionales
 )
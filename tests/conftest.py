@@ -0,0 +1,50 @@
+import logging
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from consulterscommons.log_tools import PrefectLogger
+
+
+@pytest.fixture(autouse=True)
+def prefect_logger(monkeypatch):
+    """Fuera de un flujo de Prefect las funciones registran en un logger estándar."""
+    monkeypatch.setattr(PrefectLogger, 'obtener_logger_prefect', lambda self: logging.getLogger('consulterscommons.tests'))
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    """Base SQLite con la tabla T: dos versiones (TIMESTAMP_LECTURA 1 y 2) de las claves 0 a 49."""
+    path = tmp_path / 'dw.db'
+    engine = create_engine(f'sqlite:///{path}')
+
+    rows = []
+    for key in range(50):
+        for timestamp in (1, 2):
+            rows.append({'K': key,
+                         'A': float(key * timestamp) if key % 7 else None,
+                         'B': f's{key}' if key % 5 else None,
+                         'TIMESTAMP_LECTURA': timestamp})
+    pd.DataFrame(rows).to_sql('T', engine, index=False)
+    engine.dispose()
+
+    return path
+
+
+@pytest.fixture
+def engine(sqlite_path):
+    engine = create_engine(f'sqlite:///{sqlite_path}')
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def df_new():
+    """Claves 40 a 59: 40 a 49 ya existen (dos de ellas con cambios) y 50 a 59 son nuevas."""
+    rows = []
+    for key in range(40, 60):
+        rows.append({'K': key, 'A': float(key * 2) if key % 7 else None, 'B': f's{key}' if key % 5 else None})
+    rows[3]['A'] = 999.0
+    rows[5]['B'] = None
+    return pd.DataFrame(rows)
@@ -0,0 +1,77 @@
+import keyring
+import pytest
+from keyring.credentials import SimpleCredential
+
+from consulterscommons.credential_tools import (
+    CredentialCache,
+    credential_cache,
+    get_credential_cache,
+    get_keyring_credential,
+    invalidate_credentials,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado para time.monotonic."""
+    now = [1000.0]
+    monkeypatch.setattr(credential_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    get_credential_cache().invalidate()
+    yield
+    get_credential_cache().invalidate()
+
+
+def test_values_expire_after_the_ttl(clock):
+    cache = CredentialCache(ttl_seconds=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return f'valor {len(calls)}'
+
+    assert cache.get('clave', loader) == 'valor 1'
+    clock[0] += 59
+    assert cache.get('clave', loader) == 'valor 1'
+    clock[0] += 2
+    assert cache.get('clave', loader) == 'valor 2'
+    assert cache.get('otra', loader, ttl_seconds=0) == 'valor 3'
+    assert len(cache) == 1
+
+
+def test_none_and_errors_are_not_cached():
+    cache = CredentialCache()
+    values = [None, 'valor']
+
+    assert cache.get('clave', lambda: values.pop(0)) is None
+    assert cache.get('clave', lambda: values.pop(0)) == 'valor'
+
+    def failing_loader():
+        raise RuntimeError('sin acceso')
+
+    with pytest.raises(RuntimeError):
+        cache.get('error', failing_loader)
+    assert cache.get('error', lambda: 'ok') == 'ok'
+
+
+def test_invalidate_credentials_forces_a_new_keyring_lookup(monkeypatch):
+    passwords = ['vieja', 'nueva']
+    monkeypatch.setattr(keyring, 'get_credential',
+                        lambda service, username: SimpleCredential(username, passwords[0]))
+
+    assert get_keyring_credential('srv', 'etl').password == 'vieja'
+    passwords.pop(0)
+    assert get_keyring_credential('srv', 'etl').password == 'vieja'
+
+    invalidate_credentials('keyring', 'srv', 'otro')
+    assert get_keyring_credential('srv', 'etl').password == 'vieja'
+
+    invalidate_credentials('keyring', 'srv', 'etl')
+    assert get_keyring_credential('srv', 'etl').password == 'nueva'
+
+    with pytest.raises(ValueError):
+        invalidate_credentials('smtp')
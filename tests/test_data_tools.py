@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+
+from consulterscommons.data_tools import (
+    MAX_EXCEL_COLUMN,
+    excel_column_name,
+    excel_column_names,
+    excel_column_number,
+    excel_column_numbers,
+    excel_range_bounds,
+    expand_excel_range,
+    iter_csv_chunks,
+    iter_excel_chunks,
+    iter_file_chunks,
+    split_cell_references,
+)
+
+
+def test_bulk_column_conversions_match_the_scalar_ones():
+    numbers = np.array([1, 26, 27, 52, 702, 703, MAX_EXCEL_COLUMN, MAX_EXCEL_COLUMN + 1])
+    names = [excel_column_name(int(n)) for n in numbers]
+
+    assert names[:6] == ['A', 'Z', 'AA', 'AZ', 'ZZ', 'AAA']
+    assert names[6] == 'XFD'
+    assert excel_column_names(numbers).tolist() == names
+    assert excel_column_numbers(names).tolist() == numbers.tolist()
+    assert excel_column_numbers(['a', 'Xfd', 'AbCd']).tolist() == [1, MAX_EXCEL_COLUMN, excel_column_number('ABCD')]
+    assert excel_column_names(np.array([[1, 2], [3, 4]])).shape == (2, 2)
+
+
+@pytest.mark.parametrize('names', [['A', 'A1'], ['A', ''], ['A B'], [None]])
+def test_invalid_column_names_raise(names):
+    with pytest.raises(ValueError):
+        excel_column_numbers(names)
+
+
+def test_invalid_column_numbers_raise():
+    with pytest.raises(ValueError):
+        excel_column_names([1, 0])
+    with pytest.raises(TypeError):
+        excel_column_names([1.5])
+
+
+def test_cell_references_and_ranges():
+    columns, rows = split_cell_references(['B2', '$AZ$10'])
+    assert columns.tolist() == [2, 52] and rows.tolist() == [2, 10]
+
+    assert excel_range_bounds('B2:AZ5000') == (2, 2, 52, 5000)
+    assert excel_range_bounds('C3') == (3, 3, 3, 3)
+    assert excel_range_bounds('C5:A1') == (1, 1, 3, 5)
+    assert expand_excel_range('A1:B2').tolist() == [['A1', 'B1'], ['A2', 'B2']]
+
+    for invalid in ('A0', 'XFE1', 'A1048577', 'A1:B2:C3'):
+        with pytest.raises(ValueError):
+            excel_range_bounds(invalid)
+
+
+def test_csv_chunks_standardize_headers_and_apply_types(tmp_path):
+    path = tmp_path / 'datos.csv'
+    pd.DataFrame({'Año': range(10), 'Descripción': [f'd{i}' for i in range(10)]}).to_csv(path, index=False)
+
+    chunks = list(iter_csv_chunks(str(path), chunksize=4, column_types={'ANO': sqlalchemy.types.Float()}))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert all(list(chunk.columns) == ['ANO', 'DESCRIPCION'] for chunk in chunks)
+    assert all(chunk['ANO'].dtype == 'float64' for chunk in chunks)
+    assert pd.concat(chunks)['ANO'].tolist() == [float(i) for i in range(10)]
+
+
+def _write_sheet(path, rows):
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+
+
+def test_excel_chunks_skip_blank_rows_and_read_ranges(tmp_path):
+    path = str(tmp_path / 'datos.xlsx')
+    _write_sheet(path, [['Código', 'Valor'], *[[f'c{i}', i] for i in range(5)], [None, None], ['c5', 5]])
+
+    chunks = list(iter_file_chunks(path, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2]
+    assert list(chunks[0].columns) == ['CODIGO', 'VALOR']
+    assert pd.concat(chunks)['VALOR'].tolist() == list(range(6))
+
+    df = pd.concat(iter_excel_chunks(path, cell_range='B1:B3', standardize_columns=False))
+    assert df.to_dict('list') == {'Valor': [0, 1]}
+
+
+def test_excel_chunks_add_unnamed_columns_only_in_the_first_chunk(tmp_path):
+    path = str(tmp_path / 'datos.xlsx')
+    _write_sheet(path, [['A'], [1], [2, 'x']])
+    df = pd.concat(iter_excel_chunks(path, chunksize=10, standardize_columns=False))
+    assert list(df.columns) == ['A', 'Unnamed: 1']
+    assert pd.isna(df['Unnamed: 1'].iloc[0]) and df['Unnamed: 1'].iloc[1] == 'x'
+
+    with pytest.raises(ValueError, match='encabezado'):
+        list(iter_excel_chunks(path, chunksize=1))
+
+
+def test_file_chunks_reject_unknown_extensions(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_file_chunks(str(tmp_path / 'datos.parquet')))
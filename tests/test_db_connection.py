@@ -0,0 +1,114 @@
+import pytest
+
+pyodbc = pytest.importorskip('pyodbc', exc_type=ImportError)
+
+import keyring
+from keyring.credentials import SimpleCredential
+
+from consulterscommons.credential_tools import get_credential_cache
+from consulterscommons.db_tools.db_connection import (
+    close_sql_server_pools,
+    connect_sql_server,
+    get_sql_server_pool,
+    is_login_error,
+    is_transient_error,
+)
+
+LOGIN_FAILED = pyodbc.InterfaceError('28000', "[28000] Login failed for user 'etl'. (18456) (SQLDriverConnect)")
+DEADLOCK = pyodbc.OperationalError('40001', '[40001] Transaction was deadlocked (1205) (SQLExecDirectW)')
+
+
+class FakeConnection:
+    autocommit = False
+
+    def __init__(self, connection_string):
+        self.connection_string = connection_string
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    close_sql_server_pools()
+    get_credential_cache().invalidate()
+    yield
+    close_sql_server_pools()
+    get_credential_cache().invalidate()
+
+
+@pytest.fixture
+def passwords(monkeypatch):
+    """Contraseñas que devuelve el Credential Manager, en orden: la primera se usa hasta que se quita de la lista."""
+    values = ['old-password', 'new-password']
+    monkeypatch.setattr(keyring, 'get_credential', lambda service, username: SimpleCredential(username, values[0]))
+    return values
+
+
+def test_error_classification():
+    assert is_transient_error(DEADLOCK)
+    assert not is_transient_error(LOGIN_FAILED)
+    assert is_login_error(LOGIN_FAILED)
+    assert is_login_error(pyodbc.Error('42000', "Login failed for user 'etl'. (18456)"))
+    assert not is_login_error(DEADLOCK)
+    assert not is_login_error(ValueError('28000'))
+
+
+def test_pool_registry_key_includes_password_and_options():
+    pool = get_sql_server_pool('srv', 'db', 'etl', 'secret', driver='Driver', pool_size=2)
+
+    assert get_sql_server_pool('srv', 'db', 'etl', 'secret', driver='Driver', pool_size=2) is pool
+    assert get_sql_server_pool('srv', 'db', 'etl', 'other', driver='Driver', pool_size=2) is not pool
+    assert get_sql_server_pool('srv', 'db', 'etl', 'secret', driver='Driver', pool_size=3) is not pool
+    assert get_sql_server_pool('srv', 'db', 'etl', 'secret', driver='Other', pool_size=2) is not pool
+
+
+def test_run_retries_transient_errors(monkeypatch):
+    pool = get_sql_server_pool('srv', 'db', 'etl', 'secret', driver='Driver', backoff_base=0)
+    monkeypatch.setattr(pyodbc, 'connect', lambda connection_string, timeout: FakeConnection(connection_string))
+    errors = [DEADLOCK, DEADLOCK]
+
+    def fn(connection):
+        if errors:
+            raise errors.pop()
+        return 'ok'
+
+    assert pool.run(fn) == 'ok'
+    assert not errors
+
+
+def test_login_failure_evicts_the_pool_and_rereads_credentials(monkeypatch, passwords):
+    pool = get_sql_server_pool('srv', 'db', 'etl', driver='Driver')
+
+    def connect(connection_string, timeout):
+        if 'PWD=old-password' in connection_string:
+            raise LOGIN_FAILED
+        return FakeConnection(connection_string)
+
+    monkeypatch.setattr(pyodbc, 'connect', connect)
+    passwords.pop(0)  # Se rota la contraseña en el Credential Manager
+
+    with pytest.raises(pyodbc.Error):
+        pool.acquire()
+
+    new_pool = get_sql_server_pool('srv', 'db', 'etl', driver='Driver')
+    assert new_pool is not pool
+    assert 'PWD=new-password' in new_pool.acquire().connection_string
+
+
+def test_connect_sql_server_times_out_when_the_pool_is_exhausted(monkeypatch):
+    monkeypatch.setattr(pyodbc, 'connect', lambda connection_string, timeout: FakeConnection(connection_string))
+    pool = get_sql_server_pool('srv', 'db', 'etl', 'secret', driver='Driver')
+    connections = [pool.acquire() for _ in range(pool.pool_size)]
+
+    with pytest.raises(TimeoutError):
+        connect_sql_server.fn('srv', 'db', 'etl', 'secret', use_pool=True, driver='Driver', pool_timeout=0.05)
+
+    pool.release(connections.pop())
+    assert connect_sql_server.fn('srv', 'db', 'etl', 'secret', use_pool=True, driver='Driver', pool_timeout=0.05)
@@ -0,0 +1,552 @@
+import asyncio
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import keyring
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+from keyring.credentials import SimpleCredential
+from sqlalchemy import text
+from sqlalchemy.dialects import mssql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from consulterscommons.credential_tools import get_credential_cache
+from consulterscommons.db_tools import (
+    ColumnConversionPlan,
+    QueryProfiler,
+    SchemaCache,
+    async_bulk_insert_dataframe,
+    async_get_only_new_rows,
+    bulk_insert_dataframe,
+    compute_row_hash,
+    convert_dataframe_column_types,
+    dispose_sqlalchemy_engines,
+    get_only_new_rows,
+    get_schema_cache,
+    get_sqlalchemy_engine,
+    infer_sql_column_types,
+    iter_only_new_rows,
+    read_sql_columnar,
+    read_sql_partitioned,
+    standardize_sql_column_names,
+    stream_only_new_rows,
+)
+from consulterscommons.db_tools import bulk_writer, schema_cache, sqlalchemy_utils
+from consulterscommons.db_tools.bulk_writer import _build_upsert_statements
+from consulterscommons.db_tools.parallel_reader import _get_range_bounds
+from consulterscommons.db_tools.sqlalchemy_utils import _build_key_filters, _build_latest_rows_query, _create_staging_table
+from consulterscommons.db_tools.type_inference import infer_sql_column_type
+
+COLUMNS = ['K', 'A', 'B']
+NEW_KEYS = [43, *range(50, 60)]
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values('K').reset_index(drop=True)
+
+
+def _read_table(engine, table_name: str = 'T') -> pd.DataFrame:
+    return pd.read_sql_query(f'SELECT * FROM {table_name} ORDER BY K, TIMESTAMP_LECTURA', engine)
+
+
+def _fetch_rows(engine, query: str) -> list[tuple]:
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(query))]
+
+
+@pytest.mark.parametrize('compare_mode', ['merge', 'hash', 'staging'])
+@pytest.mark.parametrize('key_pushdown', [None, 'in', 'range'])
+def test_compare_modes_return_the_same_rows(engine, df_new, compare_mode, key_pushdown):
+    expected = get_only_new_rows.fn(df_new, engine, 'T', 'main', COLUMNS, ['K'])
+
+    result = get_only_new_rows.fn(df_new, engine, 'T', 'main', COLUMNS, ['K'],
+                                  compare_mode=compare_mode, key_pushdown=key_pushdown)
+
+    assert sorted(expected['K']) == NEW_KEYS
+    pd.testing.assert_frame_equal(_sorted(result), _sorted(expected))
+
+
+@pytest.mark.parametrize('key_columns', [['K'], ['K', 'J']])
+def test_in_pushdown_respects_the_mssql_parameter_limit(key_columns):
+    df = pd.DataFrame({'K': range(1500), 'J': range(1500)})
+    dialect = mssql.pyodbc.dialect(paramstyle='qmark')
+
+    key_filters = _build_key_filters(df, key_columns, 'in')
+
+    assert sum(len(params) for _, params in key_filters) == len(df) * len(key_columns)
+    for key_filter, params in key_filters:
+        query = _build_latest_rows_query('dbo', 'T', ['K', 'A'], key_columns, 'TIMESTAMP_LECTURA', key_filter=key_filter)
+        compiled = text(query).bindparams(**params).compile(dialect=dialect)
+        assert len(compiled.positiontup) <= 2100
+
+
+def test_hash_mode_with_stored_hash_column(engine, df_new):
+    existing = pd.read_sql_query('SELECT * FROM T', engine)
+    existing['HASH'] = compute_row_hash(existing, COLUMNS)
+    existing.to_sql('T_HASH', engine, index=False)
+
+    result = get_only_new_rows.fn(df_new, engine, 'T_HASH', 'main', COLUMNS, ['K'],
+                                  compare_mode='hash', hash_column='HASH')
+
+    assert sorted(result['K']) == NEW_KEYS
+
+
+def test_bulk_insert_appends_in_batches(engine, df_new):
+    df = df_new.assign(TIMESTAMP_LECTURA=3)
+
+    stats = bulk_insert_dataframe.fn(df, engine, 'T', 'main', chunksize=7)
+
+    assert stats['rows'] == len(df)
+    assert len(_read_table(engine)) == 100 + len(df)
+
+
+def test_bulk_upsert_updates_and_inserts(engine):
+    pd.DataFrame({'K': [1, 2, 3], 'V': ['a', 'b', None]}).to_sql('U', engine, index=False)
+
+    bulk_insert_dataframe.fn(pd.DataFrame({'K': [2, 3, 4], 'V': ['x', None, 'z']}), engine, 'U', 'main',
+                             key_columns=['K'], chunksize=2)
+
+    assert _fetch_rows(engine, 'SELECT K, V FROM U ORDER BY K') == [(1, 'a'), (2, 'x'), (3, None), (4, 'z')]
+
+
+def test_bulk_upsert_rejects_duplicate_keys(engine):
+    pd.DataFrame({'K': [1], 'V': ['a']}).to_sql('U', engine, index=False)
+    df = pd.DataFrame({'K': [1, 2, 1], 'V': ['x', 'y', 'z']})
+
+    with pytest.raises(ValueError, match='clave repetidas'):
+        bulk_insert_dataframe.fn(df, engine, 'U', 'main', key_columns=['K'])
+
+    assert _fetch_rows(engine, 'SELECT K, V FROM U') == [(1, 'a')]
+
+
+def test_bulk_upsert_dry_run_does_not_write(engine):
+    pd.DataFrame({'K': [1], 'V': ['a']}).to_sql('U', engine, index=False)
+
+    stats = bulk_insert_dataframe.fn(pd.DataFrame({'K': [1, 2], 'V': ['x', 'y']}), engine, 'U', 'main',
+                                     key_columns=['K'], dry_run=True)
+
+    assert stats['rows'] == 2
+    assert stats['dry_run']
+    assert _fetch_rows(engine, 'SELECT K, V FROM U') == [(1, 'a')]
+
+
+def test_mssql_upsert_is_a_single_merge():
+    class Connection:
+        dialect = mssql.dialect()
+
+    statements = _build_upsert_statements(Connection(), '[dbo].[T]', '[#STAGING]', ['K', 'V'], ['K'])
+
+    assert len(statements) == 1
+    merge = ' '.join(statements[0].split())
+    assert merge.startswith('MERGE [dbo].[T] AS t USING [#STAGING] AS s ON t.[K] = s.[K]')
+    assert 'WHEN MATCHED THEN UPDATE SET t.[V] = s.[V]' in merge
+    assert 'WHEN NOT MATCHED BY TARGET THEN INSERT ([K], [V]) VALUES (s.[K], s.[V]);' in merge
+
+
+def test_async_helpers_match_sync_path(sqlite_path, engine, df_new):
+    expected = get_only_new_rows.fn(df_new, engine, 'T', 'main', COLUMNS, ['K'])
+
+    async def run():
+        async_engine = create_async_engine(f'sqlite+aiosqlite:///{sqlite_path}')
+        try:
+            results = [await async_get_only_new_rows.fn(df_new, async_engine, 'T', 'main', COLUMNS, ['K'],
+                                                         compare_mode=compare_mode)
+                       for compare_mode in ('merge', 'hash', 'staging')]
+            await async_bulk_insert_dataframe.fn(expected.assign(TIMESTAMP_LECTURA=3), async_engine, 'T', 'main',
+                                                 key_columns=['K', 'TIMESTAMP_LECTURA'])
+            return results
+        finally:
+            await async_engine.dispose()
+
+    for result in asyncio.run(run()):
+        pd.testing.assert_frame_equal(_sorted(result), _sorted(expected))
+
+    assert get_only_new_rows.fn(df_new, engine, 'T', 'main', COLUMNS, ['K']).empty
+
+
+@pytest.mark.parametrize('min_value, max_value', [
+    (0, 99),
+    (date(2024, 1, 1), date(2024, 12, 31)),
+    (datetime(2024, 1, 1), datetime(2024, 1, 2, 12)),
+    (Decimal('0.000000000000000001'), Decimal('1.000000000000000001')),
+])
+def test_range_bounds_keep_the_key_type(min_value, max_value):
+    bounds = _get_range_bounds(min_value, max_value, 4)
+
+    assert len(bounds) == 5
+    assert bounds[0] == min_value and bounds[-1] == max_value
+    assert all(type(bound) is type(min_value) for bound in bounds)
+    assert bounds == sorted(bounds)
+
+
+def test_range_bounds_do_not_lose_decimal_precision():
+    bounds = _get_range_bounds(Decimal('10000000000000000.00'), Decimal('10000000000000000.04'), 4)
+
+    assert bounds[1:-1] == [Decimal('10000000000000000.01'), Decimal('10000000000000000.02'), Decimal('10000000000000000.03')]
+
+
+def test_read_sql_partitioned_returns_every_row(engine):
+    df = read_sql_partitioned.fn('SELECT * FROM T', engine, 'K', n_partitions=3)
+
+    pd.testing.assert_frame_equal(df.sort_values(['K', 'TIMESTAMP_LECTURA']).reset_index(drop=True), _read_table(engine))
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([1.0, 12.0], 'TINYINT'),
+    ([1.0, np.nan, 3.0], 'TINYINT'),
+    ([-40000.0, np.nan], 'INT'),
+    ([1e30, np.nan], 'DECIMAL(31,0)'),
+    ([1e40, 1.0], 'FLOAT'),
+    ([3.5, 1.25], 'DECIMAL(3,2)'),
+    ([1.005], 'DECIMAL(4,3)'),
+    ([0.000001], 'DECIMAL(7,6)'),
+    ([3.0000005], 'FLOAT'),
+    ([0.1 + 0.2], 'FLOAT'),
+    ([1e38, 0.5], 'FLOAT'),
+])
+def test_inferred_decimal_scale_does_not_truncate(values, expected):
+    assert infer_sql_column_type(pd.Series(values)) == expected
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([0, 255], 'TINYINT'),
+    ([-1, 2**15 - 1], 'SMALLINT'),
+    ([0, 2**31], 'BIGINT'),
+    ([0, 2**63], 'DECIMAL(19,0)'),
+    ([-10**30, 1], 'DECIMAL(31,0)'),
+    ([10**40], 'NVARCHAR(64)'),
+])
+def test_inferred_integer_types(values, expected):
+    assert infer_sql_column_type(pd.Series(values, dtype=object)) == expected
+
+
+def test_inferred_types_from_decimals_and_sample():
+    df = pd.DataFrame({'D': [Decimal('12.340'), Decimal('1.5'), None], 'S': ['a', 'b', 'c']})
+    assert infer_sql_column_types(df, type_overrides={'S': 'NVARCHAR(10)'}) == {'D': 'DECIMAL(4,2)', 'S': 'NVARCHAR(10)'}
+
+    # La familia se decide con la muestra, pero un valor fuera de ella obliga a volver a inferir con todos los datos
+    df = pd.DataFrame({'N': [1] * 99 + ['x'], 'S': ['a' * 40] * 100, 'T': pd.to_datetime(['2024-01-01'] * 100)})
+    assert infer_sql_column_types(df, sample_size=10) == {'N': 'NVARCHAR(16)', 'S': 'NVARCHAR(64)', 'T': 'DATE'}
+
+
+def test_conversion_plan_keeps_dates_decimals_and_bits_by_default():
+    column_types = {'I': sqlalchemy.types.Integer(), 'DT': sqlalchemy.types.DateTime(), 'D': sqlalchemy.types.Date(),
+                    'N': sqlalchemy.types.Numeric(10, 2), 'B': sqlalchemy.types.Boolean(), 'S': sqlalchemy.types.String()}
+    df = pd.DataFrame({'I': ['1', None], 'DT': ['2024-01-01 10:00', 'x'], 'D': [date(2024, 1, 1), 'x'],
+                       'N': [Decimal('1.25'), None], 'B': [1, 0], 'S': ['a', 'None']})
+
+    df_default = convert_dataframe_column_types(df.copy(), column_types)
+
+    assert df_default['I'].tolist() == [1, pd.NA]
+    assert df_default['DT'].tolist()[0] == pd.Timestamp('2024-01-01 10:00') and pd.isna(df_default['DT'][1])
+    assert df_default['S'].tolist() == ['a', None]
+    pd.testing.assert_frame_equal(df_default[['D', 'N', 'B']], df[['D', 'N', 'B']])
+
+    plan = ColumnConversionPlan(column_types, decimal_mode='decimal', boolean_values={}, convert_dates=True)
+    df_opt_in = plan.apply(df.copy())
+
+    assert df_opt_in['D'].tolist()[0] == pd.Timestamp('2024-01-01') and pd.isna(df_opt_in['D'][1])
+    assert df_opt_in['N'].tolist() == [Decimal('1.25'), None]
+    assert df_opt_in['B'].tolist() == [True, False]
+
+
+def test_hash_mode_matches_merge_with_mixed_type_object_columns(engine):
+    pd.DataFrame({'K': [0, 1, 2, 3], 'B': ['1', '2', '3.5', 'x'], 'TIMESTAMP_LECTURA': 1}).to_sql('M', engine, index=False)
+    df_new = pd.DataFrame({'K': [0, 1, 2, 3], 'B': pd.Series([1, '2', Decimal('3.5'), 'x'], dtype=object)})
+
+    expected = get_only_new_rows.fn(df_new, engine, 'M', 'main', ['K', 'B'], ['K'])
+    result = get_only_new_rows.fn(df_new, engine, 'M', 'main', ['K', 'B'], ['K'], compare_mode='hash')
+
+    assert sorted(expected['K']) == [0, 2]
+    pd.testing.assert_frame_equal(_sorted(result), _sorted(expected))
+
+
+def test_row_hash_follows_python_equality_in_object_columns():
+    hashes = compute_row_hash(pd.DataFrame({'B': pd.Series([1, 1.0, Decimal('1.0'), True, '1', None, np.nan], dtype=object)}))
+
+    assert hashes[0] == hashes[1] == hashes[2] == hashes[3]
+    assert hashes[4] != hashes[0]
+    assert hashes[5] == hashes[6]
+
+
+def test_query_profiler_records_rows_bytes_and_pool_wait(engine):
+    profiler = QueryProfiler(slow_query_seconds=None)
+
+    with profiler.profile(engine, engine):
+        df = pd.read_sql_query(text('SELECT K, B FROM T'), engine)
+        with engine.begin() as connection:
+            connection.execute(text('UPDATE T SET A = 0 WHERE K < 5'))
+
+    stats = {row['statement']: row for row in profiler.summary()['statements']}
+    select_stats = stats['SELECT K, B FROM T']
+    assert select_stats['count'] == 1
+    assert select_stats['rows_returned'] == len(df) == 100
+    assert select_stats['bytes_fetched'] == 8 * 100 + df['B'].dropna().str.len().sum()
+    assert stats['UPDATE T SET A = 0 WHERE K < 5']['rows_affected'] == 10
+
+    connections = profiler.summary()['connections']
+    assert connections['checkouts'] >= 2
+    assert connections['pool_wait_seconds'] >= 0
+    assert list(profiler.summary_frame().columns) == ['statement', 'count', 'total_seconds', 'avg_seconds', 'max_seconds',
+                                                      'rows_affected', 'rows_returned', 'bytes_fetched', 'errors']
+
+    # Al salir del bloque se quitan los listeners y el envoltorio de raw_connection
+    assert not sqlalchemy.event.contains(engine, 'after_cursor_execute', profiler._after_cursor_execute)
+    assert 'raw_connection' not in vars(engine)
+    _fetch_rows(engine, 'SELECT 1')
+    assert profiler.summary()['total_statements'] == 2
+
+
+def test_query_profiler_profile_keeps_engines_attached_before_the_block(engine):
+    profiler = QueryProfiler().attach(engine)
+
+    with profiler.profile(engine):
+        pass
+
+    assert sqlalchemy.event.contains(engine, 'after_cursor_execute', profiler._after_cursor_execute)
+    profiler.detach(engine)
+    assert not sqlalchemy.event.contains(engine, 'after_cursor_execute', profiler._after_cursor_execute)
+
+
+@pytest.mark.parametrize('options', [{'n_partitions': 1}, {'n_partitions': 4, 'chunksize': 7},
+                                     {'max_memory_mb': 1, 'key_pushdown': 'in'}])
+def test_streamed_new_rows_match_get_only_new_rows(engine, df_new, options):
+    expected = get_only_new_rows.fn(df_new, engine, 'T', 'main', COLUMNS, ['K'])
+
+    chunks = []
+    total_rows = stream_only_new_rows.fn(df_new, engine, 'T', 'main', COLUMNS, ['K'], chunks.append, **options)
+
+    result = pd.concat(chunks)
+    assert total_rows == len(result)
+    pd.testing.assert_frame_equal(_sorted(result), _sorted(expected))
+
+
+def test_iter_only_new_rows_validates_key_columns_up_front(engine, df_new):
+    with pytest.raises(ValueError, match='columnas clave'):
+        iter_only_new_rows(df_new, engine, 'T', 'main', ['A', 'B'], ['K'])
+
+
+def test_bulk_upsert_rejects_null_keys(engine):
+    pd.DataFrame({'K': [1], 'V': ['a']}).to_sql('U', engine, index=False)
+
+    with pytest.raises(ValueError, match='clave nulas'):
+        bulk_insert_dataframe.fn(pd.DataFrame({'K': [2, None], 'V': ['x', 'y']}), engine, 'U', 'main', key_columns=['K'])
+
+    assert _fetch_rows(engine, 'SELECT K, V FROM U') == [(1, 'a')]
+
+
+def test_bulk_upsert_cleanup_failure_keeps_the_original_error(engine, monkeypatch):
+    pd.DataFrame({'K': [1], 'V': ['a']}).to_sql('U', engine, index=False)
+
+    def failing_insert(*args, **kwargs):
+        raise RuntimeError('insert failed')
+
+    def failing_drop(*args, **kwargs):
+        raise sqlalchemy.exc.OperationalError('DROP TABLE', {}, Exception('drop failed'))
+
+    monkeypatch.setattr(bulk_writer, '_insert_dataframe', failing_insert)
+    monkeypatch.setattr(sqlalchemy.Table, 'drop', failing_drop)
+
+    with pytest.raises(RuntimeError, match='insert failed'):
+        bulk_insert_dataframe.fn(pd.DataFrame({'K': [2], 'V': ['x']}), engine, 'U', 'main', key_columns=['K'])
+
+
+def test_staging_table_uses_the_target_column_types(engine, df_new):
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE S (K BIGINT, A FLOAT, B VARCHAR(20) COLLATE NOCASE, TIMESTAMP_LECTURA INTEGER)'))
+        connection.execute(text('INSERT INTO S SELECT K, A, B, TIMESTAMP_LECTURA FROM T'))
+
+    statements = []
+    sqlalchemy.event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+    result = get_only_new_rows.fn(df_new, engine, 'S', 'main', COLUMNS, ['K'], compare_mode='staging')
+
+    assert sorted(result['K']) == NEW_KEYS
+    create_staging = ' '.join(next(statement for statement in statements if 'CREATE TEMPORARY TABLE' in statement).split())
+    assert '"B" VARCHAR(20)' in create_staging
+
+
+def test_staging_table_keeps_the_target_collation(engine):
+    df = pd.DataFrame({'K': [1], 'B': ['a'], 'EXTRA': [1.5]})
+    column_types = {'K': sqlalchemy.types.BigInteger(), 'B': sqlalchemy.types.String(20, collation='NOCASE')}
+
+    with engine.connect() as connection:
+        staging_table = _create_staging_table(connection, df, 'STG_TEST', column_types)
+        staging_table.drop(connection)
+
+    create_staging = str(sqlalchemy.schema.CreateTable(staging_table).compile(dialect=mssql.dialect()))
+    assert '[B] VARCHAR(20) COLLATE NOCASE' in create_staging
+    assert '[EXTRA] FLOAT' in create_staging
+
+
+def test_read_sql_columnar_matches_read_sql_query(engine):
+    pytest.importorskip('pyarrow')
+    query = 'SELECT K, A, B, TIMESTAMP_LECTURA FROM T ORDER BY K, TIMESTAMP_LECTURA'
+
+    df = read_sql_columnar(query, engine, batch_size=7, arrow_dtypes=False)
+
+    pd.testing.assert_frame_equal(df, pd.read_sql_query(query, engine))
+
+
+def test_columnar_fetch_requires_pyarrow_14(monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+    monkeypatch.setattr(pa, '__version__', '13.0.0')
+
+    with pytest.raises(ImportError, match='pyarrow>=14'):
+        read_sql_columnar('SELECT 1', None)
+
+
+def test_async_functions_are_imported_lazily():
+    code = ("import sys, consulterscommons.db_tools as db_tools; "
+            "assert 'consulterscommons.db_tools.async_utils' not in sys.modules; "
+            "assert 'sqlalchemy.ext.asyncio' not in sys.modules; "
+            "assert callable(db_tools.async_get_only_new_rows)")
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+@pytest.fixture
+def fake_mssql(monkeypatch):
+    """get_sqlalchemy_engine sobre SQLite en memoria: devuelve la lista de motores creados."""
+    created = []
+
+    def create(url, **pool_options):
+        created.append(pool_options)
+        return sqlalchemy.create_engine('sqlite://')
+
+    monkeypatch.setattr(sqlalchemy_utils, 'create_engine', create)
+    dispose_sqlalchemy_engines()
+    yield created
+    dispose_sqlalchemy_engines()
+
+
+def test_engine_registry_key(fake_mssql):
+    engine = get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'secret')
+
+    assert get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'secret') is engine
+    assert get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'other') is not engine
+    assert get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'secret', pool_size=2) is not engine
+    assert get_sqlalchemy_engine.fn('srv', 'other_db', 'etl', 'secret') is not engine
+    assert get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'secret', use_cache=False) is not engine
+    assert len(fake_mssql) == 5
+
+    assert dispose_sqlalchemy_engines(database='other_db') == 1
+    assert get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'secret') is engine
+    assert dispose_sqlalchemy_engines(server='srv') == 3
+    assert get_sqlalchemy_engine.fn('srv', 'db', 'etl', 'secret') is not engine
+
+
+def test_engine_connection_error_invalidates_keyring_credentials(fake_mssql, monkeypatch):
+    passwords = ['vieja', 'nueva']
+    used_passwords = []
+    monkeypatch.setattr(keyring, 'get_credential', lambda service, username: SimpleCredential(username, passwords[0]))
+
+    def build_url(drivername, server, database, username, password):
+        used_passwords.append(password)
+        return sqlalchemy.URL.create('sqlite', database='/no/existe/db.sqlite' if password == 'vieja' else None)
+
+    monkeypatch.setattr(sqlalchemy_utils, '_build_connection_url', build_url)
+    monkeypatch.setattr(sqlalchemy_utils, 'create_engine', lambda url, **pool_options: sqlalchemy.create_engine(url))
+    get_credential_cache().invalidate()
+
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        get_sqlalchemy_engine.fn('srv', 'db', 'etl')
+    passwords.pop(0)
+    get_sqlalchemy_engine.fn('srv', 'db', 'etl')
+
+    assert used_passwords == ['vieja', 'nueva']
+    get_credential_cache().invalidate()
+
+
+def test_schema_cache_ttl_and_invalidation(engine, monkeypatch):
+    cache = SchemaCache(engine, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(schema_cache.time, 'monotonic', lambda: now[0])
+    reflections = []
+    get_columns = sqlalchemy.engine.reflection.Inspector.get_columns
+    monkeypatch.setattr(sqlalchemy.engine.reflection.Inspector, 'get_columns',
+                        lambda self, *args, **kwargs: reflections.append(args) or get_columns(self, *args, **kwargs))
+
+    assert list(cache.get_column_types('T', 'main')) == ['K', 'A', 'B', 'TIMESTAMP_LECTURA']
+    cache.get_column_types('T', 'main')
+    assert len(reflections) == 1
+
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE T ADD COLUMN C INTEGER'))
+    assert 'C' not in cache.get_column_types('T', 'main')
+
+    now[0] += 61
+    assert 'C' in cache.get_column_types('T', 'main')
+    assert len(reflections) == 2
+
+    cache.invalidate('T', 'main')
+    assert cache.get_cached_column_types('T', 'main') is None
+    cache.get_column_types('T', 'main')
+    assert len(reflections) == 3
+
+    assert not cache.has_table('NUEVA', 'main')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE NUEVA (X INTEGER)'))
+    assert cache.has_table('NUEVA', 'main')
+
+    cache.invalidate(schema='main')
+    assert cache.get_cached_column_types('T', 'main') is None
+    assert get_schema_cache(engine) is get_schema_cache(engine)
+
+
+def test_standardize_column_names_resolves_collisions():
+    assert standardize_sql_column_names(['Año', 'ANO', 'año ']) == ['ANO', 'ANO_2', 'ANO_3']
+    assert standardize_sql_column_names(['A', 'A_2', 'a']) == ['A', 'A_2', 'A_3']
+    assert standardize_sql_column_names(['Año', 'ANO'], resolve_collisions=False) == ['ANO', 'ANO']
+
+    columns = standardize_sql_column_names(pd.Index(['Descripción', 'Descripcion', 'Código'], name='cols'))
+    assert isinstance(columns, pd.Index) and columns.name == 'cols'
+    assert list(columns) == ['DESCRIPCION', 'DESCRIPCION_2', 'CODIGO']
+
+
+def test_staging_mode_does_not_commit_the_caller_transaction(engine, df_new):
+    with engine.connect() as connection:
+        connection.execute(text("INSERT INTO T (K, A, B, TIMESTAMP_LECTURA) VALUES (1000, 1.0, 'x', 3)"))
+
+        result = get_only_new_rows.fn(df_new, connection, 'T', 'main', COLUMNS, ['K'], compare_mode='staging')
+        assert sorted(result['K']) == NEW_KEYS
+
+        assert connection.in_transaction()
+        connection.rollback()
+
+    assert 1000 not in set(_read_table(engine)['K'])
+
+
+def test_query_profilers_share_the_pool_wait_wrapper(engine):
+    raw_connection = engine.raw_connection
+
+    def slow_raw_connection(*args, **kwargs):
+        time.sleep(0.01)
+        return raw_connection(*args, **kwargs)
+
+    engine.raw_connection = slow_raw_connection
+    first, second = QueryProfiler(slow_query_seconds=None), QueryProfiler(slow_query_seconds=None)
+    first.attach(engine)
+    second.attach(engine)
+
+    first.detach(engine)
+    _fetch_rows(engine, 'SELECT 1')
+    assert second.summary()['connections']['pool_wait_seconds'] >= 0.01
+    assert first.summary()['connections']['pool_wait_seconds'] == 0
+
+    second.detach(engine)
+    assert vars(engine)['raw_connection'] is slow_raw_connection
+
+
+def test_string_conversion_masks_nulls_before_casting_to_text():
+    df = pd.DataFrame({'S': pd.Series([None, np.nan, pd.NA, 'null', 'x', 5], dtype=object),
+                       'F': [1.5, np.nan, 2.0, 3.0, 4.0, 5.0]})
+
+    df = ColumnConversionPlan({'S': sqlalchemy.types.String(), 'F': sqlalchemy.types.String()}).apply(df)
+
+    assert df['S'].tolist() == [None, None, None, None, 'x', '5']
+    assert df['F'].tolist() == ['1.5', None, '2.0', '3.0', '4.0', '5.0']
+    assert df['S'].dtype == object and df['F'].dtype == object
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+import zipfile
+
+import pytest
+
+msoffcrypto = pytest.importorskip('msoffcrypto')
+pytest.importorskip('office365')
+
+from msoffcrypto.exceptions import InvalidKeyError
+from msoffcrypto.format.ooxml import OOXMLFile
+
+from consulterscommons.sharepoint_tools import decrypt_msfile
+
+PASSWORD = 'secreto'
+
+
+@pytest.fixture
+def plain_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        zip_file.writestr('[Content_Types].xml',
+                          '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        zip_file.writestr('data.txt', 'hola' * 5000)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def encrypted_path(tmp_path, plain_bytes):
+    path = tmp_path / 'datos.xlsx'
+    with open(path, 'wb') as f:
+        OOXMLFile(io.BytesIO(plain_bytes)).encrypt(PASSWORD, f)
+    return path
+
+
+def test_path_mode_writes_next_to_the_original(encrypted_path, plain_bytes):
+    output_path = decrypt_msfile(str(encrypted_path), PASSWORD)
+
+    assert output_path == str(encrypted_path.parent / 'decrypt_datos.xlsx')
+    with open(output_path, 'rb') as f:
+        assert f.read() == plain_bytes
+    assert sorted(os.listdir(encrypted_path.parent)) == ['datos.xlsx', 'decrypt_datos.xlsx']
+
+
+def test_wrong_password_keeps_an_existing_output(encrypted_path):
+    existing = encrypted_path.parent / 'decrypt_datos.xlsx'
+    existing.write_bytes(b'version anterior')
+
+    with pytest.raises(InvalidKeyError):
+        decrypt_msfile(str(encrypted_path), 'incorrecta')
+
+    assert existing.read_bytes() == b'version anterior'
+    assert sorted(os.listdir(encrypted_path.parent)) == ['datos.xlsx', 'decrypt_datos.xlsx']
+
+
+def test_tempfile_mode_removes_its_file_on_failure(encrypted_path, tmp_path, monkeypatch, plain_bytes):
+    temp_dir = tmp_path / 'temp'
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(temp_dir))
+
+    with pytest.raises(InvalidKeyError):
+        decrypt_msfile(str(encrypted_path), 'incorrecta', mode='tempfile')
+    assert os.listdir(temp_dir) == []
+
+    output_path = decrypt_msfile(str(encrypted_path), PASSWORD, mode='tempfile')
+    assert os.listdir(temp_dir) == [os.path.basename(output_path)]
+    with open(output_path, 'rb') as f:
+        assert f.read() == plain_bytes
+
+
+def test_memory_mode_does_not_write_to_disk(encrypted_path, plain_bytes):
+    buffer = decrypt_msfile(str(encrypted_path), PASSWORD, mode='memory')
+
+    assert buffer.read() == plain_bytes
+    assert os.listdir(encrypted_path.parent) == ['datos.xlsx']
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from consulterscommons.db_tools import WatermarkStore, extract_incremental
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def events(engine):
+    """Tabla E con 10 filas, una por hora desde START."""
+    df = pd.DataFrame({'ID': range(10), 'TS': [START + timedelta(hours=i) for i in range(10)]})
+    df.to_sql('E', engine, index=False)
+    return engine
+
+
+@pytest.mark.parametrize('file_name', ['state.json', 'state.db'])
+def test_watermark_store_persists_values(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+    store = WatermarkStore(path)
+    store.set('main.T', 'TS', pd.Timestamp('2024-01-01 10:30:00.123456'))
+    store.set('main.T', 'ID', 42)
+    store.set('main.T', 'AMOUNT', Decimal('12345678901234567890.12'))
+
+    reopened = WatermarkStore(path)
+    assert reopened.get('main.T', 'TS') == datetime(2024, 1, 1, 10, 30, 0, 123456)
+    assert reopened.get('main.T', 'ID') == 42
+    assert reopened.get('main.T', 'AMOUNT') == Decimal('12345678901234567890.12')
+    assert reopened.get('main.OTHER', 'TS') is None
+
+    reopened.reset('main.T', 'ID')
+    assert WatermarkStore(path).get('main.T', 'ID') is None
+    assert [f.name for f in tmp_path.iterdir()] == [file_name]
+
+
+def test_extract_advances_only_after_write(events, tmp_path):
+    store = WatermarkStore(str(tmp_path / 'state.json'))
+
+    def failing_write(df):
+        raise RuntimeError('fallo')
+
+    with pytest.raises(RuntimeError):
+        extract_incremental.fn(events, 'E', 'main', store, 'TS', write_fn=failing_write)
+    assert store.get('main.E', 'TS') is None
+
+    written = []
+    assert extract_incremental.fn(events, 'E', 'main', store, 'TS', write_fn=written.append) == 10
+    assert store.get('main.E', 'TS') == START + timedelta(hours=9)
+
+    with events.begin() as connection:
+        connection.execute(text("INSERT INTO E VALUES (10, :ts)"), {'ts': START + timedelta(hours=10)})
+    assert extract_incremental.fn(events, 'E', 'main', store, 'TS', write_fn=written.append) == 1
+    assert list(written[-1]['ID']) == [10]
+
+
+def test_lookback_rereads_the_window(events, tmp_path):
+    store = WatermarkStore(str(tmp_path / 'state.json'))
+    store.set('main.E', 'TS', START + timedelta(hours=9))
+
+    # Fila confirmada tarde con una fecha anterior a la marca de agua
+    with events.begin() as connection:
+        connection.execute(text("INSERT INTO E VALUES (99, :ts)"), {'ts': START + timedelta(hours=8, minutes=30)})
+
+    assert extract_incremental.fn(events, 'E', 'main', store, 'TS').empty
+
+    df = extract_incremental.fn(events, 'E', 'main', store, 'TS', lookback=timedelta(hours=2))
+    assert sorted(df['ID']) == [8, 9, 99]
+
+
+def test_lookback_of_the_wrong_type_fails_before_reading(events, tmp_path):
+    store = WatermarkStore(str(tmp_path / 'state.json'))
+    store.set('main.E', 'TS', START)
+    store.set('main.E', 'ID', 5)
+
+    with pytest.raises(TypeError, match='lookback'):
+        extract_incremental.fn(events, 'E', 'main', store, 'TS', lookback=3600)
+    with pytest.raises(TypeError, match='lookback'):
+        extract_incremental.fn(events, 'E', 'main', store, 'ID', lookback=timedelta(hours=1))
+    with pytest.raises(TypeError, match='lookback'):
+        extract_incremental.fn(events, 'E', 'main', store, 'TS', lookback='1h')
+    with pytest.raises(ValueError, match='lookback'):
+        extract_incremental.fn(events, 'E', 'main', store, 'TS', lookback=timedelta(hours=-1))
+
+    df = extract_incremental.fn(events, 'E', 'main', store, 'ID', lookback=2)
+    assert sorted(df['ID']) == [4, 5, 6, 7, 8, 9]
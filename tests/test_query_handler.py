@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from consulterscommons.db_tools import query_handler
+from consulterscommons.db_tools.query_handler import QueryManager
+
+
+@pytest.fixture
+def sql_dir(tmp_path):
+    (tmp_path / 'reports').mkdir()
+    (tmp_path / 'fetch_data.sql').write_text('SELECT * FROM {{table}} WHERE ID = :id', encoding='utf-8')
+    (tmp_path / 'reports' / 'monthly.sql').write_text('SELECT 1', encoding='utf-8')
+    return tmp_path
+
+
+@pytest.fixture
+def walks(monkeypatch):
+    """Cuenta los listados de la carpeta."""
+    calls = []
+    walk = os.walk
+    monkeypatch.setattr(query_handler.os, 'walk', lambda path: calls.append(path) or walk(path))
+    return calls
+
+
+def test_missing_attributes_rescan_at_most_once_per_interval(sql_dir, walks):
+    qm = QueryManager(sql_dir, reload_interval=60)
+
+    for _ in range(5):
+        assert not hasattr(qm, 'shape')
+    assert len(walks) == 1
+
+    qm._scanned_at -= 60
+    assert not hasattr(qm, 'shape')
+    assert not hasattr(qm, 'shape')
+    assert len(walks) == 2
+
+
+def test_new_files_visible_after_interval_or_reload(sql_dir):
+    qm = QueryManager(sql_dir, reload_interval=60)
+    (sql_dir / 'new_query.sql').write_text('SELECT 2', encoding='utf-8')
+
+    assert not hasattr(qm, 'new_query')
+    assert qm.reload() == 3
+    assert qm.new_query == 'SELECT 2'
+
+    static_qm = QueryManager(sql_dir, auto_reload=False, reload_interval=0)
+    (sql_dir / 'other_query.sql').write_text('SELECT 3', encoding='utf-8')
+    assert not hasattr(static_qm, 'other_query')
+    static_qm.reload()
+    assert static_qm.other_query == 'SELECT 3'
+
+
+def test_modified_files_are_reread(sql_dir):
+    qm = QueryManager(sql_dir, reload_interval=0)
+    assert qm.reports.monthly == 'SELECT 1'
+
+    path = sql_dir / 'reports' / 'monthly.sql'
+    path.write_text('SELECT 10', encoding='utf-8')
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+
+    assert qm.get('reports/monthly') == 'SELECT 10'
+
+
+def test_render_quotes_identifiers_and_keeps_parameters(sql_dir):
+    qm = QueryManager(sql_dir)
+
+    clause = qm.render('fetch_data', {'table': 'CLIENTES'})
+    assert str(clause) == 'SELECT * FROM [CLIENTES] WHERE ID = :id'
+    assert qm.render('fetch_data', {'table': 'CLIENTES'}) is clause
+    assert qm.get_params('fetch_data') == ['id']
+
+    with pytest.raises(ValueError):
+        qm.render('fetch_data')
+
+
+def test_query_files_named_like_methods_keep_returning_the_query(sql_dir):
+    (sql_dir / 'get.sql').write_text('SELECT 4', encoding='utf-8')
+    (sql_dir / 'render.sql').write_text('SELECT 5', encoding='utf-8')
+    (sql_dir / 'compile_text.sql').write_text('SELECT 6', encoding='utf-8')
+
+    with pytest.warns(UserWarning) as record:
+        qm = QueryManager(sql_dir, preload=True)
+    messages = ' '.join(str(warning.message) for warning in record)
+    assert 'QueryManager.get' in messages and 'QueryManager.render' in messages and "get_sql('compile_text')" in messages
+
+    assert qm.get == 'SELECT 4'
+    assert qm.render == 'SELECT 5'
+    assert qm.compile_text is False
+    assert qm.get_sql('compile_text') == 'SELECT 6'
+    assert qm.fetch_data == 'SELECT * FROM {{table}} WHERE ID = :id'
+    assert 'FROM [T]' in str(QueryManager.render(qm, 'fetch_data', {'table': 'T'}))
+    assert QueryManager.get(qm, 'get') == 'SELECT 4'
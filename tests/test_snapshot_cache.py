@@ -0,0 +1,111 @@
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+pytest.importorskip('pyarrow')
+
+from consulterscommons.db_tools import SnapshotCache
+from consulterscommons.db_tools import snapshot_cache as snapshot_module
+
+COLUMNS = ['K', 'A', 'B']
+
+
+def _snapshot_files(cache: SnapshotCache) -> list[str]:
+    return sorted(name for _, _, files in os.walk(cache.cache_dir) for name in files)
+
+
+def test_refresh_is_incremental_and_keeps_the_latest_version(engine, tmp_path):
+    cache = SnapshotCache(str(tmp_path / 'cache'), n_partitions=4)
+    assert cache.refresh(engine, 'T', 'main', COLUMNS, ['K']) == 50
+    assert cache.refresh(engine, 'T', 'main', COLUMNS, ['K']) == 0
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO T (K, A, B, TIMESTAMP_LECTURA) VALUES (3, 333.0, 'x', 3), (99, 1.0, 'y', 3)"))
+    assert cache.refresh(engine, 'T', 'main', COLUMNS, ['K']) == 2
+
+    df = cache.read(engine, 'T', 'main', COLUMNS, ['K'], refresh=False).set_index('K')
+    assert len(df) == 51
+    assert df.loc[3, 'A'] == 333.0 and df.loc[3, 'TIMESTAMP_LECTURA'] == 3
+    assert df.loc[4, 'TIMESTAMP_LECTURA'] == 2
+
+
+def test_refresh_discards_the_snapshot_when_the_table_is_emptied(engine, tmp_path):
+    cache = SnapshotCache(str(tmp_path / 'cache'))
+    cache.refresh(engine, 'T', 'main', COLUMNS, ['K'])
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM T"))
+
+    assert cache.refresh(engine, 'T', 'main', COLUMNS, ['K']) == 0
+    assert cache.read(engine, 'T', 'main', COLUMNS, ['K'], refresh=False).empty
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO T (K, A, B, TIMESTAMP_LECTURA) VALUES (1, 1.0, 'a', 1)"))
+    assert list(cache.read(engine, 'T', 'main', COLUMNS, ['K'])['K']) == [1]
+
+
+def test_refresh_discards_the_snapshot_when_the_max_goes_back(engine, tmp_path):
+    cache = SnapshotCache(str(tmp_path / 'cache'))
+    cache.refresh(engine, 'T', 'main', COLUMNS, ['K'])
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM T WHERE TIMESTAMP_LECTURA = 2 OR K >= 10"))
+
+    assert cache.refresh(engine, 'T', 'main', COLUMNS, ['K']) == 10
+    df = cache.read(engine, 'T', 'main', COLUMNS, ['K'], refresh=False)
+    assert sorted(df['K']) == list(range(10))
+    assert (df['TIMESTAMP_LECTURA'] == 1).all()
+
+
+def test_read_only_opens_the_partitions_of_the_keys(engine, tmp_path, monkeypatch):
+    cache = SnapshotCache(str(tmp_path / 'cache'), n_partitions=8)
+    cache.refresh(engine, 'T', 'main', COLUMNS, ['K'])
+
+    opened = []
+    read_table = snapshot_module.pq.read_table
+    monkeypatch.setattr(snapshot_module.pq, 'read_table', lambda path, **kwargs: opened.append(path) or read_table(path, **kwargs))
+
+    df = cache.read(engine, 'T', 'main', COLUMNS, ['K'], df_keys=pd.DataFrame({'K': [7]}), refresh=False)
+
+    assert len(opened) == 1
+    assert 7 in set(df['K'])
+    assert len(df) < 50
+
+
+def test_failed_partition_write_keeps_the_previous_file(engine, tmp_path, monkeypatch):
+    cache = SnapshotCache(str(tmp_path / 'cache'), n_partitions=1)
+    cache.refresh(engine, 'T', 'main', COLUMNS, ['K'])
+    files = _snapshot_files(cache)
+
+    def failing_write(table, path, **kwargs):
+        with open(path, 'wb') as f:
+            f.write(b'parcial')
+        raise OSError('disco lleno')
+
+    monkeypatch.setattr(snapshot_module.pq, 'write_table', failing_write)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO T (K, A, B, TIMESTAMP_LECTURA) VALUES (3, 333.0, 'x', 3)"))
+
+    with pytest.raises(OSError):
+        cache.refresh(engine, 'T', 'main', COLUMNS, ['K'])
+
+    assert _snapshot_files(cache) == files
+    monkeypatch.undo()
+    assert len(cache.read(engine, 'T', 'main', COLUMNS, ['K'], refresh=False)) == 50
+
+
+def test_evict_removes_the_least_recently_used_snapshots(engine, tmp_path, monkeypatch):
+    cache = SnapshotCache(str(tmp_path / 'cache'))
+    clock = iter(range(1000))
+    monkeypatch.setattr(snapshot_module.time, 'time', lambda: next(clock))
+
+    cache.refresh(engine, 'T', 'main', ['A'], ['K'])
+    cache.refresh(engine, 'T', 'main', ['B'], ['K'])
+    cache.read(engine, 'T', 'main', ['A'], ['K'], refresh=False)  # A pasa a ser la más reciente
+    size_a = cache.size_bytes() - sum(size for path, meta, size in cache._list_snapshots() if 'B' in meta['columns'])
+
+    cache.max_size_bytes = size_a
+    assert cache.evict() == 1
+    assert [meta['columns'] for _, meta, _ in cache._list_snapshots()] == [['A', 'K', 'TIMESTAMP_LECTURA']]